@@ -49,32 +49,96 @@ deactivate
 echo "Creating gps_data.py..."
 cat << 'EOF' > "$GPS_SCRIPT_PATH"
 #!/home/mdt/gps_venv/bin/python3
+# Deployed as a single file: install.sh embeds this script verbatim and copies it to
+# /home/mdt/gps_data.py, so the helpers that live in separate modules under offline_data/
+# (GpsFix, ClientSender, SessionWriter, the logging setup) are kept as compact copies here.
 import gps
 import time
 import logging
+import logging.handlers
+import atexit
+import gzip
+import shutil
+import threading
 import subprocess
 import os
 import glob
 import asyncio
 import websockets
 import json
-import pytz
 import socket
-from datetime import datetime
+from datetime import datetime, timezone
 from aiohttp import web
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 import sys
 import random
+from collections import deque
+
+# Setup logging: records go through a queue to a listener thread, so log I/O on the SD card
+# never blocks the gpsd reader thread or the event loop
+LOG_FILE = '/home/mdt/GPS/gps_websocket.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the log at this size; rotated files are gzip-compressed
+LOG_BACKUP_COUNT = 5
+LOG_RATE = 5  # Info/debug messages per second allowed from any one log statement (0: unlimited)
+LOG_BURST = 20
+LOG_QUEUE_SIZE = 10000  # Records waiting for the listener thread before new ones are dropped
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per log call site; warnings and errors are never limited."""
+
+    def __init__(self, rate, burst):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}  # (pathname, lineno) -> [tokens, last refill, suppressed]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rate:
+            return True
+        now = time.monotonic()
+        bucket = self.buckets.setdefault((record.pathname, record.lineno), [self.burst, now, 0])
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.msg = f"{record.getMessage()} ({bucket[2]} similar messages suppressed)"
+            record.args = None
+            bucket[2] = 0
+        return True
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/home/mdt/GPS/gps_websocket.log'),
-        logging.StreamHandler()
-    ]
-)
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            pass
+
+def gzip_rotator(source, dest):
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def setup_logging():
+    file_handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    file_handler.namer = lambda name: name + '.gz'
+    file_handler.rotator = gzip_rotator
+    handlers = [file_handler, logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log_queue = Queue(LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(LOG_RATE, LOG_BURST))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Configuration
@@ -90,14 +154,31 @@ MAX_RECONNECT_DELAY = 30
 DATA_TIMEOUT = 30
 SHIP_ID = "SHIP456"
 DEBOUNCE_INTERVAL = 0.5
+GPS_QUEUE_SIZE = 256  # Fixes waiting for the external server
+GPS_QUEUE_POLICY = 'drop-oldest'  # When full: 'drop-oldest', or 'conflate-latest' to keep only the newest fix
+CLIENT_QUEUE_SIZE = 4  # Messages queued per local client; the oldest is dropped when full
+CLIENT_WRITE_LIMIT = 64 * 1024  # Socket buffer bytes above which a client's send waits for it to drain
+# Unsent bytes that mark a client as congested; at the write limit, so a client whose
+# send is waiting for its buffer to drain counts as congested
+CLIENT_HIGH_WATER_BYTES = CLIENT_WRITE_LIMIT
+CLIENT_EVICT_AFTER = 10  # Seconds a client may stay congested before it is disconnected
+SESSION_MAX_BYTES = 16 * 1024 * 1024  # Session text files are rotated at this size and every hour
+SESSION_FLUSH_BYTES = 64 * 1024  # Session text buffered in memory before it is written out
+SESSION_FLUSH_INTERVAL = 5  # Seconds text may stay buffered
+SESSION_FSYNC_POLICY = 'interval'  # 'always', 'interval' or 'never'
+SESSION_FSYNC_INTERVAL = 30  # Seconds between fsyncs of the session file
+SESSION_COMPRESS = True  # Gzip rotated session files in the background
+SESSION_QUEUE_SIZE = 10000  # Fix texts waiting for the writer thread before new ones are dropped
 
 # Global variables
 latest_gps_data = None
-connected_clients = set()
-gps_data_queue = Queue()
+connected_clients = {}  # websocket -> ClientSender
+client_stats = {'connections': 0, 'sent': 0, 'conflated': 0, 'evicted': 0, 'send_errors': 0}
+gps_data_queue = Queue(maxsize=GPS_QUEUE_SIZE)
+gps_queue_stats = {'dropped': 0, 'conflated': 0}
 external_ws_connected = False
 last_tpv_time = {device: 0 for device in ['/dev/ttyACM0', '/dev/ttyACM1']}
-current_output_file = None
+session_writer = None
 app_start_time = None
 ws_server = None
 http_runner = None
@@ -124,7 +205,96 @@ def get_device_id():
 
 def get_output_filename():
     now = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    return os.path.join(GPS_DATA_DIR, f"gps_data_{now}.txt")
+    path = os.path.join(GPS_DATA_DIR, f"gps_data_{now}.txt")
+    suffix = 1
+    while os.path.exists(path) or os.path.exists(path + '.gz'):
+        path = os.path.join(GPS_DATA_DIR, f"gps_data_{now}_{suffix}.txt")
+        suffix += 1
+    return path
+
+def compress_session_file(path):
+    try:
+        with open(path, 'rb') as src, gzip.open(path + '.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + '.tmp', path + '.gz')
+        os.remove(path)
+    except Exception as e:
+        logger.error(f"Failed to compress session file {path}: {e}")
+
+class SessionWriter(threading.Thread):
+    """Writer thread for the session text file.
+
+    The file stays open; text is batched and written once SESSION_FLUSH_BYTES
+    are buffered or SESSION_FLUSH_INTERVAL seconds have passed, fsynced per
+    SESSION_FSYNC_POLICY, and the file is rotated by size or hour with closed
+    files gzipped on a background thread.
+    """
+
+    def __init__(self):
+        super().__init__(name="session-writer", daemon=True)
+        self.queue = Queue(SESSION_QUEUE_SIZE)
+        self.dropped = 0
+        os.makedirs(GPS_DATA_DIR, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        self.path = get_output_filename()
+        self.file = open(self.path, 'ab', buffering=0)
+        self.size = 0
+        self.hour = datetime.now().strftime("%Y%m%d%H")
+        self.last_fsync = time.monotonic()
+
+    def write(self, text):
+        try:
+            self.queue.put_nowait(text)
+        except Full:
+            self.dropped += 1
+
+    def close(self):
+        self.queue.put(None)
+        self.join(timeout=10)
+
+    def run(self):
+        buffer = []
+        buffered = 0
+        last_flush = time.monotonic()
+        closing = False
+        while not closing:
+            try:
+                text = self.queue.get(timeout=SESSION_FLUSH_INTERVAL)
+                if text is None:
+                    closing = True
+                else:
+                    data = text.encode()
+                    buffer.append(data)
+                    buffered += len(data)
+            except Empty:
+                pass
+            if buffered < SESSION_FLUSH_BYTES and time.monotonic() - last_flush < SESSION_FLUSH_INTERVAL and not closing:
+                continue
+            try:
+                if buffer:
+                    data = b''.join(buffer)
+                    self.file.write(data)
+                    self.size += len(data)
+                    buffer = []
+                    buffered = 0
+                last_flush = time.monotonic()
+                if closing or SESSION_FSYNC_POLICY == 'always' or (
+                        SESSION_FSYNC_POLICY == 'interval' and last_flush - self.last_fsync >= SESSION_FSYNC_INTERVAL):
+                    os.fsync(self.file.fileno())
+                    self.last_fsync = last_flush
+                if closing or self.size >= SESSION_MAX_BYTES or (
+                        self.size and datetime.now().strftime("%Y%m%d%H") != self.hour):
+                    os.fsync(self.file.fileno())
+                    self.file.close()
+                    if SESSION_COMPRESS and self.size:
+                        threading.Thread(target=compress_session_file, args=(self.path,), daemon=not closing).start()
+                    if not closing:
+                        self._open()
+                        logger.info(f"Session file rotated to {self.path}")
+            except Exception as e:
+                logger.error(f"Failed to write to output file: {e}")
 
 def is_port_free(port):
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -185,6 +355,123 @@ def ensure_gpsd_running(devices):
         logger.error(f"Failed to start gpsd: {e}")
         return False
 
+def queue_fix(fix):
+    """Put a fix on gps_data_queue, making room by GPS_QUEUE_POLICY instead of growing it."""
+    while True:
+        if GPS_QUEUE_POLICY == 'conflate-latest' or gps_data_queue.full():
+            try:
+                gps_data_queue.get_nowait()
+                gps_data_queue.task_done()
+                gps_queue_stats['conflated' if GPS_QUEUE_POLICY == 'conflate-latest' else 'dropped'] += 1
+                continue
+            except Empty:
+                pass
+        try:
+            gps_data_queue.put_nowait(fix)
+            return
+        except Full:
+            continue
+
+class ReceiverFix:
+    """Latest position and satellite state reported by one GPS receiver."""
+    __slots__ = ('device', 'latitude', 'longitude', 'altitude', 'speed', 'satellites', 'satellite_prns')
+
+    def __init__(self, device, latitude=None, longitude=None, altitude=None, speed=None,
+                 satellites=None, satellite_prns=()):
+        self.device = device
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.speed = speed
+        self.satellites = satellites
+        self.satellite_prns = tuple(satellite_prns)
+
+    def copy(self):
+        return ReceiverFix(self.device, self.latitude, self.longitude, self.altitude,
+                           self.speed, self.satellites, self.satellite_prns)
+
+    def is_complete(self):
+        return (self.latitude is not None and
+                self.longitude is not None and
+                self.altitude is not None and
+                self.speed is not None and
+                self.satellites is not None)
+
+    def to_dict(self, name):
+        return {
+            "gps": name,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "altitude": self.altitude,
+            "speed": self.speed,
+            "satellites": self.satellites,
+            "satellite_prns": [str(prn) for prn in self.satellite_prns]
+        }
+
+class GpsFix:
+    """Fused dual-receiver fix passed from the gpsd reader to the senders without re-parsing."""
+    __slots__ = ('time', 'ship_id', 'device_id', 'heading', 'top', 'bottom', '_dict', '_json')
+
+    def __init__(self, time, ship_id, device_id, heading, top=None, bottom=None):
+        self.time = time
+        self.ship_id = ship_id
+        self.device_id = device_id
+        self.heading = heading
+        self.top = top
+        self.bottom = bottom
+        self._dict = None
+        self._json = None
+
+    @property
+    def timestamp(self):
+        return datetime.fromtimestamp(self.time, timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    def receivers(self):
+        pairs = [("Top GPS", self.top), ("Bottom GPS", self.bottom)]
+        return sorted(((label, rx) for label, rx in pairs if rx is not None), key=lambda p: p[1].device)
+
+    def is_complete(self):
+        return (self.top is not None and self.top.is_complete() and
+                self.bottom is not None and self.bottom.is_complete())
+
+    def to_dict(self):
+        if self._dict is None:
+            self._dict = {
+                "timestamp": self.timestamp,
+                "ship_id": self.ship_id,
+                "device_id": self.device_id,
+                "heading": self.heading,
+                "gps_data": [
+                    (self.top or ReceiverFix(None)).to_dict("top_gps"),
+                    (self.bottom or ReceiverFix(None)).to_dict("bottom_gps")
+                ]
+            }
+        return self._dict
+
+    def to_json(self):
+        if self._json is None:
+            self._json = json.dumps(self.to_dict())
+        return self._json
+
+    def to_text(self):
+        output = [
+            f"GPS Data (Real-Time): {self.timestamp}",
+            f"Device ID: {self.device_id}",
+            f"SHIP_ID: {self.ship_id}",
+            f"Heading: {self.heading if self.heading is not None else 'Unknown'}"
+        ]
+        for label, rx in self.receivers():
+            output.extend([
+                f"{label} ({rx.device}):",
+                f"  Latitude: {rx.latitude}",
+                f"  Longitude: {rx.longitude}",
+                f"  Altitude (m): {rx.altitude}",
+                f"  Speed (km/h): {rx.speed}",
+                f"  Satellites: {rx.satellites}",
+                f"  Satellite PRNs: {', '.join(str(prn) for prn in rx.satellite_prns)}"
+            ])
+        return "\n".join(output) + "\n------------------------------------------------------------------------------------------------------\n"
+
 async def parse_gps_data(gps_text):
     try:
         data = {
@@ -251,9 +538,83 @@ async def parse_gps_data(gps_text):
         logger.error(f"Error parsing GPS data: {e}")
         return None
 
+class ClientSender:
+    """Bounded send queue and writer task for one local WebSocket client.
+
+    offer() never blocks the broadcaster. When the queue is full the oldest
+    queued position update is dropped, so a slow client always catches up on
+    the latest fix instead of replaying stale ones. A client that stays
+    congested (queue full or more than high_water_bytes waiting in its socket
+    buffer) for longer than evict_after seconds is disconnected.
+    """
+
+    def __init__(self, websocket, stats, queue_size=4, high_water_bytes=64 * 1024, evict_after=10):
+        self.websocket = websocket
+        self.stats = stats
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.high_water_bytes = high_water_bytes
+        self.evict_after = evict_after
+        self.congested_since = None
+        self.evicted = False
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def buffered_bytes(self):
+        transport = self.websocket.transport
+        return transport.get_write_buffer_size() if transport is not None else 0
+
+    def offer(self, message):
+        if self.evicted:
+            return
+        if len(self.queue) >= self.queue_size:
+            self.queue.popleft()
+            self.stats['conflated'] += 1
+        self.queue.append(message)
+        self.wakeup.set()
+
+        if len(self.queue) >= self.queue_size or self.buffered_bytes() > self.high_water_bytes:
+            now = time.monotonic()
+            if self.congested_since is None:
+                self.congested_since = now
+            elif now - self.congested_since > self.evict_after:
+                self.evict()
+        else:
+            self.congested_since = None
+
+    def evict(self):
+        """Drop a client that cannot keep up; its handler sees the connection close."""
+        self.evicted = True
+        self.queue.clear()
+        self.stats['evicted'] += 1
+        logger.warning(f"Disconnecting slow client {self.websocket.remote_address}: "
+                       f"{self.buffered_bytes()} bytes unsent for over {self.evict_after} seconds")
+        self.task.cancel()
+        if self.websocket.transport is not None:
+            self.websocket.transport.abort()
+
+    async def _run(self):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.queue:
+                    await self.websocket.send(self.queue.popleft())
+                    self.stats['sent'] += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.stats['send_errors'] += 1
+            logger.debug(f"Send to {self.websocket.remote_address} failed: {e}")
+
+    def close(self):
+        self.task.cancel()
+
 async def websocket_handler(websocket, path=None):
     logger.info("WebSocket client connected")
-    connected_clients.add(websocket)
+    sender = ClientSender(websocket, client_stats, CLIENT_QUEUE_SIZE, CLIENT_HIGH_WATER_BYTES, CLIENT_EVICT_AFTER)
+    connected_clients[websocket] = sender
+    client_stats['connections'] += 1
     try:
         async for message in websocket:
             try:
@@ -270,18 +631,18 @@ async def websocket_handler(websocket, path=None):
                 ):
                     global latest_gps_data
                     latest_gps_data = parsed_data
-                    for client in connected_clients.copy():
-                        try:
-                            await client.send(json.dumps(parsed_data))
-                        except websockets.exceptions.ConnectionClosed:
-                            connected_clients.discard(client)
-                    logger.info(f"Broadcasted GPS data to local clients: {parsed_data}")
+                    # Encode once and queue per client: a slow client only delays itself
+                    message = json.dumps(parsed_data)
+                    for client in list(connected_clients.values()):
+                        client.offer(message)
+                    logger.debug(f"Broadcasted GPS data to local clients: {parsed_data}")
             except json.JSONDecodeError:
                 logger.error("Invalid JSON received")
     except websockets.exceptions.ConnectionClosed:
         logger.info("WebSocket client disconnected")
     finally:
-        connected_clients.discard(websocket)
+        connected_clients.pop(websocket, None)
+        sender.close()
 
 async def get_gps_data(request):
     global latest_gps_data
@@ -301,7 +662,8 @@ async def start_websocket_server():
     if not is_port_free(WEBSOCKET_PORT):
         logger.error(f"Port {WEBSOCKET_PORT} is already in use")
         raise OSError(f"Port {WEBSOCKET_PORT} is already in use")
-    ws_server = await websockets.serve(websocket_handler, "0.0.0.0", WEBSOCKET_PORT)
+    ws_server = await websockets.serve(websocket_handler, "0.0.0.0", WEBSOCKET_PORT,
+                                       write_limit=CLIENT_WRITE_LIMIT)
     logger.info(f"WebSocket server started on ws://0.0.0.0:{WEBSOCKET_PORT}")
     return ws_server
 
@@ -320,20 +682,13 @@ async def send_to_external_websocket():
                 reconnect_delay = RECONNECT_DELAY  # Reset delay on successful connection
                 while True:
                     try:
-                        gps_text = gps_data_queue.get_nowait()
-                        parsed_data = await parse_gps_data(gps_text)
-                        if parsed_data and all(
-                            gps.get('latitude') is not None and
-                            gps.get('longitude') is not None and
-                            gps.get('altitude') is not None and
-                            gps.get('speed') is not None and
-                            gps.get('satellites') is not None
-                            for gps in parsed_data.get('gps_data', [])
-                        ):
+                        fix = gps_data_queue.get_nowait()
+                        if fix.is_complete():
+                            parsed_data = fix.to_dict()
                             global latest_gps_data
                             latest_gps_data = parsed_data
-                            await websocket.send(json.dumps(parsed_data))
-                            logger.info(f"Sent GPS data to external server: {parsed_data}")
+                            await websocket.send(fix.to_json())
+                            logger.debug(f"Sent GPS data to external server: {parsed_data}")
                         gps_data_queue.task_done()
                     except Empty:
                         await asyncio.sleep(0.1)
@@ -357,14 +712,11 @@ async def send_to_external_websocket():
         await asyncio.sleep(reconnect_delay + jitter)
 
 def process_gps_data():
-    global current_output_file, app_start_time
+    global app_start_time
     app_start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     start_message = f"\n=== Application Started at: {app_start_time} ===\n"
     logger.info(start_message.strip())
-    current_output_file = get_output_filename()
-    os.makedirs(GPS_DATA_DIR, exist_ok=True)
-    with open(current_output_file, 'a') as f:
-        f.write(start_message)
+    session_writer.write(start_message)
     logger.info("Starting GPS data processing")
     SERIAL_DEVICES = detect_gps_devices()
     if not SERIAL_DEVICES:
@@ -378,16 +730,9 @@ def process_gps_data():
     if not ensure_gpsd_running(SERIAL_DEVICES):
         logger.error("Cannot proceed without gpsd running")
         return
-    device_data = {device: {
-        'latitude': None,
-        'longitude': None,
-        'altitude': None,
-        'speed': None,
-        'satellites': None,
-        'timestamp': None,
-        'heading': None,
-        'satellite_prns': []
-    } for device in SERIAL_DEVICES}
+    device_data = {device: ReceiverFix(device) for device in SERIAL_DEVICES}
+    fix_device_id = get_device_id()  # Read from /proc/cpuinfo once at start-up, not per report
+    heading = None
     last_data_time = {device: time.time() for device in SERIAL_DEVICES}
     while True:
         try:
@@ -406,63 +751,39 @@ def process_gps_data():
                     last_data_time[device] = current_time
                     if current_time - min(last_data_time.values()) > DATA_TIMEOUT:
                         logger.warning(f"No data received from some devices for {DATA_TIMEOUT} seconds")
-                    timestamp = datetime.now(pytz.UTC).strftime('%Y-%m-%d %H:%M:%S.%f')
+                    rx = device_data[device]
                     if report.get('class') == 'TPV':
                         if current_time - last_tpv_time[device] < DEBOUNCE_INTERVAL:
                             continue
                         last_tpv_time[device] = current_time
-                        lat = getattr(report, 'lat', None)
-                        lon = getattr(report, 'lon', None)
-                        alt = getattr(report, 'alt', None)
                         speed = getattr(report, 'speed', None)
-                        heading = getattr(report, 'track', None)
+                        track = getattr(report, 'track', None)
                         if isinstance(speed, (int, float)):
                             speed = round(speed * 3.6, 2)
-                        if isinstance(heading, (int, float)):
-                            heading = round(heading, 1)
-                        device_data[device].update({
-                            'timestamp': timestamp,
-                            'latitude': lat,
-                            'longitude': lon,
-                            'altitude': alt,
-                            'speed': speed,
-                            'heading': heading
-                        })
+                        if isinstance(track, (int, float)):
+                            track = round(track, 1)
+                        rx.latitude = getattr(report, 'lat', None)
+                        rx.longitude = getattr(report, 'lon', None)
+                        rx.altitude = getattr(report, 'alt', None)
+                        rx.speed = speed
+                        if device == SERIAL_DEVICES[0]:
+                            heading = track
                     elif report.get('class') == 'SKY':
+                        prns = [sat.get('PRN') for sat in report.get('satellites', []) if sat.get('used', False) and sat.get('PRN')]
                         satellites = len([sat for sat in report.get('satellites', []) if sat.get('used', False)])
-                        prns = [str(sat.get('PRN', '')) for sat in report.get('satellites', []) if sat.get('used', False) and sat.get('PRN')]
-                        device_data[device].update({
-                            'satellites': satellites if satellites > 0 else None,
-                            'satellite_prns': prns
-                        })
-                        logger.info(f"Device {device} using {satellites} satellites with PRNs: {prns}")
-                    output = [
-                        f"GPS Data (Real-Time): {timestamp}",
-                        f"Device ID: {get_device_id()}",
-                        f"SHIP_ID: {SHIP_ID}",
-                        f"Heading: {device_data[SERIAL_DEVICES[0]].get('heading', 'Unknown') if device_data[SERIAL_DEVICES[0]].get('heading') is not None else 'Unknown'}"
-                    ]
-                    for dev in sorted(SERIAL_DEVICES):
-                        label = "Top GPS" if dev == '/dev/ttyACM0' else "Bottom GPS"
-                        data = device_data.get(dev, {})
-                        output.extend([
-                            f"{label} ({dev}):",
-                            f"  Latitude: {data.get('latitude', 'Unknown')}",
-                            f"  Longitude: {data.get('longitude', 'Unknown')}",
-                            f"  Altitude (m): {data.get('altitude', 'Unknown')}",
-                            f"  Speed (km/h): {data.get('speed', 'Unknown')}",
-                            f"  Satellites: {data.get('satellites', 'Unknown')}",
-                            f"  Satellite PRNs: {', '.join(data.get('satellite_prns', ['Unknown']))}"
-                        ])
-                    output_str = "\n".join(output) + "\n------------------------------------------------------------------------------------------------------\n"
-                    logger.info(output_str)
-                    try:
-                        with open(current_output_file, 'a') as f:
-                            f.write(output_str)
-                    except Exception as e:
-                        logger.error(f"Failed to write to output file: {e}")
+                        rx.satellites = satellites if satellites > 0 else None
+                        rx.satellite_prns = tuple(prns)
+                        logger.debug(f"Device {device} using {satellites} satellites with PRNs: {prns}")
+                    fix = GpsFix(current_time, SHIP_ID, fix_device_id, heading)
+                    for dev in SERIAL_DEVICES:
+                        if dev == '/dev/ttyACM0':
+                            fix.top = device_data[dev].copy()
+                        else:
+                            fix.bottom = device_data[dev].copy()
+                    output_str = fix.to_text()
+                    session_writer.write(output_str)
                     if external_ws_connected:
-                        gps_data_queue.put(output_str)
+                        queue_fix(fix)
                     else:
                         logger.debug("Skipping queue insert due to disconnected external WebSocket")
                 except json.JSONDecodeError as e:
@@ -481,11 +802,12 @@ async def run_gps_processing():
     await loop.run_in_executor(None, process_gps_data)
 
 async def main():
-    global app_start_time, current_output_file, ws_server, http_runner
+    global app_start_time, session_writer, ws_server, http_runner
     try:
         create_device_id()
         app_start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        current_output_file = get_output_filename()
+        session_writer = SessionWriter()
+        session_writer.start()
         await start_websocket_server()
         await asyncio.gather(
             run_gps_processing(),
@@ -503,12 +825,9 @@ async def main():
             await http_runner.cleanup()
         end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         logger.info(f"Application stopped at {end_time}")
-        if current_output_file:
-            try:
-                with open(current_output_file, 'a') as f:
-                    f.write(f"\n=== Application Ended at: {end_time} ===\n")
-            except Exception as e:
-                logger.error(f"Failed to write end time to output file: {e}")
+        if session_writer:
+            session_writer.write(f"\n=== Application Ended at: {end_time} ===\n")
+            session_writer.close()
 
 if __name__ == "__main__":
     try:
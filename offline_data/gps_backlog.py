@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+
+from gps_simplify import TrackSimplifier, simplify_records
+
+logger = logging.getLogger(__name__)
+
+
+class BacklogUploader:
+    """Upload the offline spool in batches with a window of unacknowledged batches.
+
+    Each batch is one text frame that embeds the spooled JSON records as they are
+    stored, without re-encoding them:
+
+        {"type":"gps_batch","batch_id":7,"count":500,"records":[{...},{...}]}
+
+    The server confirms a batch with {"type":"ack","batch_id":7}; acks are passed
+    to handle_ack() by whoever reads the connection. The spool is committed up to
+    the end of the oldest unacknowledged batch, so after a reconnect upload resumes
+    from the last acknowledged record. With require_ack=False a batch counts as
+    delivered once the send completes.
+
+    With priority 'low', each batch waits for `live_idle` to be set, so live fixes
+    are never queued behind backlog batches.
+
+    With a simplify_tolerance (metres), records a straight-line track would
+    not need are left out of the upload (see gps_simplify) but are still
+    committed, so long outages upload a fraction of the spool.
+
+    With a compressor (gps_compress.BatchCompressor), each batch frame is sent
+    zstd-compressed as a binary frame.
+
+    serve() keeps the uploader going for the life of the connection: call
+    notify() after appending to the spool (e.g. spilled live fixes) and the
+    new records are uploaded without waiting for a reconnect.
+
+    Batches are read from the spool in an executor thread. A batch is cut short
+    after batch_interval seconds of reading, so a slow disk still sends something.
+    """
+
+    def __init__(self, spool, websocket, batch_records=500, batch_bytes=256 * 1024, batch_interval=1.0,
+                 window=4, ack_timeout=30, require_ack=True, priority='low', live_idle=None,
+                 simplify_tolerance=0, simplify_interval=60, compressor=None):
+        self.spool = spool
+        self.websocket = websocket
+        self.batch_records = batch_records
+        self.batch_bytes = batch_bytes
+        self.batch_interval = batch_interval
+        self.window = asyncio.Semaphore(window)
+        self.ack_timeout = ack_timeout
+        self.require_ack = require_ack
+        self.priority = priority
+        self.live_idle = live_idle
+        self.compressor = compressor
+        self.simplifier = TrackSimplifier(simplify_tolerance, simplify_interval) if simplify_tolerance else None
+        self.next_batch_id = 1
+        self.in_flight = {}  # batch_id -> (end offset, send time)
+        self.acked = set()
+        self.all_acked = asyncio.Event()
+        self.all_acked.set()
+        self.records_sent = 0
+        self.batches_sent = 0
+        self.spooled = asyncio.Event()
+
+    def _spooled(self):
+        """Iterate (end offset, payload) over the pending records, simplified if enabled."""
+        # A kept record's next offset also covers the records dropped before it
+        spooled = ((next_offset, payload) for _, next_offset, payload in self.spool.read_from(self.spool.committed))
+        if self.simplifier is not None:
+            spooled = ((item, item[1]) for item in spooled)
+            spooled = simplify_records(self.simplifier, spooled)
+        return spooled
+
+    def _read_batch(self, spooled):
+        """Read the next batch capped by count, bytes and read time; runs in an executor.
+
+        Returns (records, end offset), with no records once the spool is drained.
+        """
+        records = []
+        size = 0
+        end = None
+        started = time.monotonic()
+        for next_offset, payload in spooled:
+            records.append(payload.decode())
+            size += len(payload)
+            end = next_offset
+            if (len(records) >= self.batch_records or size >= self.batch_bytes or
+                    time.monotonic() - started >= self.batch_interval):
+                break
+        return records, end
+
+    def notify(self):
+        """Report records appended to the spool since serve() last looked."""
+        self.spooled.set()
+
+    async def serve(self):
+        """Upload the spool, then upload again each time notify() is called."""
+        await self.run()
+        while True:
+            await self.spooled.wait()
+            await self.run()
+
+    async def run(self):
+        """Send every spooled record, then wait until all batches are acknowledged."""
+        self.spooled.clear()
+        if not self.spool.pending_bytes:
+            logger.info("No offline data to send")
+            return
+        started = time.monotonic()
+        records_before = self.records_sent
+        batches_before = self.batches_sent
+        loop = asyncio.get_running_loop()
+        spooled = self._spooled()
+        while True:
+            # Spool reads hit the disk, so they stay off the event loop
+            records, end = await loop.run_in_executor(None, self._read_batch, spooled)
+            if not records:
+                break
+            if self.priority == 'low' and self.live_idle is not None:
+                await self.live_idle.wait()
+            await self._acquire_window()
+            batch_id = self.next_batch_id
+            self.next_batch_id += 1
+            frame = (f'{{"type":"gps_batch","batch_id":{batch_id},"count":{len(records)},"records":['
+                     + ','.join(records) + ']}')
+            self.in_flight[batch_id] = (end, time.monotonic())
+            self.all_acked.clear()
+            if self.compressor is not None:
+                frame = self.compressor.compress(frame.encode())
+            await self.websocket.send(frame)
+            self.records_sent += len(records)
+            self.batches_sent += 1
+            if not self.require_ack:
+                self.handle_ack(batch_id)
+        await self._wait_all_acked()
+        logger.info(f"Uploaded {self.records_sent - records_before} offline records in "
+                    f"{self.batches_sent - batches_before} batches in {time.monotonic() - started:.1f} seconds")
+        if self.compressor is not None:
+            logger.info(f"Backlog compression: {self.compressor.stats()}")
+        if self.simplifier is not None:
+            logger.info(f"Track simplification left out {self.simplifier.dropped} offline records")
+
+    async def _acquire_window(self):
+        try:
+            await asyncio.wait_for(self.window.acquire(), self.ack_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No backlog ack within {self.ack_timeout} seconds") from None
+
+    async def _wait_all_acked(self):
+        try:
+            await asyncio.wait_for(self.all_acked.wait(), self.ack_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No backlog ack within {self.ack_timeout} seconds") from None
+
+    def handle_ack(self, batch_id):
+        """Mark a batch delivered and commit the spool past every leading acked batch."""
+        if batch_id not in self.in_flight:
+            return
+        self.acked.add(batch_id)
+        commit_to = None
+        while self.in_flight:
+            oldest = next(iter(self.in_flight))
+            if oldest not in self.acked:
+                break
+            commit_to, _ = self.in_flight.pop(oldest)
+            self.acked.discard(oldest)
+            self.window.release()
+        if commit_to is not None:
+            self.spool.commit(commit_to)
+        if not self.in_flight:
+            self.all_acked.set()
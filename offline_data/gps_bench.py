@@ -0,0 +1,432 @@
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+from gps_broadcast import FixBroadcaster
+from gps_clients import ClientSender
+from gps_fix import TOP_GPS_DEVICE, GpsFusion
+from gps_replay import read_header, read_recording
+from gps_trace import LatencyTracer
+
+logger = logging.getLogger(__name__)
+
+CLIENT_COUNTS = (1, 10, 100, 1000)
+SHIP_ID = "SHIP456"
+DEVICE_ID = "benchmark"
+DEBOUNCE_INTERVAL = 0.5  # Same as the server, applied on the recorded clock
+FANOUT_BUFFER_SIZE = 256
+CLIENT_QUEUE_SIZE = 4
+CLIENT_EVICT_AFTER = 10
+TRACE_WINDOW = 16384  # Samples per stage the percentiles are taken over; bounded so RSS measures the pipeline
+SYNTHETIC_DEVICES = (TOP_GPS_DEVICE, '/dev/ttyACM1')
+SYNTHETIC_SECONDS = 1200  # Length of the synthetic track used when no recording is given
+CLIENT_WRITE_LIMIT = 64 * 1024  # Same as the server
+CLIENT_HIGH_WATER_BYTES = CLIENT_WRITE_LIMIT  # Same as the server
+CONNECT_TIMEOUT = 60  # Seconds for all loopback clients to connect
+
+
+class NullTransport:
+    """Transport stand-in that accepts everything immediately."""
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def abort(self):
+        pass
+
+
+class NullWebSocket:
+    """Simulated local client: send() returns at once and counts what was sent.
+
+    Nothing is framed or written to a socket, so 'null' transport results
+    measure the pipeline only; see --loopback for real connections.
+    """
+
+    def __init__(self, index):
+        self.remote_address = ('benchmark', index)
+        self.transport = NullTransport()
+        self.messages = 0
+        self.bytes = 0
+
+    async def send(self, message):
+        self.messages += 1
+        self.bytes += len(message)
+
+
+def load_recording(path):
+    """Return (devices, [(recorded time, gpsd JSON line)]) from a gpsd recording."""
+    with open(path, 'rb') as f:
+        meta = read_header(f)
+    if meta.get("kind") != 'gpsd':
+        raise ValueError(f"{path} is a {meta.get('kind')} recording, the benchmark needs a gpsd recording")
+    now = meta.get("started", 0.0)
+    records = []
+    devices = set()
+    for delta, _, payload in read_recording(path):
+        now += delta
+        records.append((now, payload))
+        if b'"device"' in payload:
+            try:
+                device = json.loads(payload).get('device')
+            except ValueError:
+                continue
+            if device:
+                devices.add(device)
+    # The server orders receivers the same way, so the first one drives the heading
+    return sorted(devices), records
+
+
+def synthetic_records(seconds, seed=1):
+    """Deterministic gpsd output for two receivers: 1 Hz TPV and a SKY report every 5 seconds."""
+    rng = random.Random(seed)
+    lat, lon, track = 35.1, 129.04, 90.0
+    records = []
+    start = 1_700_000_000.0
+    for second in range(seconds):
+        track = (track + rng.uniform(-3, 3)) % 360
+        speed = 5 + rng.uniform(-0.5, 0.5)
+        lat += speed * math.cos(math.radians(track)) / 111_320
+        lon += speed * math.sin(math.radians(track)) / (111_320 * math.cos(math.radians(lat)))
+        for index, device in enumerate(SYNTHETIC_DEVICES):
+            now = start + second + index * 0.01
+            report = {"class": "TPV", "device": device, "mode": 3, "lat": lat + index * 1e-5, "lon": lon,
+                      "alt": 12.5, "speed": speed, "track": track}
+            records.append((now, (json.dumps(report) + "\n").encode()))
+            if second % 5 == 0:
+                satellites = [{"PRN": prn, "used": prn % 3 != 0, "ss": 30 + prn % 10} for prn in range(1, 15)]
+                report = {"class": "SKY", "device": device, "satellites": satellites}
+                records.append((now + 0.005, (json.dumps(report) + "\n").encode()))
+    return list(SYNTHETIC_DEVICES), records
+
+
+async def _drain_clients(port, clients):
+    async def receive():
+        messages = size = 0
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}", compression=None, ping_interval=None,
+                                          open_timeout=CONNECT_TIMEOUT, max_size=None) as websocket:
+                async for message in websocket:
+                    messages += 1
+                    size += len(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        return messages, size
+
+    received = await asyncio.gather(*(receive() for _ in range(clients)))
+    return sum(messages for messages, _ in received), sum(size for _, size in received)
+
+
+def drain_clients(port, clients):
+    """Connect `clients` WebSocket clients to the loopback server and read until it closes them.
+
+    Runs in its own process, so receiving does not count against the pipeline's CPU.
+    Returns (messages, bytes) received.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return asyncio.run(_drain_clients(port, clients))
+
+
+class LoopbackClients:
+    """Real WebSocket connections over 127.0.0.1 for the pipeline to send to.
+
+    The server side runs in the benchmark process like the real server (no
+    permessage-deflate); the clients run in a child process.
+    """
+
+    def __init__(self, clients):
+        self.clients = clients
+        self.sockets = []
+        self.server = None
+        self.executor = None
+        self.drained = None
+        self.all_connected = asyncio.Event()
+
+    async def _handler(self, websocket, path=None):
+        self.sockets.append(websocket)
+        if len(self.sockets) == self.clients:
+            self.all_connected.set()
+        await websocket.wait_closed()
+
+    async def start(self):
+        self.server = await websockets.serve(self._handler, '127.0.0.1', 0, compression=None, ping_interval=None,
+                                             write_limit=CLIENT_WRITE_LIMIT)
+        port = self.server.sockets[0].getsockname()[1]
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        self.drained = asyncio.get_running_loop().run_in_executor(self.executor, drain_clients, port, self.clients)
+        await asyncio.wait_for(self.all_connected.wait(), CONNECT_TIMEOUT)
+        return self.sockets
+
+    async def close(self):
+        """Close every connection and return (messages, bytes) the clients received."""
+        self.server.close()
+        await self.server.wait_closed()
+        try:
+            return await self.drained
+        finally:
+            self.executor.shutdown()
+
+
+def rss_kb():
+    """Current resident set size in KiB (Linux), or None."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+async def run_pipeline(devices, records, clients, repeat=1, loopback=False):
+    """Replay records through fusion and the fan-out to `clients` WebSocket clients.
+
+    Mirrors process_gps_data() and broadcast_gps_data() in the server: JSON
+    decode, fusion, tracing, publish, then one encoding per fix offered to
+    every client's ClientSender. Each fix reaches every client before the
+    next report is fed in, so nothing is conflated, fixes_per_s is what the
+    pipeline can sustain on one core, and stage latencies exclude queueing.
+    The clients are NullWebSockets, or with loopback real connections that
+    add framing and socket writes. A client whose sender ends on a send
+    error or eviction stops being waited for and counts in clients_lost.
+    Returns the measurements of one run.
+    """
+    fusion = GpsFusion(devices, SHIP_ID, DEVICE_ID, DEBOUNCE_INTERVAL)
+    tracer = LatencyTracer(TRACE_WINDOW)
+    broadcaster = FixBroadcaster(FANOUT_BUFFER_SIZE)
+    subscription = broadcaster.subscribe("local_clients")
+    client_stats = {'connections': clients, 'sent': 0, 'conflated': 0, 'evicted': 0, 'send_errors': 0}
+    delivered = asyncio.Event()
+    waiting = set()  # Senders the fix in flight has not reached yet
+
+    def on_sent(sender, fix):
+        tracer.stage(fix, "client", sent=time.monotonic())
+        waiting.discard(sender)
+        if not waiting:
+            delivered.set()
+
+    def on_done(sender, task):
+        # A sender whose task ended on a send error or eviction will never report the fix in flight
+        live.discard(sender)
+        waiting.discard(sender)
+        if not waiting:
+            delivered.set()
+
+    loopback_clients = LoopbackClients(clients) if loopback else None
+    if loopback_clients is not None:
+        sockets = await loopback_clients.start()
+    else:
+        sockets = [NullWebSocket(index) for index in range(clients)]
+    senders = []
+    for websocket in sockets:
+        sender = ClientSender(websocket, client_stats, CLIENT_QUEUE_SIZE, CLIENT_HIGH_WATER_BYTES, CLIENT_EVICT_AFTER)
+        sender.on_sent = functools.partial(on_sent, sender)
+        sender.task.add_done_callback(functools.partial(on_done, sender))
+        senders.append(sender)
+    live = set(senders)
+
+    async def broadcast():
+        while True:
+            fix = await subscription.get()
+            dequeued = time.monotonic()
+            if not fix.is_complete() or not live:
+                delivered.set()
+                continue
+            fix.to_dict()
+            waiting.update(live)
+            for sender in senders:
+                if sender in live:
+                    sender.offer(fix.to_json(), fix)
+            tracer.stage(fix, "local_clients", dequeued=dequeued, queued=time.monotonic())
+
+    consumer = asyncio.create_task(broadcast())
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    reports = 0
+    offset = 0.0
+    span = records[-1][0] - records[0][0] + 1.0 if records else 0.0
+    for _ in range(repeat):
+        for recorded, payload in records:
+            received = time.monotonic()
+            reports += 1
+            try:
+                report = json.loads(payload)
+            except ValueError:
+                continue
+            if not isinstance(report, dict):
+                continue
+            fix = fusion.update(report, now=recorded + offset)
+            tracer.observe("parse_fusion", time.monotonic() - received)
+            if fix is not None:
+                tracer.start(fix, received)
+                delivered.clear()
+                broadcaster.publish(fix)
+                await delivered.wait()
+        offset += span
+    duration = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    consumer.cancel()
+    lost = clients - len(live)
+    for sender in senders:
+        sender.close()
+
+    if loopback_clients is not None:
+        messages, size = await loopback_clients.close()
+    else:
+        messages = sum(websocket.messages for websocket in sockets)
+        size = sum(websocket.bytes for websocket in sockets)
+    return {
+        "clients": clients,
+        "transport": 'loopback' if loopback else 'null',
+        "reports": reports,
+        "fixes": fusion.fixes,
+        "duration_s": round(duration, 4),
+        "reports_per_s": round(reports / duration, 1),
+        "fixes_per_s": round(fusion.fixes / duration, 1),
+        "messages_sent": messages,
+        "messages_per_s": round(messages / duration, 1),
+        "bytes_sent": size,
+        "send_errors": client_stats['send_errors'],
+        "evicted": client_stats['evicted'],
+        "clients_lost": lost,
+        "cpu_s": round(cpu, 4),
+        "cpu_percent": round(100 * cpu / duration, 1),
+        "rss_kb": rss_kb(),
+        "rss_peak_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "stages_ms": tracer.percentiles(),
+    }
+
+
+def run_case(source, clients, repeat, loopback=False):
+    """Load the source and run one client count; runs in a fresh process so RSS is per case."""
+    logging.basicConfig(level=logging.WARNING)
+    devices, records = load_recording(source) if source else synthetic_records(SYNTHETIC_SECONDS)
+    return asyncio.run(run_pipeline(devices, records, clients, repeat, loopback))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(source=None, client_counts=CLIENT_COUNTS, repeat=1, rounds=3, loopback=False):
+    """Run every client count `rounds` times, each in a fresh process, and return the JSON-ready results.
+
+    The round with the median throughput is reported, which keeps one noisy
+    round from deciding a comparison between releases.
+    """
+    runs = []
+    context = multiprocessing.get_context('spawn')
+    for clients in client_counts:
+        results = []
+        for _ in range(rounds):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results.append(executor.submit(run_case, source, clients, repeat, loopback).result())
+        results.sort(key=lambda r: r["fixes_per_s"])
+        result = results[len(results) // 2]
+        result["rounds_fixes_per_s"] = [r["fixes_per_s"] for r in results]
+        logger.info(f"{clients} clients: {result['fixes_per_s']} fixes/s, {result['messages_per_s']} messages/s, "
+                    f"{result['cpu_percent']}% CPU, {result['rss_peak_kb']} KiB peak RSS")
+        runs.append(result)
+    return {
+        "benchmark": "gps_pipeline",
+        "created": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "host": {"platform": platform.platform(), "machine": platform.machine(),
+                 "python": platform.python_version(), "cpus": os.cpu_count()},
+        "source": source or f"synthetic:{SYNTHETIC_SECONDS}s",
+        # 'null': pipeline only, nothing framed or written to a socket; 'loopback': real local connections
+        "transport": 'loopback' if loopback else 'null',
+        "repeat": repeat,
+        "rounds": rounds,
+        "runs": runs,
+    }
+
+
+def compare(baseline, current, tolerance):
+    """Log throughput and p99 changes against a baseline result; return the regressions found."""
+    regressions = []
+    if baseline.get("transport", 'null') != current["transport"]:
+        logger.warning(f"Not comparing {current['transport']} transport results against a "
+                       f"{baseline.get('transport', 'null')} transport baseline")
+        return regressions
+    previous = {run["clients"]: run for run in baseline.get("runs", [])}
+    for run in current["runs"]:
+        base = previous.get(run["clients"])
+        if base is None:
+            continue
+        checks = [("fixes_per_s", base["fixes_per_s"], run["fixes_per_s"], False),
+                  ("cpu_s", base["cpu_s"], run["cpu_s"], True),
+                  ("rss_peak_kb", base["rss_peak_kb"], run["rss_peak_kb"], True)]
+        for stage in ("parse_fusion", "local_clients.total", "client.total"):
+            if stage in base["stages_ms"] and stage in run["stages_ms"]:
+                checks.append((f"{stage}.p99", base["stages_ms"][stage]["p99"], run["stages_ms"][stage]["p99"], True))
+        for name, old, new, lower_is_better in checks:
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if lower_is_better else change < -tolerance
+            logger.info(f"{run['clients']:>5} clients {name}: {old} -> {new} ({change:+.1%})"
+                        f"{'  REGRESSION' if worse else ''}")
+            if worse:
+                regressions.append((run["clients"], name, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GPS ingest-to-broadcast pipeline.")
+    parser.add_argument('recording', nargs='?',
+                        help=f"gpsd recording made with gps_replay.py record (default: {SYNTHETIC_SECONDS} "
+                             f"seconds of synthetic reports)")
+    parser.add_argument('--clients', type=int, nargs='+', default=list(CLIENT_COUNTS),
+                        help="WebSocket client counts to run")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the recording this many times per run")
+    parser.add_argument('--rounds', type=int, default=3, help="runs per client count; the median is reported")
+    parser.add_argument('--loopback', action='store_true',
+                        help="send to real WebSocket clients over 127.0.0.1 instead of null sockets")
+    parser.add_argument('--output', help="write the JSON results here instead of stdout")
+    parser.add_argument('--compare', help="earlier JSON results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="relative change counted as a regression by --compare (default 0.1)")
+    args = parser.parse_args()
+
+    if args.loopback and websockets is None:
+        parser.error("--loopback needs the websockets package")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    results = run_benchmark(args.recording, args.clients, args.repeat, args.rounds, args.loopback)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        logger.info(f"Wrote results to {args.output}")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            logger.error(f"{len(regressions)} regressions beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from queue import Empty
+
+logger = logging.getLogger(__name__)
+
+
+POLICIES = ('drop-oldest', 'conflate-latest', 'spill')
+
+
+class Subscription:
+    """One sink's read cursor into a FixBroadcaster ring buffer."""
+
+    def __init__(self, broadcaster, name, cursor, policy='drop-oldest', spill=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}, expected one of {POLICIES}")
+        if policy == 'spill' and spill is None:
+            raise ValueError("The spill policy needs a spill callback")
+        self.broadcaster = broadcaster
+        self.name = name
+        self.cursor = cursor
+        self.policy = policy
+        self.spill = spill
+        self.delivered = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.spilled = 0
+        self.waiter = None
+
+    @property
+    def lag(self):
+        """Number of published fixes this sink has not consumed yet."""
+        return min(self.broadcaster.head - self.cursor, self.broadcaster.capacity)
+
+    def get_nowait(self):
+        """Return the next fix for this sink or raise queue.Empty."""
+        return self.broadcaster._read(self)
+
+    async def get(self):
+        """Wait until a fix is published and return it, without polling."""
+        while self.cursor >= self.broadcaster.head:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        return self.broadcaster._read(self)
+
+    def skip(self):
+        """Jump to the newest fix, e.g. after a reconnect made older fixes stale."""
+        self.cursor = self.broadcaster.head
+
+    def stats(self):
+        return {"policy": self.policy, "lag": self.lag, "delivered": self.delivered, "dropped": self.dropped,
+                "conflated": self.conflated, "spilled": self.spilled}
+
+
+class FixBroadcaster:
+    """Single-producer, multi-consumer fan-out of fixes.
+
+    Every published fix is kept in a fixed-size ring and each subscriber reads it
+    through its own cursor, so sinks never take fixes away from each other, and
+    memory stays flat however long a sink stalls. What a sink that falls behind
+    loses depends on its policy:
+
+    - 'drop-oldest': past `capacity` fixes behind, the oldest are dropped
+      (counted in `dropped`).
+    - 'conflate-latest': the sink only ever gets the newest fix; the ones it
+      skips are counted in `conflated`.
+    - 'spill': fixes about to be overwritten are passed to the subscription's
+      spill callback (e.g. written to a disk spool). The callback returns
+      whether it kept the fix; only kept fixes are counted in `spilled`.
+
+    The broadcaster belongs to the event loop: other threads must hand fixes over
+    with `loop.call_soon_threadsafe(broadcaster.publish, fix)`.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.ring = [None] * capacity
+        self.head = 0
+        self.subscriptions = []
+
+    def subscribe(self, name, policy='drop-oldest', spill=None):
+        sub = Subscription(self, name, self.head, policy, spill)
+        self.subscriptions.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        if sub in self.subscriptions:
+            self.subscriptions.remove(sub)
+
+    def publish(self, fix):
+        for sub in self.subscriptions:
+            if sub.policy == 'spill' and self.head - sub.cursor >= self.capacity:
+                # The oldest unread fix is about to be overwritten: hand it over instead
+                try:
+                    if sub.spill(self.ring[sub.cursor % self.capacity]):
+                        sub.spilled += 1
+                except Exception as e:
+                    sub.dropped += 1
+                    logger.error(f"Sink {sub.name} failed to spill a fix: {e}")
+                sub.cursor += 1
+        self.ring[self.head % self.capacity] = fix
+        self.head += 1
+        for sub in self.subscriptions:
+            if sub.waiter is not None and not sub.waiter.done():
+                sub.waiter.set_result(None)
+
+    def _read(self, sub):
+        if sub.cursor >= self.head:
+            raise Empty
+        behind = self.head - sub.cursor
+        if sub.policy == 'conflate-latest' and behind > 1:
+            sub.conflated += behind - 1
+            sub.cursor = self.head - 1
+        elif behind > self.capacity:
+            missed = behind - self.capacity
+            sub.dropped += missed
+            sub.cursor += missed
+            logger.warning(f"Sink {sub.name} fell behind, dropped {missed} fixes")
+        fix = self.ring[sub.cursor % self.capacity]
+        sub.cursor += 1
+        sub.delivered += 1
+        return fix
+
+    def stats(self):
+        """Per-sink depth, delivery and loss counters."""
+        return {sub.name: sub.stats() for sub in self.subscriptions}
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class ClientSender:
+    """Bounded send queue and writer task for one local WebSocket client.
+
+    offer() never blocks the broadcaster. When the queue is full the oldest
+    queued position update is dropped, so a slow client always catches up on
+    the latest fix instead of replaying stale ones. A client that stays
+    congested (queue full or more than high_water_bytes waiting in its socket
+    buffer) for longer than evict_after seconds is disconnected.
+    """
+
+    def __init__(self, websocket, stats, queue_size=4, high_water_bytes=64 * 1024, evict_after=10, binary=False,
+                 on_sent=None):
+        self.websocket = websocket
+        self.binary = binary  # Client negotiated the gps.bin.v1 subprotocol
+        self.on_sent = on_sent  # Called with the fix once its message is written to the socket
+        self.stats = stats
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.high_water_bytes = high_water_bytes
+        self.evict_after = evict_after
+        self.congested_since = None
+        self.evicted = False
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def buffered_bytes(self):
+        transport = self.websocket.transport
+        return transport.get_write_buffer_size() if transport is not None else 0
+
+    def offer(self, message, fix=None):
+        if self.evicted:
+            return
+        if len(self.queue) >= self.queue_size:
+            self.queue.popleft()
+            self.stats['conflated'] += 1
+        self.queue.append((message, fix))
+        self.wakeup.set()
+
+        if len(self.queue) >= self.queue_size or self.buffered_bytes() > self.high_water_bytes:
+            now = time.monotonic()
+            if self.congested_since is None:
+                self.congested_since = now
+            elif now - self.congested_since > self.evict_after:
+                self.evict()
+        else:
+            self.congested_since = None
+
+    def evict(self):
+        """Drop a client that cannot keep up; its handler sees the connection close."""
+        self.evicted = True
+        self.queue.clear()
+        self.stats['evicted'] += 1
+        logger.warning(f"Disconnecting slow client {self.websocket.remote_address}: "
+                       f"{self.buffered_bytes()} bytes unsent for over {self.evict_after} seconds")
+        self.task.cancel()
+        if self.websocket.transport is not None:
+            self.websocket.transport.abort()
+
+    async def _run(self):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.queue:
+                    message, fix = self.queue.popleft()
+                    await self.websocket.send(message)
+                    self.stats['sent'] += 1
+                    if self.on_sent is not None and fix is not None:
+                        self.on_sent(fix)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.stats['send_errors'] += 1
+            logger.debug(f"Send to {self.websocket.remote_address} failed: {e}")
+
+    def close(self):
+        self.task.cancel()
@@ -0,0 +1,222 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from gps_import import TEXT_COLUMNS, parse_range
+from gps_session import COMPRESSED_SUFFIX, session_files
+from gps_spool import Spool
+from gps_track_store import MISSING_INT, RECEIVER_FIELDS
+
+logger = logging.getLogger(__name__)
+
+GPS_DATA_DIR = '/home/mdt/GPS'
+COMPRESSION_HEADER = 'X-GPS-Batch-Compression'  # Handshake header offering/accepting zstd batches
+DICTIONARY_SIZE = 16 * 1024
+SAMPLE_RECORDS = 50  # Records per training sample, about one backlog batch after simplification
+
+
+def load_dictionary(path):
+    """Return the trained zstd dictionary at path, or None if it is missing."""
+    if zstandard is None or not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return zstandard.ZstdCompressionDict(f.read())
+
+
+def offer_header(dictionary):
+    """Value of COMPRESSION_HEADER announcing zstd batches with this dictionary."""
+    return f"zstd; dict={dictionary.dict_id()}" if dictionary is not None else "zstd"
+
+
+class BatchCompressor:
+    """zstd compressor for backlog batch frames, with ratio and CPU-time counters."""
+
+    def __init__(self, dictionary=None, level=3):
+        if zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        self.compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+        self.frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def compress(self, data):
+        started = time.thread_time()
+        compressed = self.compressor.compress(data)
+        self.cpu_seconds += time.thread_time() - started
+        self.frames += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(compressed)
+        return compressed
+
+    @property
+    def ratio(self):
+        return self.bytes_in / self.bytes_out if self.bytes_out else 0.0
+
+    def stats(self):
+        return {"frames": self.frames, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                "ratio": round(self.ratio, 2), "cpu_seconds": round(self.cpu_seconds, 3)}
+
+
+class _LinkProbe:
+    """Pass-through WebSocket extension that hands each outgoing data frame to a LinkCounter."""
+
+    name = 'gps-link-probe'
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def encode(self, frame):
+        if frame.opcode < 8:  # Data frames only, not pings and closes
+            self.callback(frame)
+        return frame
+
+    def decode(self, frame, *, max_size=None):
+        return frame
+
+
+class LinkCounter:
+    """Uplink bytes before and after per-message compression, with its CPU time.
+
+    attach() brackets a connection's extensions with two probes, so the
+    counters see every data frame as sent and as written to the socket
+    whether permessage-deflate was negotiated or not. stats() has the same
+    shape as BatchCompressor.stats(), so links can be compared.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        self._started = None
+
+    def attach(self, websocket):
+        extensions = websocket.extensions
+        if any(isinstance(extension, _LinkProbe) for extension in extensions):
+            return
+        extensions.insert(0, _LinkProbe(self._before))
+        extensions.append(_LinkProbe(self._after))
+
+    def _before(self, frame):
+        self.frames += 1
+        self.bytes_in += len(frame.data)
+        self._started = time.thread_time()
+
+    def _after(self, frame):
+        self.bytes_out += len(frame.data)
+        if self._started is not None:
+            self.cpu_seconds += time.thread_time() - self._started
+            self._started = None
+
+    @property
+    def ratio(self):
+        return self.bytes_in / self.bytes_out if self.bytes_out else 0.0
+
+    def stats(self):
+        return {"frames": self.frames, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                "ratio": round(self.ratio, 2), "cpu_seconds": round(self.cpu_seconds, 3)}
+
+
+class BatchDecompressor:
+    """Shore-side counterpart of BatchCompressor."""
+
+    def __init__(self, dictionary=None):
+        if zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        self.decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+
+    def decompress(self, data):
+        return self.decompressor.decompress(data)
+
+
+def session_records(path):
+    """Yield the fixes of a gps_data_*.txt(.gz) session file in the uplink JSON shape.
+
+    The file is parsed by gps_import, so every session layout it reads is covered.
+    """
+    receiver_columns = [f"{prefix}_{field}" for prefix in ('top', 'bottom') for field in RECEIVER_FIELDS]
+    columns = {name: [] for name in ('time', 'heading', *receiver_columns, *TEXT_COLUMNS)}
+    parse_range(path, 0, None, columns)
+    for row in range(len(columns['time'])):
+        gps_data = []
+        for prefix, name in (('top', 'top_gps'), ('bottom', 'bottom_gps')):
+            receiver = {"gps": name}
+            for field in RECEIVER_FIELDS:
+                value = columns[f"{prefix}_{field}"][row]
+                missing = value == MISSING_INT if field == 'satellites' else value != value
+                receiver[field] = None if missing else value
+            prns = columns[f"{prefix}_satellite_prns"][row] or ''
+            receiver["satellite_prns"] = [prn.strip() for prn in prns.split(",") if prn.strip()]
+            gps_data.append(receiver)
+        heading = columns['heading'][row]
+        when = datetime.fromtimestamp(columns['time'][row], timezone.utc)
+        yield json.dumps({
+            "timestamp": when.strftime('%Y-%m-%d %H:%M:%S.%f'),
+            "ship_id": columns['ship_id'][row],
+            "device_id": columns['device_id'][row],
+            "heading": None if heading != heading else heading,
+            "gps_data": gps_data
+        })
+
+
+def collect_records(paths):
+    """Yield JSON fix records from session files, offline JSON logs and spool directories."""
+    for path in paths:
+        if os.path.isdir(path):
+            spool = Spool(path)
+            for _, _, payload in spool.read_from(spool.committed):
+                yield payload.decode()
+            spool.close()
+        elif path.endswith('.txt') or path.endswith('.txt' + COMPRESSED_SUFFIX):
+            yield from session_records(path)
+        else:
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        yield line.strip()
+
+
+def train_dictionary(records, dict_size=DICTIONARY_SIZE, sample_records=SAMPLE_RECORDS):
+    """Train a zstd dictionary on batch-shaped samples of JSON fix records."""
+    samples = []
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= sample_records:
+            samples.append(('{"type":"gps_batch","records":[' + ','.join(batch) + ']}').encode())
+            batch = []
+    if batch:
+        samples.append(('{"type":"gps_batch","records":[' + ','.join(batch) + ']}').encode())
+    return zstandard.train_dictionary(dict_size, samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the zstd dictionary used for uplink backlog batches.")
+    parser.add_argument('output', help="dictionary file to write")
+    parser.add_argument('inputs', nargs='*',
+                        help=f"session .txt files, offline JSON logs or spool directories "
+                             f"(default: {GPS_DATA_DIR}/gps_data_*.txt)")
+    parser.add_argument('--size', type=int, default=DICTIONARY_SIZE, help="dictionary size in bytes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if zstandard is None:
+        parser.error("the zstandard package is not installed")
+    paths = args.inputs or session_files(GPS_DATA_DIR)
+    dictionary = train_dictionary(collect_records(paths), args.size)
+    with open(args.output, 'wb') as f:
+        f.write(dictionary.as_bytes())
+    logger.info(f"Wrote {len(dictionary.as_bytes())} byte dictionary {dictionary.dict_id()} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import struct
+from datetime import datetime, timezone
+
+from gps_wire import COORD_SCALE, MISSING_COORD, MISSING_SATELLITES, MISSING_SPEED, SEQ
+
+SCHEMA_KEYFRAME = 2
+SCHEMA_DELTA = 3
+FLAG_TOP = 0x01  # Keyframe: receiver present. Delta: receiver's PRN set changed
+FLAG_BOTTOM = 0x02
+FLAG_SEQ = 0x04  # Keyframe: a uint32 fix sequence number follows. Delta: a varint step from the last one does
+
+# schema id, sequence number, flags
+FRAME_HEADER = struct.Struct('<BHB')
+# microseconds since the epoch, heading in 0.1 degrees
+KEYFRAME_HEADER = struct.Struct('<qi')
+# latitude and longitude in 1e-7 degrees, altitude (mm), speed (0.01 km/h), satellites used, PRN count
+KEYFRAME_RECEIVER = struct.Struct('<iiiHBB')
+MISSING_HEADING = -2 ** 31
+MISSING_ALTITUDE = -2 ** 31
+RECEIVER_NAMES = ("top_gps", "bottom_gps")
+
+
+def _quantize_receiver(rx):
+    """Integer state of one receiver: the values deltas are taken between."""
+    return (
+        MISSING_COORD if rx.latitude is None else round(rx.latitude * COORD_SCALE),
+        MISSING_COORD if rx.longitude is None else round(rx.longitude * COORD_SCALE),
+        MISSING_ALTITUDE if rx.altitude is None else round(rx.altitude * 1000),
+        MISSING_SPEED if rx.speed is None else min(round(rx.speed * 100), MISSING_SPEED - 1),
+        MISSING_SATELLITES if rx.satellites is None else min(rx.satellites, MISSING_SATELLITES - 1),
+    ), tuple(rx.satellite_prns[:255])
+
+
+def _write_varint(out, value):
+    value = (value << 1) ^ (value >> 63)  # zigzag, so small negative deltas stay short
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1) ^ -(value & 1), offset
+
+
+class DeltaEncoder:
+    """Stateful encoder for the gps.delta.v1 uplink subprotocol.
+
+    The first fix, every keyframe_interval-th fix and any fix whose set of
+    receivers differs from the last keyframe are sent as a keyframe holding the
+    full fix. Other fixes are sent as zigzag varint deltas of the quantized
+    values against the previous fix, and a receiver's PRN list is only sent
+    when it changed. The fusion's fix sequence number, when set, is carried
+    too, so the server can spot gaps and duplicates. A typical delta is about
+    20 bytes. Use one encoder per connection so every connection starts with a
+    keyframe.
+    """
+
+    def __init__(self, keyframe_interval=60):
+        self.keyframe_interval = keyframe_interval
+        self.seq = 0
+        self.since_keyframe = None
+        self.state = None
+        self.fix_seq = None
+        self.keyframes = 0
+        self.deltas = 0
+
+    def encode(self, fix):
+        receivers = [rx for rx in (fix.top, fix.bottom) if rx is not None]
+        present = (fix.top is not None, fix.bottom is not None)
+        state = (
+            round(fix.time * 10 ** 6),
+            MISSING_HEADING if fix.heading is None else round(fix.heading * 10),
+            present,
+            [_quantize_receiver(rx) for rx in receivers],
+        )
+        self.seq = (self.seq + 1) & 0xFFFF
+        if (self.state is None or self.state[2] != present or
+                self.since_keyframe + 1 >= self.keyframe_interval):
+            frame = self._keyframe(fix, state)
+            self.since_keyframe = 0
+            self.keyframes += 1
+        else:
+            frame = self._delta(fix, state)
+            self.since_keyframe += 1
+            self.deltas += 1
+        self.state = state
+        self.fix_seq = fix.seq
+        return frame
+
+    def _keyframe(self, fix, state):
+        flags = (FLAG_TOP if state[2][0] else 0) | (FLAG_BOTTOM if state[2][1] else 0)
+        if fix.seq is not None:
+            flags |= FLAG_SEQ
+        out = bytearray(FRAME_HEADER.pack(SCHEMA_KEYFRAME, self.seq, flags))
+        out += KEYFRAME_HEADER.pack(state[0], state[1])
+        if fix.seq is not None:
+            out += SEQ.pack(fix.seq & 0xFFFFFFFF)
+        for value in (fix.ship_id, fix.device_id):
+            data = (value or '').encode()[:255]
+            out.append(len(data))
+            out += data
+        for values, prns in state[3]:
+            out += KEYFRAME_RECEIVER.pack(*values, len(prns))
+            out += struct.pack(f'<{len(prns)}H', *prns)
+        return bytes(out)
+
+    def _delta(self, fix, state):
+        previous = self.state
+        flags = 0
+        body = bytearray()
+        if fix.seq is not None:
+            flags |= FLAG_SEQ
+            _write_varint(body, fix.seq - (self.fix_seq or 0))
+        _write_varint(body, state[0] - previous[0])
+        _write_varint(body, state[1] - previous[1])
+        for (values, prns), (old_values, old_prns), flag in zip(state[3], previous[3], (FLAG_TOP, FLAG_BOTTOM)):
+            for value, old in zip(values, old_values):
+                _write_varint(body, value - old)
+            if prns != old_prns:
+                flags |= flag
+                _write_varint(body, len(prns))
+                for prn in prns:
+                    _write_varint(body, prn)
+        return FRAME_HEADER.pack(SCHEMA_DELTA, self.seq, flags) + bytes(body)
+
+
+class DeltaDecoder:
+    """Decode gps.delta.v1 frames into the dict shape of GpsFix.to_dict().
+
+    Raises ValueError for a delta that does not follow the previous frame in
+    sequence (or arrives before any keyframe); decoding resumes at the next
+    keyframe.
+    """
+
+    def __init__(self):
+        self.seq = None
+        self.time_us = None
+        self.heading = None
+        self.ship_id = None
+        self.device_id = None
+        self.fix_seq = None
+        self.present = None
+        self.receivers = None  # [values list, prns tuple] per present receiver
+
+    def decode(self, data):
+        schema, seq, flags = FRAME_HEADER.unpack_from(data, 0)
+        offset = FRAME_HEADER.size
+        if schema == SCHEMA_KEYFRAME:
+            self._keyframe(data, offset, flags)
+        elif schema == SCHEMA_DELTA:
+            if self.seq is None or seq != (self.seq + 1) & 0xFFFF:
+                self.seq = None
+                raise ValueError(f"GPS delta frame {seq} out of sequence; waiting for a keyframe")
+            self._delta(data, offset, flags)
+        else:
+            raise ValueError(f"Unknown GPS delta schema {schema}")
+        self.seq = seq
+        return self.to_dict()
+
+    def _keyframe(self, data, offset, flags):
+        self.time_us, self.heading = KEYFRAME_HEADER.unpack_from(data, offset)
+        offset += KEYFRAME_HEADER.size
+        self.fix_seq = None
+        if flags & FLAG_SEQ:
+            (self.fix_seq,) = SEQ.unpack_from(data, offset)
+            offset += SEQ.size
+        strings = []
+        for _ in range(2):
+            length = data[offset]
+            strings.append(data[offset + 1:offset + 1 + length].decode())
+            offset += 1 + length
+        self.ship_id, self.device_id = strings
+        self.present = (bool(flags & FLAG_TOP), bool(flags & FLAG_BOTTOM))
+        self.receivers = []
+        for _ in range(sum(self.present)):
+            *values, count = KEYFRAME_RECEIVER.unpack_from(data, offset)
+            offset += KEYFRAME_RECEIVER.size
+            prns = struct.unpack_from(f'<{count}H', data, offset)
+            offset += 2 * count
+            self.receivers.append([values, prns])
+
+    def _delta(self, data, offset, flags):
+        if flags & FLAG_SEQ:
+            delta, offset = _read_varint(data, offset)
+            self.fix_seq = ((self.fix_seq or 0) + delta) & 0xFFFFFFFF
+        else:
+            self.fix_seq = None
+        delta, offset = _read_varint(data, offset)
+        self.time_us += delta
+        delta, offset = _read_varint(data, offset)
+        self.heading += delta
+        for receiver, flag in zip(self.receivers, (FLAG_TOP, FLAG_BOTTOM)):
+            values = receiver[0]
+            for i in range(len(values)):
+                delta, offset = _read_varint(data, offset)
+                values[i] += delta
+            if flags & flag:
+                count, offset = _read_varint(data, offset)
+                prns = []
+                for _ in range(count):
+                    prn, offset = _read_varint(data, offset)
+                    prns.append(prn)
+                receiver[1] = tuple(prns)
+
+    def to_dict(self):
+        when = datetime.fromtimestamp(self.time_us // 10 ** 6, timezone.utc).replace(
+            microsecond=self.time_us % 10 ** 6)
+        receivers = iter(self.receivers)
+        gps_data = []
+        for name, present in zip(RECEIVER_NAMES, self.present):
+            if not present:
+                gps_data.append({"gps": name, "latitude": None, "longitude": None, "altitude": None,
+                                 "speed": None, "satellites": None, "satellite_prns": []})
+                continue
+            (lat, lon, alt, speed, satellites), prns = next(receivers)
+            gps_data.append({
+                "gps": name,
+                "latitude": None if lat == MISSING_COORD else lat / COORD_SCALE,
+                "longitude": None if lon == MISSING_COORD else lon / COORD_SCALE,
+                "altitude": None if alt == MISSING_ALTITUDE else alt / 1000,
+                "speed": None if speed == MISSING_SPEED else speed / 100,
+                "satellites": None if satellites == MISSING_SATELLITES else satellites,
+                "satellite_prns": [str(prn) for prn in prns]
+            })
+        fix = {
+            "timestamp": when.strftime('%Y-%m-%d %H:%M:%S.%f'),
+            "ship_id": self.ship_id,
+            "device_id": self.device_id,
+            "heading": None if self.heading == MISSING_HEADING else self.heading / 10,
+            "gps_data": gps_data
+        }
+        if self.fix_seq is not None:
+            fix["seq"] = self.fix_seq
+        return fix
@@ -0,0 +1,214 @@
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from gps_wire import encode_fix
+
+logger = logging.getLogger(__name__)
+
+TOP_GPS_DEVICE = '/dev/ttyACM0'
+TEXT_SEPARATOR = "---------------------------"
+
+
+class ReceiverFix:
+    """Latest position and satellite state reported by one GPS receiver."""
+    __slots__ = ('device', 'latitude', 'longitude', 'altitude', 'speed', 'satellites', 'satellite_prns')
+
+    def __init__(self, device, latitude=None, longitude=None, altitude=None, speed=None,
+                 satellites=None, satellite_prns=()):
+        self.device = device
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.speed = speed
+        self.satellites = satellites
+        self.satellite_prns = tuple(satellite_prns)
+
+    def copy(self):
+        return ReceiverFix(self.device, self.latitude, self.longitude, self.altitude,
+                           self.speed, self.satellites, self.satellite_prns)
+
+    def is_complete(self):
+        return (self.latitude is not None and
+                self.longitude is not None and
+                self.altitude is not None and
+                self.speed is not None and
+                self.satellites is not None)
+
+    def to_dict(self, name):
+        return {
+            "gps": name,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "altitude": self.altitude,
+            "speed": self.speed,
+            "satellites": self.satellites,
+            "satellite_prns": [str(prn) for prn in self.satellite_prns]
+        }
+
+
+class GpsFix:
+    """Fused dual-receiver fix passed between pipeline stages without re-parsing."""
+    __slots__ = ('time', 'ship_id', 'device_id', 'heading', 'top', 'bottom', 'seq', '_dict', '_json', '_binary',
+                 'trace')
+
+    def __init__(self, time, ship_id, device_id, heading, top=None, bottom=None, seq=None):
+        self.time = time
+        self.ship_id = ship_id
+        self.device_id = device_id
+        self.heading = heading
+        self.top = top
+        self.bottom = bottom
+        self.seq = seq  # Position in the fusion's output since start, so clients can spot gaps and duplicates
+        self._dict = None
+        self._json = None
+        self._binary = None
+        self.trace = None  # Monotonic pipeline stamps, see gps_trace.LatencyTracer
+
+    @property
+    def timestamp(self):
+        """UTC timestamp string in the format used by the session text files."""
+        return datetime.fromtimestamp(self.time, timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    def receivers(self):
+        """Return (label, receiver) pairs in device order, skipping missing receivers."""
+        pairs = [("Top GPS", self.top), ("Bottom GPS", self.bottom)]
+        return sorted(((label, rx) for label, rx in pairs if rx is not None), key=lambda p: p[1].device)
+
+    def is_complete(self):
+        return (self.top is not None and self.top.is_complete() and
+                self.bottom is not None and self.bottom.is_complete())
+
+    def to_dict(self):
+        """Return the JSON message shape sent to WebSocket clients and the external server.
+
+        The dict is built once and shared, so callers must not mutate it.
+        """
+        if self._dict is None:
+            self._dict = {
+                "timestamp": self.timestamp,
+                "ship_id": self.ship_id,
+                "device_id": self.device_id,
+                "heading": self.heading,
+                "gps_data": [
+                    (self.top or ReceiverFix(None)).to_dict("top_gps"),
+                    (self.bottom or ReceiverFix(None)).to_dict("bottom_gps")
+                ]
+            }
+            if self.seq is not None:
+                self._dict["seq"] = self.seq
+        return self._dict
+
+    def to_json(self):
+        """Return the JSON-encoded message, encoded once per fix."""
+        if self._json is None:
+            self._json = json.dumps(self.to_dict())
+        return self._json
+
+    def to_binary(self):
+        """Return the gps.bin.v1 wire encoding (see gps_wire), encoded once per fix."""
+        if self._binary is None:
+            self._binary = encode_fix(self)
+        return self._binary
+
+    def to_text(self):
+        """Render the block written to the gps_data_*.txt session files."""
+        output = [
+            f"GPS Data (Real-Time): {self.timestamp}",
+            f"Ship ID: {self.ship_id}",
+            f"Device ID: {self.device_id}",
+            f"Heading: {self.heading if self.heading is not None else 'Unknown'}"
+        ]
+        for label, rx in self.receivers():
+            output.extend([
+                f"{label} ({rx.device}):",
+                f"  Latitude: {rx.latitude}",
+                f"  Longitude: {rx.longitude}",
+                f"  Altitude (m): {rx.altitude}",
+                f"  Speed (km/h): {rx.speed}",
+                f"  Satellites: {rx.satellites}",
+                f"  Satellite PRNs: {', '.join(str(prn) for prn in rx.satellite_prns)}"
+            ])
+        return "\n".join(output) + "\n" + TEXT_SEPARATOR + "\n"
+
+
+class GpsFusion:
+    """Merge gpsd TPV/SKY reports from the receivers into complete GpsFix records.
+
+    Reports are plain gpsd JSON dicts, so the fusion works the same whether they
+    come from gpsd, a recording or the direct serial reader.
+    """
+
+    def __init__(self, devices, ship_id, device_id, debounce_interval=0.5, data_timeout=30):
+        self.devices = list(devices)
+        self.ship_id = ship_id
+        self.device_id = device_id
+        self.debounce_interval = debounce_interval
+        self.data_timeout = data_timeout
+        self.receivers = {device: ReceiverFix(device) for device in self.devices}
+        self.heading = None
+        self.last_tpv_time = {device: 0 for device in self.devices}
+        self.last_data_time = {device: time.time() for device in self.devices}
+        self.reports = {}  # (device, report class) -> count
+        self.debounced = {device: 0 for device in self.devices}
+        self.fixes = 0
+
+    def update(self, report, now=None):
+        """Apply one report and return a new GpsFix once every receiver is complete."""
+        device = report.get('device')
+        rx = self.receivers.get(device)
+        if rx is None:
+            logger.debug(f"Ignoring report for unknown device: {device}")
+            return None
+
+        current_time = time.time() if now is None else now
+        self.last_data_time[device] = current_time
+        if current_time - min(self.last_data_time.values()) > self.data_timeout:
+            logger.warning(f"No data received from some devices for {self.data_timeout} seconds")
+
+        report_class = report.get('class')
+        key = (device, report_class)
+        self.reports[key] = self.reports.get(key, 0) + 1
+        if report_class == 'TPV':
+            if current_time - self.last_tpv_time[device] < self.debounce_interval:
+                self.debounced[device] += 1
+                return None  # Debounce TPV reports only
+            self.last_tpv_time[device] = current_time
+
+            speed = report.get('speed')
+            track = report.get('track')
+            if isinstance(speed, (int, float)):
+                speed = round(speed * 3.6, 2)  # Convert m/s to km/h
+            if isinstance(track, (int, float)):
+                track = round(track, 1)
+
+            rx.latitude = report.get('lat')
+            rx.longitude = report.get('lon')
+            rx.altitude = report.get('alt')
+            rx.speed = speed
+            if device == self.devices[0]:
+                self.heading = track
+
+        elif report_class == 'SKY':
+            if 'satellites' not in report:
+                return None  # Newer gpsd sends count-only SKY reports between full ones
+            used = [sat for sat in report['satellites'] if sat.get('used', False)]
+            prns = [sat['PRN'] for sat in used if sat.get('PRN')]
+            rx.satellites = len(used) if used else None
+            rx.satellite_prns = tuple(prns)
+            logger.debug(f"Device {device} using {len(used)} satellites with PRNs: {prns}")
+
+        else:
+            return None
+
+        if not all(self.receivers[dev].is_complete() for dev in self.devices):
+            return None
+        self.fixes += 1
+        fix = GpsFix(current_time, self.ship_id, self.device_id, self.heading, seq=self.fixes)
+        for dev in self.devices:
+            if dev == TOP_GPS_DEVICE:
+                fix.top = self.receivers[dev].copy()
+            else:
+                fix.bottom = self.receivers[dev].copy()
+        return fix
@@ -0,0 +1,196 @@
+import argparse
+import gzip
+import logging
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from gps_session import COMPRESSED_SUFFIX, session_files
+from gps_track_store import MISSING_INT, TrackStoreWriter, new_columns
+
+logger = logging.getLogger(__name__)
+
+GPS_DATA_DIR = '/home/mdt/GPS'
+BLOCK_START = "GPS Data (Real-Time)"
+SPLIT_BYTES = 16 * 1024 * 1024  # Byte range handed to one worker process
+RECEIVER_PREFIXES = {"Top GPS": "top", "Bottom GPS": "bottom"}
+# Same field labels parse_gps_data() recognises in the session text blocks
+FIELD_COLUMNS = {
+    "Latitude": ("latitude", float),
+    "Longitude": ("longitude", float),
+    "Altitude (m)": ("altitude", float),
+    "Speed (km/h)": ("speed", float),
+    "Satellites": ("satellites", int),
+}
+# Text fields a row also carries; only callers that pass these columns keep them
+TEXT_COLUMNS = ('ship_id', 'device_id', 'top_satellite_prns', 'bottom_satellite_prns')
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _parse_value(value, convert):
+    if not value or value in ("Unknown", "None"):
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        return None
+
+
+def _empty_row():
+    row = dict.fromkeys(new_columns(), math.nan)
+    row['top_satellites'] = row['bottom_satellites'] = MISSING_INT
+    row.update(dict.fromkeys(TEXT_COLUMNS))
+    return row
+
+
+def parse_blocks(lines, columns, stop_offset=None):
+    """Single-pass state machine over session file lines, appending rows to columns.
+
+    Both the v3 and the navbox layouts are accepted (they differ in the
+    separator line and the ship id label). Rows have the track store columns
+    plus TEXT_COLUMNS; each is appended to whichever of those `columns` holds.
+    `lines` yields (byte offset, line) pairs. Parsing stops at the first block
+    that starts at or after stop_offset, so adjacent byte ranges parsed by
+    different workers never share a block. Returns the number of rows parsed.
+    """
+    row = None
+    prefix = None
+    count = 0
+    for offset, line in lines:
+        key, _, value = line.strip().partition(":")
+        if key == BLOCK_START:
+            if row is not None:
+                _append_row(columns, row)
+                count += 1
+            if stop_offset is not None and offset >= stop_offset:
+                return count
+            row = _empty_row()
+            prefix = None
+            try:
+                row['time'] = _parse_time(value.strip())
+            except ValueError:
+                row = None
+        elif row is None:
+            continue
+        elif key in FIELD_COLUMNS and prefix is not None:
+            field, convert = FIELD_COLUMNS[key]
+            parsed = _parse_value(value.strip(), convert)
+            if parsed is not None:
+                row[f"{prefix}_{field}"] = parsed
+        elif key == "Heading":
+            parsed = _parse_value(value.strip(), float)
+            if parsed is not None:
+                row['heading'] = parsed
+        elif key == "Satellite PRNs" and prefix is not None:
+            row[f"{prefix}_satellite_prns"] = value.strip()
+        elif key in ("Ship ID", "SHIP_ID"):  # The navbox writes SHIP_ID
+            row['ship_id'] = value.strip()
+        elif key == "Device ID":
+            row['device_id'] = value.strip()
+        elif key.startswith("Top GPS") or key.startswith("Bottom GPS"):
+            prefix = RECEIVER_PREFIXES[key[:key.index(" GPS") + 4]]
+        elif key.startswith("---"):
+            _append_row(columns, row)
+            count += 1
+            row = None
+    if row is not None:
+        _append_row(columns, row)
+        count += 1
+    return count
+
+
+def _append_row(columns, row):
+    for name, column in columns.items():
+        column.append(row[name])
+
+
+def _lines_from(f, start):
+    """Yield (offset, line) from start, beginning at the next complete line."""
+    offset = start
+    if start:
+        # Step back one byte so a line starting exactly at `start` is not skipped
+        f.seek(start - 1)
+        offset = start - 1 + len(f.readline())
+    for raw in f:
+        yield offset, raw.decode('utf-8', 'replace')
+        offset += len(raw)
+
+
+def parse_range(path, start, end, columns=None):
+    """Parse the blocks of a session file that start within [start, end) into columns (default: new_columns())."""
+    if columns is None:
+        columns = new_columns()
+    with (gzip.open(path, 'rb') if path.endswith(COMPRESSED_SUFFIX) else open(path, 'rb')) as f:
+        parse_blocks(_lines_from(f, start), columns, stop_offset=end)
+    return columns
+
+
+def split_file(path, split_bytes=SPLIT_BYTES):
+    if path.endswith(COMPRESSED_SUFFIX):
+        # Rotated segments are gzipped and cannot be seeked into, so each is one range
+        return [(path, 0, None)]
+    size = os.path.getsize(path)
+    return [(path, start, min(start + split_bytes, size)) for start in range(0, max(size, 1), split_bytes)]
+
+
+def import_files(paths, output_dir, workers=None):
+    """Import session text files into a columnar track store, in file order.
+
+    Files are split into byte ranges that are parsed in parallel worker
+    processes. At most two ranges per worker are in flight, so memory stays
+    bounded however large the history is. The store only takes rows in time
+    order, so a range older than what is already stored raises ValueError
+    naming its file; rows imported before it are kept.
+    """
+    ranges = [r for path in paths for r in split_file(path)]
+    writer = TrackStoreWriter(output_dir)
+    total = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            window = (workers or os.cpu_count() or 1) * 2
+            pending = []
+            for path, start, end in ranges:
+                pending.append((path, executor.submit(parse_range, path, start, end)))
+                if len(pending) >= window:
+                    total += _store(writer, *pending.pop(0))
+            for path, future in pending:
+                total += _store(writer, path, future)
+    finally:
+        writer.close()
+    logger.info(f"Imported {total} fixes from {len(paths)} files into {output_dir}")
+    return total
+
+
+def _store(writer, path, future):
+    columns = future.result()
+    try:
+        writer.extend(columns)
+    except ValueError as e:
+        raise ValueError(f"Cannot import {path}: {e}") from None
+    return len(columns['time'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import gps_data_*.txt session logs into a columnar track store.")
+    parser.add_argument('output', help="track store directory to create or append to")
+    parser.add_argument('files', nargs='*', help=f"session files (default: {GPS_DATA_DIR}/gps_data_*.txt[.gz])")
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Session file names start with their creation time, so name order is time order
+    paths = sorted(args.files, key=os.path.basename) if args.files else session_files(GPS_DATA_DIR)
+    try:
+        import_files(paths, args.output, args.workers)
+    except ValueError as e:
+        logger.error(f"{e}; import newer sessions only, or into a new track store directory")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
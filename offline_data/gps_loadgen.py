@@ -0,0 +1,407 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import resource
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import websockets
+
+from gps_compress import COMPRESSION_HEADER, BatchDecompressor, load_dictionary, zstandard
+from gps_delta import DeltaDecoder
+from gps_trace import percentile
+from gps_wire import SUBPROTOCOL_BINARY, SUBPROTOCOL_DELTA, SUBPROTOCOL_JSON, decode_fix
+
+logger = logging.getLogger(__name__)
+
+LOCAL_URL = 'ws://127.0.0.1:8766'
+UPLINK_PORT = 4002
+CONNECT_TIMEOUT = 10
+REPORT_INTERVAL = 5  # Seconds between progress lines
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024  # Backlog batches can be large
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def fix_time(fix):
+    """Epoch seconds of a decoded fix's UTC timestamp."""
+    return datetime.fromisoformat(fix["timestamp"]).replace(tzinfo=timezone.utc).timestamp()
+
+
+class StreamStats:
+    """Receive latency, throughput and sequence accounting over many fix streams.
+
+    Latency is receive time minus the fix's embedded timestamp, so sender and
+    receiver clocks must agree (same host, or NTP/PPS-synced). Fixes carry the
+    fusion's sequence number; per stream a repeated number is a duplicate, a
+    jump forward a gap (fixes the server conflated or, on the uplink, left out
+    by adaptive rate) and a step back a reorder or server restart.
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.gaps = 0  # Fixes missing between consecutive sequence numbers
+        self.gap_events = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.unsequenced = 0
+        self.decode_errors = 0
+        self.latencies = array('d')
+        self.last_seq = {}  # stream -> last sequence number
+
+    def observe(self, stream, fix, size, received):
+        self.messages += 1
+        self.bytes += size
+        try:
+            self.latencies.append(received - fix_time(fix))
+        except (KeyError, TypeError, ValueError):
+            pass
+        seq = fix.get("seq")
+        if seq is None:
+            self.unsequenced += 1
+            return
+        last = self.last_seq.get(stream)
+        if last is not None:
+            if seq == last:
+                self.duplicates += 1
+                return
+            if seq < last:
+                self.out_of_order += 1
+            elif seq > last + 1:
+                self.gaps += seq - last - 1
+                self.gap_events += 1
+        self.last_seq[stream] = seq
+
+    def counters(self):
+        return {"messages": self.messages, "bytes": self.bytes, "gaps": self.gaps, "gap_events": self.gap_events,
+                "duplicates": self.duplicates, "out_of_order": self.out_of_order,
+                "unsequenced": self.unsequenced, "decode_errors": self.decode_errors}
+
+    def merge(self, counters, latencies):
+        """Add counters and latency samples from another process's stats."""
+        for name, value in counters.items():
+            setattr(self, name, getattr(self, name) + value)
+        self.latencies.extend(latencies)
+
+    def summary(self, duration):
+        ordered = sorted(self.latencies)
+        latency = None
+        if ordered:
+            latency = {name: round(percentile(ordered, fraction) * 1000, 3)
+                       for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+            latency["max"] = round(ordered[-1] * 1000, 3)
+        return {
+            **self.counters(),
+            "messages_per_s": round(self.messages / duration, 1) if duration else None,
+            "bytes_per_s": round(self.bytes / duration, 1) if duration else None,
+            "latency_ms": latency,
+        }
+
+
+def decode_message(message, subprotocol):
+    """Decode a local-client message (JSON text or gps.bin.v1 frame) into the to_dict() shape."""
+    if isinstance(message, bytes) and subprotocol == SUBPROTOCOL_BINARY:
+        return decode_fix(message)
+    return json.loads(message)
+
+
+def raise_fd_limit():
+    """Allow as many open sockets as the hard limit permits."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+async def run_client(index, url, subprotocol, compression, stats, state, stop):
+    started = time.monotonic()
+    try:
+        websocket = await asyncio.wait_for(
+            websockets.connect(url, subprotocols=[subprotocol] if subprotocol else None, compression=compression,
+                               ping_interval=None, close_timeout=1, max_size=MAX_MESSAGE_BYTES), CONNECT_TIMEOUT)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        state['connect_failures'] += 1
+        logger.debug(f"Client {index} failed to connect: {e}")
+        return
+    state['connect_times'].append(time.monotonic() - started)
+    state['connected'] += 1
+    try:
+        async for message in websocket:
+            received = time.time()
+            try:
+                fix = decode_message(message, websocket.subprotocol)
+            except (ValueError, KeyError, IndexError, struct.error):
+                stats.decode_errors += 1
+                continue
+            stats.observe(index, fix, len(message), received)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        state['connected'] -= 1
+        if not stop.is_set():
+            state['disconnects'] += 1
+        await websocket.close()
+
+
+async def report_progress(stats, connected, interval=REPORT_INTERVAL):
+    messages = stats.messages
+    seen = len(stats.latencies)
+    while True:
+        await asyncio.sleep(interval)
+        recent = sorted(stats.latencies[seen:])
+        seen = len(stats.latencies)
+        p99 = f"{percentile(recent, 0.99) * 1000:.1f} ms" if recent else "-"
+        logger.info(f"{connected()} connected, {(stats.messages - messages) / interval:.0f} messages/s, "
+                    f"p99 latency {p99}, {stats.gaps} gaps, {stats.duplicates} duplicates")
+        messages = stats.messages
+
+
+async def run_clients(url, clients, duration, ramp, subprotocol, compression, first_index=0, report=True):
+    """Open `clients` connections at `ramp` per second, receive for `duration` seconds and return the raw stats."""
+    stats = StreamStats()
+    state = {'connected': 0, 'connect_failures': 0, 'disconnects': 0, 'connect_times': array('d')}
+    stop = asyncio.Event()
+    reporter = asyncio.create_task(report_progress(stats, lambda: state['connected'])) if report else None
+    started = time.monotonic()
+    tasks = []
+    for index in range(first_index, first_index + clients):
+        tasks.append(asyncio.create_task(run_client(index, url, subprotocol, compression, stats, state, stop)))
+        if ramp:
+            await asyncio.sleep(1 / ramp)
+    await asyncio.sleep(max(0.0, duration - (time.monotonic() - started)))
+    elapsed = time.monotonic() - started
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if reporter is not None:
+        reporter.cancel()
+    return {"duration": elapsed, "counters": stats.counters(),
+            "latencies": stats.latencies.tolist(), "connect_failures": state['connect_failures'],
+            "disconnects": state['disconnects'], "connect_times": state['connect_times'].tolist()}
+
+
+def client_worker(url, clients, duration, ramp, subprotocol, compression, first_index):
+    """Run one share of the clients in its own process (spawned, so each has its own event loop)."""
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    raise_fd_limit()
+    return asyncio.run(run_clients(url, clients, duration, ramp, subprotocol, compression, first_index, report=False))
+
+
+def load_test(url, clients, duration, ramp, subprotocol=None, compression=None, processes=1):
+    """Run the client load, spread over `processes` processes, and return the JSON-ready summary."""
+    if processes > 1:
+        shares = [clients // processes + (1 if i < clients % processes else 0) for i in range(processes)]
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            futures = [executor.submit(client_worker, url, share, duration, ramp / processes if ramp else 0,
+                                       subprotocol, compression, sum(shares[:i]))
+                       for i, share in enumerate(shares)]
+            results = [future.result() for future in futures]
+    else:
+        results = [asyncio.run(run_clients(url, clients, duration, ramp, subprotocol, compression))]
+
+    stats = StreamStats()
+    connect_times = []
+    for result in results:
+        stats.merge(result["counters"], result["latencies"])
+        connect_times.extend(result["connect_times"])
+    connect_times.sort()
+    elapsed = max(result["duration"] for result in results)
+    return {
+        "mode": "clients",
+        "url": url,
+        "subprotocol": subprotocol or "json",
+        "compression": compression,
+        "clients": clients,
+        "processes": processes,
+        "duration_s": round(elapsed, 3),
+        "connected": len(connect_times),
+        "connect_failures": sum(result["connect_failures"] for result in results),
+        "disconnects": sum(result["disconnects"] for result in results),
+        "connect_ms": {name: round(percentile(connect_times, fraction) * 1000, 3)
+                       for name, fraction in (("p50", 0.5), ("p99", 0.99))} if connect_times else None,
+        **stats.summary(elapsed),
+    }
+
+
+class UplinkServer:
+    """Stand-in for the shore-side uplink server.
+
+    Accepts the gps.delta.v1, gps.bin.v1 and JSON formats, acknowledges backlog
+    batches like the real server (after ack_delay seconds, or not at all) and
+    accepts zstd-compressed batches when it holds the dictionary the client
+    offers. Live fixes go through StreamStats per connection.
+    """
+
+    def __init__(self, ack=True, ack_delay=0.0, dictionary=None):
+        self.ack = ack
+        self.ack_delay = ack_delay
+        self.dictionary = dictionary
+        self.decompressor = BatchDecompressor(dictionary) if zstandard is not None else None
+        self.stats = StreamStats()
+        self.connections = 0
+        self.batches = 0
+        self.batch_records = 0
+        self.compressed_batches = 0
+        self.connection_ids = 0
+        self.started = time.monotonic()
+
+    def handshake_headers(self, path, request_headers):
+        """Echo the zstd batch offer back when it can be decompressed here."""
+        offer = request_headers.get(COMPRESSION_HEADER, '')
+        if not offer.startswith('zstd') or self.decompressor is None:
+            return {}
+        if 'dict=' in offer and (self.dictionary is None or
+                                 offer.partition('dict=')[2].strip() != str(self.dictionary.dict_id())):
+            return {}
+        return {COMPRESSION_HEADER: offer}
+
+    async def handler(self, websocket, path):
+        self.connections += 1
+        self.connection_ids += 1
+        stream = self.connection_ids
+        decoder = DeltaDecoder() if websocket.subprotocol == SUBPROTOCOL_DELTA else None
+        acks = set()  # Delayed ack tasks still pending
+        logger.info(f"Uplink client {websocket.remote_address} connected ({websocket.subprotocol or 'JSON'})")
+        try:
+            async for message in websocket:
+                received = time.time()
+                if isinstance(message, bytes) and message[:4] == ZSTD_MAGIC and self.decompressor is not None:
+                    self.compressed_batches += 1
+                    message = self.decompressor.decompress(message).decode()
+                try:
+                    if isinstance(message, str):
+                        data = json.loads(message)
+                        if data.get("type") == "gps_batch":
+                            await self._batch(websocket, data, acks)
+                            continue
+                    elif decoder is not None:
+                        data = decoder.decode(message)
+                    else:
+                        data = decode_fix(message)
+                except (ValueError, KeyError, IndexError, AttributeError, struct.error) as e:
+                    self.stats.decode_errors += 1
+                    logger.debug(f"Undecodable uplink message: {e}")
+                    continue
+                self.stats.observe(stream, data, len(message), received)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for task in acks:
+                task.cancel()
+            self.connections -= 1
+            logger.info(f"Uplink client {websocket.remote_address} disconnected")
+
+    async def _batch(self, websocket, data, acks):
+        self.batches += 1
+        self.batch_records += len(data.get("records", []))
+        if not self.ack:
+            return
+        ack = json.dumps({"type": "ack", "batch_id": data.get("batch_id")})
+        if self.ack_delay:
+            # Delayed in a task of its own, so the receive loop keeps reading live fixes meanwhile
+            task = asyncio.create_task(self._send_later(websocket, ack))
+            acks.add(task)
+            task.add_done_callback(acks.discard)
+        else:
+            await websocket.send(ack)
+
+    async def _send_later(self, websocket, message):
+        await asyncio.sleep(self.ack_delay)
+        try:
+            await websocket.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def summary(self):
+        return {
+            "mode": "uplink",
+            "duration_s": round(time.monotonic() - self.started, 3),
+            "connections": self.connections,
+            "batches": self.batches,
+            "batch_records": self.batch_records,
+            "compressed_batches": self.compressed_batches,
+            **self.stats.summary(time.monotonic() - self.started),
+        }
+
+
+async def serve_uplink(host, port, server, duration=None):
+    """Run the stand-in uplink server for `duration` seconds (or until cancelled)."""
+    async with websockets.serve(server.handler, host, port, max_size=MAX_MESSAGE_BYTES,
+                                subprotocols=[SUBPROTOCOL_DELTA, SUBPROTOCOL_BINARY, SUBPROTOCOL_JSON],
+                                extra_headers=server.handshake_headers):
+        logger.info(f"Stand-in uplink server listening on ws://{host}:{port}")
+        reporter = asyncio.create_task(report_progress(server.stats, lambda: server.connections))
+        try:
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.Future()
+        finally:
+            reporter.cancel()
+
+
+def write_results(results, output):
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + "\n")
+        logger.info(f"Wrote results to {output}")
+    else:
+        print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket load generator for the GPS relay.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    clients = sub.add_parser('clients', help="open many local clients against the GPS WebSocket server")
+    clients.add_argument('--url', default=LOCAL_URL)
+    clients.add_argument('--clients', type=int, default=1000)
+    clients.add_argument('--duration', type=float, default=60, help="seconds from the first connection")
+    clients.add_argument('--ramp', type=float, default=200, help="new connections per second (0: all at once)")
+    clients.add_argument('--format', choices=('json', 'binary'), default='json')
+    clients.add_argument('--deflate', action='store_true', help="offer permessage-deflate like browsers do")
+    clients.add_argument('--processes', type=int, default=1, help="spread the clients over this many processes")
+    clients.add_argument('--output', help="write the JSON results here instead of stdout")
+    uplink = sub.add_parser('uplink', help="run a stand-in for the external uplink server")
+    uplink.add_argument('--host', default='0.0.0.0')
+    uplink.add_argument('--port', type=int, default=UPLINK_PORT)
+    uplink.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+    uplink.add_argument('--no-ack', action='store_true', help="never acknowledge backlog batches")
+    uplink.add_argument('--ack-delay', type=float, default=0.0, help="seconds to wait before each ack")
+    uplink.add_argument('--dictionary', help="zstd dictionary the device offers for backlog batches")
+    uplink.add_argument('--output', help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'clients':
+        limit = raise_fd_limit()
+        if args.clients // args.processes > limit - 64:
+            logger.warning(f"Open file limit is {limit}; use more --processes or raise the hard limit")
+        subprotocol = {'json': SUBPROTOCOL_JSON, 'binary': SUBPROTOCOL_BINARY}[args.format]
+        try:
+            results = load_test(args.url, args.clients, args.duration, args.ramp, subprotocol,
+                                'deflate' if args.deflate else None, args.processes)
+        except KeyboardInterrupt:
+            sys.exit(1)
+        write_results(results, args.output)
+    else:
+        server = UplinkServer(not args.no_ack, args.ack_delay, load_dictionary(args.dictionary))
+        try:
+            asyncio.run(serve_uplink(args.host, args.port, server, args.duration))
+        except KeyboardInterrupt:
+            logger.info("Stopped")
+        write_results(server.summary(), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per log call site (file and line), so one chatty statement
+    cannot flood the log. Suppressed records are counted and the next record
+    that gets through from the same call site says how many were dropped.
+    Warnings and errors are never limited.
+    """
+
+    def __init__(self, rate=5.0, burst=20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}  # (pathname, lineno) -> [tokens, last refill, suppressed]
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rate:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [self.burst, now, 0]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            self.suppressed += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.msg = f"{record.getMessage()} ({bucket[2]} similar messages suppressed)"
+            record.args = None
+            bucket[2] = 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_handler(log_file, max_bytes, backup_count, compress):
+    handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+    if compress:
+        handler.namer = lambda name: name + '.gz'
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def _start_listener(handlers, queue_size):
+    """Start a listener thread writing to handlers; return the queue handler feeding it."""
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    log_queue = queue.Queue(queue_size)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return DroppingQueueHandler(log_queue)
+
+
+def setup_logging(log_file, level=logging.INFO, max_bytes=10 * 1024 * 1024, backup_count=5,
+                  rate=5.0, burst=20, queue_size=10000, compress=True, console=True):
+    """Route all logging through a queue to a listener thread that does the I/O.
+
+    Callers only format the record and put it on a bounded queue, so a slow SD
+    card or console never stalls the event loop or a reader thread. The log
+    file is rotated at max_bytes, rotated files are gzip-compressed by the
+    listener thread, and each call site is rate-limited (see RateLimitFilter).
+    Returns the queue handler, whose `dropped` counts records lost to a full
+    queue.
+    """
+    handlers = [_file_handler(log_file, max_bytes, backup_count, compress)]
+    if console:
+        handlers.append(logging.StreamHandler())
+    queue_handler = _start_listener(handlers, queue_size)
+    queue_handler.addFilter(RateLimitFilter(rate, burst))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    return queue_handler
+
+
+def queued_file_logger(name, log_file, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000,
+                       compress=True):
+    """Return logger `name` writing only to its own rotated file, through its own listener thread."""
+    log = logging.getLogger(name)
+    log.addHandler(_start_listener([_file_handler(log_file, max_bytes, backup_count, compress)], queue_size))
+    log.propagate = False
+    return log
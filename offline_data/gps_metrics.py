@@ -0,0 +1,85 @@
+import math
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+
+class LatencySummary:
+    """Running count, sum and maximum of observed durations in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                     for key, value in labels.items())
+    return '{' + pairs + '}'
+
+
+class MetricsRegistry:
+    """Prometheus text exposition of counters kept elsewhere in the application.
+
+    Metrics are registered with a collect() callback that is only called when
+    /metrics is scraped, so the hot path keeps incrementing plain attributes
+    and never touches this module. collect() returns a number, or an iterable
+    of (labels dict, number) pairs.
+    """
+
+    def __init__(self, prefix='gps_'):
+        self.prefix = prefix
+        self.metrics = []
+
+    def add(self, name, kind, help_text, collect):
+        self.metrics.append((self.prefix + name, kind, help_text, collect))
+
+    def counter(self, name, help_text, collect):
+        self.add(name, 'counter', help_text, collect)
+
+    def gauge(self, name, help_text, collect):
+        self.add(name, 'gauge', help_text, collect)
+
+    def summary(self, name, help_text, summary):
+        """Expose a LatencySummary as <name>_count, <name>_sum and a <name>_max gauge."""
+        self.add(name, 'summary', help_text, lambda: summary)
+
+    def render(self):
+        lines = []
+        for name, kind, help_text, collect in self.metrics:
+            try:
+                value = collect()
+            except Exception as e:
+                lines.append(f"# {name} unavailable: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'summary':
+                lines.append(f"{name}_count {value.count}")
+                lines.append(f"{name}_sum {_format_value(value.sum)}")
+                lines.append(f"# TYPE {name}_max gauge")
+                lines.append(f"{name}_max {_format_value(value.max)}")
+            elif value is None or isinstance(value, (int, float)):
+                lines.append(f"{name} {_format_value(value)}")
+            else:
+                for labels, sample in value:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(sample)}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,74 @@
+import math
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres (haversine)."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def heading_change(a, b):
+    """Smallest angle in degrees between two headings."""
+    diff = abs(a - b) % 360
+    return 360 - diff if diff > 180 else diff
+
+
+class MotionReporter:
+    """Decide which fixes are worth reporting, based on how the vessel is moving.
+
+    A fix is reported when, compared with the last reported fix, the vessel
+    moved at least min_distance metres, turned at least min_heading_change
+    degrees or changed speed by at least min_speed_change km/h, or when
+    heartbeat seconds passed without a report. Everything inside that dead-band
+    is suppressed, so a moored ship reports once per heartbeat while a
+    manoeuvring one reports every fix. Below min_heading_speed km/h the GPS
+    course is mostly noise, so heading changes are ignored.
+    """
+
+    def __init__(self, min_distance=25, min_heading_change=5, min_speed_change=2, heartbeat=60,
+                 min_heading_speed=2):
+        self.min_distance = min_distance
+        self.min_heading_change = min_heading_change
+        self.min_heading_speed = min_heading_speed
+        self.min_speed_change = min_speed_change
+        self.heartbeat = heartbeat
+        self.last = None
+        self.reported = 0
+        self.suppressed = 0
+
+    def reset(self):
+        """Report the next fix unconditionally (e.g. after a reconnect)."""
+        self.last = None
+
+    def should_report(self, fix):
+        rx = fix.top or fix.bottom
+        if rx is None or rx.latitude is None or rx.longitude is None:
+            self.suppressed += 1
+            return False
+        current = (fix.time, rx.latitude, rx.longitude, fix.heading, rx.speed)
+        if self.last is None or self._moved(self.last, current):
+            self.last = current
+            self.reported += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def _moved(self, last, current):
+        when, lat, lon, heading, speed = current
+        last_when, last_lat, last_lon, last_heading, last_speed = last
+        if when - last_when >= self.heartbeat:
+            return True
+        if distance_m(last_lat, last_lon, lat, lon) >= self.min_distance:
+            return True
+        if (heading is not None and last_heading is not None and
+                speed is not None and speed >= self.min_heading_speed and
+                heading_change(heading, last_heading) >= self.min_heading_change):
+            return True
+        if speed is not None and last_speed is not None:
+            return abs(speed - last_speed) >= self.min_speed_change
+        return speed != last_speed
@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import pty
+import struct
+import time
+
+from gps_serial import open_serial_device
+from gpsd_client import WATCH_COMMAND, READ_LIMIT
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'GPSREC1\n'
+META_HEADER = struct.Struct('<I')
+RECORD_HEADER = struct.Struct('<IIB')  # microseconds since previous record, payload length, channel
+FLUSH_INTERVAL = 1.0
+VERSION_REPORT = b'{"class":"VERSION","release":"replay","rev":"replay","proto_major":3,"proto_minor":14}\n'
+
+
+class RecordingWriter:
+    """Append-only writer for gpsd JSON lines or raw serial chunks.
+
+    Each record stores the monotonic time since the previous record, so replays
+    reproduce the original pacing exactly regardless of wall-clock jumps.
+    """
+
+    def __init__(self, path, kind, devices=()):
+        self.file = open(path, 'wb')
+        meta = json.dumps({"kind": kind, "devices": list(devices), "started": time.time()}).encode()
+        self.file.write(MAGIC + META_HEADER.pack(len(meta)) + meta)
+        self.last = time.monotonic()
+        self.last_flush = self.last
+        self.records = 0
+
+    def write(self, payload, channel=0):
+        now = time.monotonic()
+        delta = min(int((now - self.last) * 1e6), 0xffffffff)
+        self.last = now
+        self.file.write(RECORD_HEADER.pack(delta, len(payload), channel))
+        self.file.write(payload)
+        self.records += 1
+        if now - self.last_flush >= FLUSH_INTERVAL:
+            self.file.flush()
+            self.last_flush = now
+
+    def close(self):
+        self.file.close()
+
+
+def read_header(f):
+    """Read and return the metadata dict at the start of a recording."""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a GPS recording")
+    (length,) = META_HEADER.unpack(f.read(META_HEADER.size))
+    return json.loads(f.read(length))
+
+
+def read_recording(path):
+    """Yield (seconds since previous record, channel, payload) for every record.
+
+    A record truncated by a crash during recording ends the iteration quietly.
+    """
+    with open(path, 'rb') as f:
+        read_header(f)
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            delta, length, channel = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield delta / 1e6, channel, payload
+
+
+async def paced(records, speed):
+    """Re-yield records with their recorded spacing divided by speed (0 means no delay)."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    offset = 0.0
+    for delta, channel, payload in records:
+        if speed:
+            offset += delta / speed
+            wait = start + offset - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        yield channel, payload
+
+
+async def record_gpsd(path, host, port):
+    """Record the raw gpsd JSON stream until interrupted."""
+    reader, writer = await asyncio.open_connection(host, port, limit=READ_LIMIT)
+    writer.write(WATCH_COMMAND)
+    await writer.drain()
+    recording = RecordingWriter(path, 'gpsd')
+    logger.info(f"Recording gpsd {host}:{port} to {path}")
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                logger.warning("gpsd closed the connection")
+                break
+            recording.write(line)
+    finally:
+        writer.close()
+        recording.close()
+        logger.info(f"Recorded {recording.records} reports")
+
+
+async def record_serial(path, devices):
+    """Record raw bytes from serial receivers until interrupted."""
+    loop = asyncio.get_running_loop()
+    recording = RecordingWriter(path, 'serial', devices)
+    closed = loop.create_future()
+    fds = []
+
+    def on_readable(fd, channel):
+        try:
+            data = os.read(fd, 4096)
+        except BlockingIOError:
+            return
+        if data:
+            recording.write(data, channel)
+        elif not closed.done():
+            closed.set_result(channel)
+
+    try:
+        for channel, (device, baud_rate) in enumerate(devices.items()):
+            fd = open_serial_device(device, baud_rate)
+            fds.append(fd)
+            loop.add_reader(fd, on_readable, fd, channel)
+        logger.info(f"Recording {', '.join(devices)} to {path}")
+        await closed
+    finally:
+        for fd in fds:
+            loop.remove_reader(fd)
+            os.close(fd)
+        recording.close()
+        logger.info(f"Recorded {recording.records} chunks")
+
+
+async def serve_gpsd(path, host, port, speed, loop_forever=False):
+    """Emulate gpsd on host:port, streaming a gpsd recording to every client after ?WATCH."""
+    async def handle_client(reader, writer):
+        peer = writer.get_extra_info('peername')
+        logger.info(f"Replay client connected: {peer}")
+        try:
+            writer.write(VERSION_REPORT)
+            while not (await reader.readline()).startswith(b'?WATCH'):
+                if reader.at_eof():
+                    return
+            while True:
+                sent = 0
+                async for channel, payload in paced(read_recording(path), speed):
+                    writer.write(payload)
+                    sent += 1
+                    if sent % 64 == 0 or speed:
+                        await writer.drain()
+                await writer.drain()
+                if not loop_forever:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            logger.info(f"Replay client disconnected: {peer}")
+
+    with open(path, 'rb') as f:
+        meta = read_header(f)
+    if meta.get("kind") != 'gpsd':
+        raise ValueError(f"{path} is a {meta.get('kind')} recording, replay it with the pty command")
+    server = await asyncio.start_server(handle_client, host, port)
+    logger.info(f"Replaying {path} as gpsd on {host}:{port} at {'max' if not speed else speed}x speed")
+    async with server:
+        await server.serve_forever()
+
+
+async def replay_to_pty(path, speed, loop_forever=False):
+    """Replay a serial recording into one pty per recorded receiver."""
+    with open(path, 'rb') as f:
+        meta = read_header(f)
+    if meta.get("kind") != 'serial':
+        raise ValueError(f"{path} is a {meta.get('kind')} recording, replay it with the serve command")
+    masters = []
+    for device in meta["devices"]:
+        master, slave = pty.openpty()
+        masters.append(master)
+        print(f"{device} -> {os.ttyname(slave)}", flush=True)
+    while True:
+        async for channel, payload in paced(read_recording(path), speed):
+            os.write(masters[channel], payload)
+        if not loop_forever:
+            break
+
+
+def parse_speed(value):
+    return 0 if value == 'max' else float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay GPS receiver data.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record', help="record the gpsd JSON stream")
+    rec.add_argument('output')
+    rec.add_argument('--host', default='127.0.0.1')
+    rec.add_argument('--port', type=int, default=2947)
+    rec_serial = sub.add_parser('record-serial', help="record raw NMEA/UBX from serial devices")
+    rec_serial.add_argument('output')
+    rec_serial.add_argument('devices', nargs='+', help="DEVICE[:BAUD], e.g. /dev/ttyACM0:115200")
+    serve = sub.add_parser('serve', help="emulate gpsd from a gpsd recording")
+    serve.add_argument('input')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=2947)
+    serve.add_argument('--speed', type=parse_speed, default=1.0, help="replay speed factor, or 'max'")
+    serve.add_argument('--loop', action='store_true', help="restart the recording when it ends")
+    replay_pty = sub.add_parser('pty', help="replay a serial recording into pseudo terminals")
+    replay_pty.add_argument('input')
+    replay_pty.add_argument('--speed', type=parse_speed, default=1.0, help="replay speed factor, or 'max'")
+    replay_pty.add_argument('--loop', action='store_true', help="restart the recording when it ends")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        if args.command == 'record':
+            asyncio.run(record_gpsd(args.output, args.host, args.port))
+        elif args.command == 'record-serial':
+            devices = {}
+            for spec in args.devices:
+                device, _, baud = spec.partition(':')
+                devices[device] = int(baud or 9600)
+            asyncio.run(record_serial(args.output, devices))
+        elif args.command == 'serve':
+            asyncio.run(serve_gpsd(args.input, args.host, args.port, args.speed, args.loop))
+        else:
+            asyncio.run(replay_to_pty(args.input, args.speed, args.loop))
+    except KeyboardInterrupt:
+        logger.info("Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+import asyncio
+import logging
+import os
+import struct
+import termios
+import tty
+
+logger = logging.getLogger(__name__)
+
+NMEA_MAX_LENGTH = 164  # Longer than any valid sentence, including NMEA 4.x extensions
+UBX_MAX_PAYLOAD = 4096
+UBX_SYNC = b'\xb5\x62'
+UBX_NAV_PVT = (0x01, 0x07)
+KNOTS_TO_MS = 0.514444
+BAUD_RATES = {
+    4800: termios.B4800,
+    9600: termios.B9600,
+    19200: termios.B19200,
+    38400: termios.B38400,
+    57600: termios.B57600,
+    115200: termios.B115200,
+    230400: termios.B230400,
+}
+
+
+class NmeaFramer:
+    """Split a raw receiver byte stream into NMEA sentences and UBX frames.
+
+    Bytes are appended to one bytearray and frames are handed out as memoryview
+    slices of it, so nothing is copied until a parser decodes the fields. The
+    buffer is compacted once per feed(), which means callers must finish with a
+    frame before asking for the next one.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.bad_checksums = 0
+
+    def feed(self, data):
+        """Append data and yield ('nmea', sentence) or ('ubx', class, id, payload) frames."""
+        buf = self.buffer
+        buf += data
+        view = memoryview(buf)
+        pos = 0
+        try:
+            while True:
+                nmea_start = buf.find(b'$', pos)
+                ubx_start = buf.find(UBX_SYNC, pos)
+                if nmea_start < 0 and ubx_start < 0:
+                    # Keep a trailing sync byte that may start a UBX frame
+                    pos = len(buf) - 1 if buf.endswith(UBX_SYNC[:1]) else len(buf)
+                    break
+                if ubx_start < 0 or 0 <= nmea_start < ubx_start:
+                    end = buf.find(b'\n', nmea_start)
+                    if end < 0:
+                        if len(buf) - nmea_start > NMEA_MAX_LENGTH:
+                            pos = nmea_start + 1
+                            continue
+                        pos = nmea_start
+                        break
+                    # A sentence cut short by line noise is followed by a fresh '$'
+                    start = buf.rfind(b'$', nmea_start, end)
+                    stop = end - 1 if end > start and buf[end - 1] == 0x0d else end
+                    pos = end + 1
+                    sentence = view[start:stop]
+                    try:
+                        if self._nmea_checksum_ok(sentence):
+                            yield ('nmea', sentence)
+                        else:
+                            self.bad_checksums += 1
+                    finally:
+                        # Released even if the caller raised, or the buffer could never be resized again
+                        sentence.release()
+                    continue
+                if len(buf) - ubx_start < 8:
+                    pos = ubx_start
+                    break
+                length = buf[ubx_start + 4] | (buf[ubx_start + 5] << 8)
+                if length > UBX_MAX_PAYLOAD:
+                    pos = ubx_start + 2
+                    continue
+                end = ubx_start + 8 + length
+                if len(buf) < end:
+                    pos = ubx_start
+                    break
+                pos = end
+                frame = view[ubx_start + 2:end]
+                try:
+                    if self._ubx_checksum_ok(frame):
+                        payload = frame[4:-2]
+                        try:
+                            yield ('ubx', frame[0], frame[1], payload)
+                        finally:
+                            payload.release()
+                    else:
+                        self.bad_checksums += 1
+                finally:
+                    frame.release()
+        finally:
+            view.release()
+            del buf[:pos]
+
+    @staticmethod
+    def _nmea_checksum_ok(sentence):
+        star = len(sentence) - 3
+        if star < 1 or sentence[star] != 0x2a:
+            return False
+        checksum = 0
+        for byte in sentence[1:star]:
+            checksum ^= byte
+        try:
+            return checksum == int(bytes(sentence[star + 1:]), 16)
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _ubx_checksum_ok(frame):
+        ck_a = ck_b = 0
+        for byte in frame[:-2]:
+            ck_a = (ck_a + byte) & 0xff
+            ck_b = (ck_b + ck_a) & 0xff
+        return ck_a == frame[-2] and ck_b == frame[-1]
+
+
+def _parse_coordinate(value, hemisphere):
+    """Convert NMEA ddmm.mmmm / dddmm.mmmm into signed decimal degrees."""
+    if not value:
+        return None
+    dot = value.find('.')
+    degrees_len = (dot if dot >= 0 else len(value)) - 2
+    degrees = float(value[:degrees_len]) + float(value[degrees_len:]) / 60
+    return -degrees if hemisphere in ('S', 'W') else degrees
+
+
+def _parse_float(value):
+    return float(value) if value else None
+
+
+class NmeaReportBuilder:
+    """Turn one receiver's NMEA/UBX frames into gpsd-style TPV and SKY report dicts.
+
+    GGA closes a TPV (it carries altitude), using the latest speed and course from
+    RMC/VTG. GSA sentences list the satellites used in the solution; a SKY report
+    is emitted when a run of GSA sentences ends.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.speed = None
+        self.track = None
+        self.used_prns = []
+        self.in_gsa_run = False
+        self.visible = {}
+
+    def handle_frame(self, frame):
+        """Return the list of reports produced by one frame from NmeaFramer.feed()."""
+        if frame[0] == 'ubx':
+            if (frame[1], frame[2]) == UBX_NAV_PVT:
+                report = self._nav_pvt(frame[3])
+                return [report] if report else []
+            return []
+        fields = bytes(frame[1][1:-3]).decode('ascii', 'replace').split(',')
+        return self.handle_sentence(fields)
+
+    def handle_sentence(self, fields):
+        sentence = fields[0][2:]
+        reports = []
+        if sentence != 'GSA' and self.in_gsa_run:
+            reports.append(self._sky())
+        try:
+            if sentence == 'GGA':
+                reports.append(self._gga(fields))
+            elif sentence == 'RMC':
+                self._rmc(fields)
+            elif sentence == 'VTG':
+                self._vtg(fields)
+            elif sentence == 'GSA':
+                self._gsa(fields)
+            elif sentence == 'GSV':
+                self._gsv(fields)
+        except (IndexError, ValueError) as e:
+            logger.debug(f"Malformed {fields[0]} sentence from {self.device}: {e}")
+        return reports
+
+    def _gga(self, fields):
+        report = {'class': 'TPV', 'device': self.device, 'mode': 1}
+        if fields[6] not in ('', '0'):
+            report.update({
+                'mode': 3,
+                'lat': _parse_coordinate(fields[2], fields[3]),
+                'lon': _parse_coordinate(fields[4], fields[5]),
+                'alt': _parse_float(fields[9]),
+                'speed': self.speed,
+                'track': self.track
+            })
+        return report
+
+    def _rmc(self, fields):
+        if fields[2] != 'A':
+            self.speed = self.track = None
+            return
+        knots = _parse_float(fields[7])
+        self.speed = knots * KNOTS_TO_MS if knots is not None else None
+        self.track = _parse_float(fields[8])
+
+    def _vtg(self, fields):
+        track = _parse_float(fields[1])
+        kmh = _parse_float(fields[7])
+        if track is not None:
+            self.track = track
+        if kmh is not None:
+            self.speed = kmh / 3.6
+
+    def _gsa(self, fields):
+        if not self.in_gsa_run:
+            self.used_prns = []
+            self.in_gsa_run = True
+        self.used_prns.extend(int(prn) for prn in fields[3:15] if prn)
+
+    def _gsv(self, fields):
+        if fields[2] == '1':
+            talker = fields[0][:2]
+            self.visible = {key: sat for key, sat in self.visible.items() if key[0] != talker}
+        for i in range(4, len(fields) - 3, 4):
+            if fields[i]:
+                self.visible[(fields[0][:2], int(fields[i]))] = {
+                    'PRN': int(fields[i]),
+                    'el': _parse_float(fields[i + 1]),
+                    'az': _parse_float(fields[i + 2]),
+                    'ss': _parse_float(fields[i + 3])
+                }
+
+    def _sky(self):
+        self.in_gsa_run = False
+        used = set(self.used_prns)
+        satellites = []
+        for sat in self.visible.values():
+            satellites.append(dict(sat, used=sat['PRN'] in used))
+            used.discard(sat['PRN'])
+        satellites.extend({'PRN': prn, 'used': True} for prn in sorted(used))
+        return {'class': 'SKY', 'device': self.device, 'satellites': satellites}
+
+    def _nav_pvt(self, payload):
+        if len(payload) < 92:
+            return None
+        fix_type, flags, _, num_sv, lon, lat, _, h_msl = struct.unpack_from('<BBBBiiii', payload, 20)
+        g_speed, head_mot = struct.unpack_from('<ii', payload, 60)
+        report = {'class': 'TPV', 'device': self.device, 'mode': 1}
+        if flags & 0x01 and fix_type in (2, 3, 4):
+            report.update({
+                'mode': 3 if fix_type != 2 else 2,
+                'lat': lat * 1e-7,
+                'lon': lon * 1e-7,
+                'alt': h_msl / 1000.0,
+                'speed': g_speed / 1000.0,
+                'track': head_mot * 1e-5
+            })
+        return report
+
+
+def open_serial_device(path, baud_rate):
+    """Open a serial port (or pty) non-blocking in raw 8N1 mode and return its fd."""
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        tty.setraw(fd)
+        attrs = termios.tcgetattr(fd)
+        speed = BAUD_RATES[int(baud_rate)]
+        attrs[2] |= termios.CLOCAL | termios.CREAD
+        attrs[4] = speed
+        attrs[5] = speed
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
+
+
+class SerialGpsReader:
+    """Read NMEA/UBX directly from the receivers' serial ports, without gpsd.
+
+    Each port is watched with loop.add_reader(), so reading costs nothing while
+    the receivers are quiet. Reports have the same shape as gpsd JSON reports and
+    can be fed straight into GpsFusion. A port that errors out (e.g. unplugged)
+    is reopened after `reconnect_delay` seconds. At most queue_size reports wait
+    for the consumer; past that the oldest are dropped and counted in `dropped`.
+    """
+
+    def __init__(self, devices, reconnect_delay=2, queue_size=1024):
+        self.devices = dict(devices)  # path -> baud rate
+        self.reconnect_delay = reconnect_delay
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+        self.fds = {}
+        self.loop = None
+
+    async def reports(self):
+        """Yield report dicts from all devices as they arrive."""
+        self.loop = asyncio.get_running_loop()
+        for device in self.devices:
+            self._open(device)
+        try:
+            while True:
+                yield await self.queue.get()
+        finally:
+            for device in list(self.fds):
+                self._close(device)
+
+    def _open(self, device):
+        try:
+            fd = open_serial_device(device, self.devices[device])
+        except Exception as e:
+            logger.error(f"Failed to open {device}: {e}")
+            self.loop.call_later(self.reconnect_delay, self._open, device)
+            return
+        self.fds[device] = fd
+        framer = NmeaFramer()
+        builder = NmeaReportBuilder(device)
+        self.loop.add_reader(fd, self._on_readable, device, fd, framer, builder)
+        logger.info(f"Reading GPS data directly from {device} at {self.devices[device]} baud")
+
+    def _close(self, device):
+        fd = self.fds.pop(device, None)
+        if fd is not None:
+            self.loop.remove_reader(fd)
+            os.close(fd)
+
+    def _on_readable(self, device, fd, framer, builder):
+        try:
+            data = os.read(fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data = b''
+            logger.error(f"Error reading {device}: {e}")
+        if not data:
+            logger.warning(f"Lost serial connection to {device}, reopening")
+            self._close(device)
+            self.loop.call_later(self.reconnect_delay, self._open, device)
+            return
+        for frame in framer.feed(data):
+            try:
+                reports = builder.handle_frame(frame)
+            except Exception as e:
+                logger.error(f"Error parsing data from {device}: {e}")
+                continue
+            for report in reports:
+                if self.queue.full():
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                self.queue.put_nowait(report)
@@ -0,0 +1,231 @@
+import glob
+import gzip
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from queue import Empty, Full, Queue
+
+logger = logging.getLogger(__name__)
+
+SESSION_PREFIX = 'gps_data_'
+SESSION_SUFFIX = '.txt'
+COMPRESSED_SUFFIX = '.gz'
+
+
+def session_files(directory, prefix=SESSION_PREFIX):
+    """Return the session files in directory, compressed or not, in time order."""
+    paths = glob.glob(os.path.join(directory, f"{prefix}*{SESSION_SUFFIX}"))
+    paths += glob.glob(os.path.join(directory, f"{prefix}*{SESSION_SUFFIX}{COMPRESSED_SUFFIX}"))
+    # Session file names start with their creation time, so name order is time order
+    return sorted(paths, key=os.path.basename)
+
+
+def open_session(path):
+    """Open a session file for reading as text, whether or not it is gzip-compressed."""
+    if path.endswith(COMPRESSED_SUFFIX):
+        return gzip.open(path, 'rt', errors='replace')
+    return open(path, errors='replace')
+
+
+def _compress(path):
+    """Gzip a closed segment next to itself and remove the original."""
+    with open(path, 'rb') as src, gzip.open(path + '.tmp', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(path + '.tmp', path + COMPRESSED_SUFFIX)
+    os.remove(path)
+
+
+class SessionWriter:
+    """Buffered writer for the session text files, rotated into time-named segments.
+
+    The current segment stays open. Text is collected in memory and written
+    with one write() once flush_bytes are buffered or flush_interval seconds
+    have passed since the last write, so the SD card sees a few large writes
+    instead of an open/append/close per fix. fsync_policy is 'always' (fsync
+    every flush), 'interval' (at most every fsync_interval seconds) or 'never'
+    (leave it to the OS); at most that much is lost on power failure.
+
+    A segment is closed and a new one started once it reaches max_bytes or,
+    with rotate_hourly, when the hour changes. Closed segments are gzipped on
+    a background thread when compress is set; only segments this writer
+    closed are touched, so a segment left by a crash stays plain text.
+
+    Calls block on file I/O and must come from one thread; wrap the writer in
+    a SessionWriterThread to keep that off the event loop.
+    """
+
+    def __init__(self, directory, prefix=SESSION_PREFIX, max_bytes=16 * 1024 * 1024, rotate_hourly=True,
+                 flush_bytes=64 * 1024, flush_interval=5.0, fsync_policy='interval', fsync_interval=30.0,
+                 compress=True):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.rotate_hourly = rotate_hourly
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.compress = compress
+        os.makedirs(directory, exist_ok=True)
+        self.buffer = []
+        self.buffered = 0
+        self.file = None
+        self.path = None
+        self.size = 0
+        self.hour = None
+        self.dirty = False
+        self.last_flush = time.monotonic()
+        self.last_fsync = self.last_flush
+        self.compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-compress") \
+            if compress else None
+        self.writes = 0
+        self.fsyncs = 0
+        self.rotations = 0
+        self.compressed = 0
+        self.compress_errors = 0
+        self._open()
+
+    def _open(self):
+        now = datetime.now()
+        path = os.path.join(self.directory, f"{self.prefix}{now:%Y-%m-%d_%H-%M-%S}{SESSION_SUFFIX}")
+        suffix = 1
+        while os.path.exists(path) or os.path.exists(path + COMPRESSED_SUFFIX):
+            path = os.path.join(self.directory, f"{self.prefix}{now:%Y-%m-%d_%H-%M-%S}_{suffix}{SESSION_SUFFIX}")
+            suffix += 1
+        self.file = open(path, 'ab', buffering=0)
+        self.path = path
+        self.size = self.file.seek(0, os.SEEK_END)
+        self.hour = now.strftime("%Y%m%d%H")
+
+    def write(self, text):
+        """Buffer text for the current segment, flushing when the buffer is due."""
+        data = text.encode()
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.flush_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def due(self):
+        """True when buffered text has waited flush_interval seconds."""
+        return self.buffered > 0 and time.monotonic() - self.last_flush >= self.flush_interval
+
+    def flush(self):
+        """Write out the buffer, fsync if the policy says so, and rotate if the segment is full."""
+        now = time.monotonic()
+        self._write_buffer()
+        self.last_flush = now
+        if self.fsync_policy == 'always' or (
+                self.fsync_policy == 'interval' and now - self.last_fsync >= self.fsync_interval):
+            self.sync()
+        if self.size >= self.max_bytes or (
+                self.rotate_hourly and self.size and datetime.now().strftime("%Y%m%d%H") != self.hour):
+            self.rotate()
+
+    def _write_buffer(self):
+        if self.buffer:
+            data = b''.join(self.buffer)
+            self.buffer = []
+            self.buffered = 0
+            self.file.write(data)
+            self.size += len(data)
+            self.writes += 1
+            self.dirty = True
+
+    def sync(self):
+        if self.file is not None and self.dirty:
+            os.fsync(self.file.fileno())
+            self.fsyncs += 1
+        self.dirty = False
+        self.last_fsync = time.monotonic()
+
+    def rotate(self):
+        """Close the current segment, hand it to the compressor and start a new one."""
+        self._close_segment()
+        self.rotations += 1
+        self._open()
+        logger.info(f"Session file rotated to {self.path}")
+
+    def _close_segment(self):
+        self.sync()
+        self.file.close()
+        self.file = None
+        if not self.size:
+            os.remove(self.path)
+        elif self.compressor is not None:
+            self.compressor.submit(self._compress, self.path)
+
+    def _compress(self, path):
+        try:
+            _compress(path)
+            self.compressed += 1
+        except Exception as e:
+            self.compress_errors += 1
+            logger.error(f"Failed to compress session file {path}: {e}")
+
+    def close(self):
+        """Flush and close the current segment and wait for pending compression."""
+        if self.file is None:
+            return
+        self._write_buffer()
+        self._close_segment()
+        if self.compressor is not None:
+            self.compressor.shutdown(wait=True)
+
+    def stats(self):
+        return {"path": self.path, "size": self.size, "buffered": self.buffered, "writes": self.writes,
+                "fsyncs": self.fsyncs, "rotations": self.rotations, "compressed": self.compressed,
+                "compress_errors": self.compress_errors}
+
+
+class SessionWriterThread(threading.Thread):
+    """Run a SessionWriter on a thread of its own, so its writes and fsyncs never block the event loop.
+
+    write() only queues the text. At most queue_size texts wait for the
+    thread; past that new ones are dropped and counted in `dropped`.
+    """
+
+    def __init__(self, writer, queue_size=10000):
+        super().__init__(name="session-writer", daemon=True)
+        self.writer = writer
+        self.queue = Queue(queue_size)
+        self.dropped = 0
+
+    @property
+    def buffered(self):
+        return self.writer.buffered
+
+    def write(self, text):
+        try:
+            self.queue.put_nowait(text)
+        except Full:
+            self.dropped += 1
+
+    def close(self, timeout=10):
+        """Write out everything queued, close the writer and wait for the thread."""
+        self.queue.put(None)
+        self.join(timeout)
+
+    def run(self):
+        while True:
+            try:
+                text = self.queue.get(timeout=self.writer.flush_interval)
+            except Empty:
+                text = ''
+            try:
+                if text is None:
+                    self.writer.close()
+                    return
+                if text:
+                    self.writer.write(text)
+                elif self.writer.due():
+                    # No text for a while: still get buffered text onto the card
+                    self.writer.flush()
+            except Exception as e:
+                logger.error(f"Failed to write to output file: {e}")
+
+    def stats(self):
+        return dict(self.writer.stats(), queued=self.queue.qsize(), dropped=self.dropped)
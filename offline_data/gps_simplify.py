@@ -0,0 +1,135 @@
+import json
+import math
+from datetime import datetime, timezone
+
+METRES_PER_DEGREE = 6371008.8 * math.pi / 180
+
+
+def _offset_m(origin_lat, origin_lon, lat, lon):
+    """(x, y) metres of a point from origin on a local equirectangular projection."""
+    return ((lon - origin_lon) * METRES_PER_DEGREE * math.cos(math.radians(origin_lat)),
+            (lat - origin_lat) * METRES_PER_DEGREE)
+
+
+def _segment_distance(px, py, bx, by):
+    """Distance from (px, py) to the segment from the origin to (bx, by)."""
+    length_sq = bx * bx + by * by
+    if length_sq == 0:
+        return math.hypot(px, py)
+    t = max(0.0, min(1.0, (px * bx + py * by) / length_sq))
+    return math.hypot(px - t * bx, py - t * by)
+
+
+class TrackSimplifier:
+    """Streaming opening-window line simplification with a tolerance in metres.
+
+    Points are pushed in time order and the kept ones come back from push()
+    and flush(). A point is dropped only if it lies within tolerance metres of
+    the straight segment between the kept points around it, so the simplified
+    track never strays further than that from the original. At least one point
+    is kept every max_interval seconds and every max_window points, which also
+    bounds the work per point. The first and last points are always kept.
+    """
+
+    def __init__(self, tolerance, max_interval=60, max_window=120):
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.max_window = max_window
+        self.anchor = None
+        self.window = []  # (time, lat, lon, item) after the anchor, not yet decided
+        self.kept = 0
+        self.dropped = 0
+
+    def _fits(self, point):
+        when, lat, lon, _ = point
+        anchor_time, anchor_lat, anchor_lon, _ = self.anchor
+        if len(self.window) >= self.max_window or when - anchor_time > self.max_interval:
+            return False
+        bx, by = _offset_m(anchor_lat, anchor_lon, lat, lon)
+        for _, mid_lat, mid_lon, _ in self.window:
+            px, py = _offset_m(anchor_lat, anchor_lon, mid_lat, mid_lon)
+            if _segment_distance(px, py, bx, by) > self.tolerance:
+                return False
+        return True
+
+    def push(self, when, lat, lon, item):
+        """Add one point and return the items that are now known to be kept."""
+        point = (when, lat, lon, item)
+        if self.anchor is None:
+            self.anchor = point
+            self.kept += 1
+            return [item]
+        if self._fits(point):
+            self.window.append(point)
+            return []
+        if not self.window:
+            self.anchor = point
+            self.kept += 1
+            return [item]
+        self.anchor = self.window[-1]
+        self.dropped += len(self.window) - 1
+        self.kept += 1
+        self.window = [point]
+        return [self.anchor[3]]
+
+    def flush(self):
+        """Return the last pending point and start a new track segment."""
+        kept = []
+        if self.window:
+            kept.append(self.window[-1][3])
+            self.dropped += len(self.window) - 1
+            self.kept += 1
+        self.anchor = None
+        self.window = []
+        return kept
+
+
+def record_point(record):
+    """Return (time, lat, lon) of a spooled JSON fix, or None if it has no position."""
+    try:
+        data = json.loads(record)
+        for gps in data.get('gps_data', []):
+            if gps.get('latitude') is not None and gps.get('longitude') is not None:
+                when = datetime.fromisoformat(data['timestamp']).replace(tzinfo=timezone.utc).timestamp()
+                return when, gps['latitude'], gps['longitude']
+    except (ValueError, KeyError, TypeError, AttributeError):
+        pass
+    return None
+
+
+def simplify_records(simplifier, records):
+    """Simplify an iterable of (item, JSON fix payload); yield the kept items.
+
+    Records without a position end the current segment and are always kept.
+    """
+    for item, payload in records:
+        point = record_point(payload)
+        if point is None:
+            yield from simplifier.flush()
+            yield item
+        else:
+            yield from simplifier.push(*point, item)
+    yield from simplifier.flush()
+
+
+def simplify_columns(columns, tolerance, max_interval=60):
+    """Return track store query() columns with only the rows a simplified track keeps.
+
+    The top receiver's position is used, falling back to the bottom receiver.
+    """
+    simplifier = TrackSimplifier(tolerance, max_interval)
+    keep = []
+    times = columns['time']
+    for row in range(len(times)):
+        lat = columns['top_latitude'][row]
+        lon = columns['top_longitude'][row]
+        if lat != lat or lon != lon:
+            lat = columns['bottom_latitude'][row]
+            lon = columns['bottom_longitude'][row]
+        if lat != lat or lon != lon:
+            keep.extend(simplifier.flush())
+            keep.append(row)
+        else:
+            keep.extend(simplifier.push(times[row], lat, lon, row))
+    keep.extend(simplifier.flush())
+    return {name: [values[row] for row in keep] for name, values in columns.items()}
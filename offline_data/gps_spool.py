@@ -0,0 +1,166 @@
+import bisect
+import logging
+import os
+import struct
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct('<II')  # payload length, crc32 of payload
+SEGMENT_SUFFIX = '.seg'
+CHECKPOINT_FILE = 'committed'
+
+
+class Spool:
+    """Segmented append-only spool with a committed-offset checkpoint.
+
+    Records are appended to fixed-size segment files named after the logical
+    offset of their first byte, so appends are O(1) and replay starts directly
+    at the committed offset. Segments whose records are all committed are
+    deleted. On open, a record torn by a crash at the end of the last segment
+    is truncated away.
+
+    fsync_policy is 'always' (fsync every append), 'interval' (at most every
+    fsync_interval seconds) or 'never' (leave it to the OS).
+    """
+
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, fsync_policy='interval', fsync_interval=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+        self.bases = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+                            if name.endswith(SEGMENT_SUFFIX))
+        self.committed = self._read_checkpoint()
+        self.file = None
+        self.last_fsync = time.monotonic()
+        self.dirty = False
+        if self.bases:
+            base = self.bases[-1]
+            self.end_offset = base + self._recover(self._segment_path(base))
+        else:
+            self.end_offset = self.committed
+        self.committed = min(max(self.committed, self.bases[0] if self.bases else self.committed), self.end_offset)
+
+    def _segment_path(self, base):
+        return os.path.join(self.directory, f"{base:020d}{SEGMENT_SUFFIX}")
+
+    def _read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _recover(self, path):
+        """Return the length of the valid prefix of a segment, truncating anything after it."""
+        valid = 0
+        with open(path, 'r+b') as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                length, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                valid += RECORD_HEADER.size + length
+            if f.seek(0, os.SEEK_END) != valid:
+                logger.warning(f"Truncating torn record at the end of {path}")
+                f.truncate(valid)
+        return valid
+
+    @property
+    def pending_bytes(self):
+        """Bytes appended but not yet committed."""
+        return self.end_offset - self.committed
+
+    def append(self, payload):
+        """Append one record and return its offset."""
+        size = RECORD_HEADER.size + len(payload)
+        if self.file is None or (self.end_offset - self.bases[-1] + size > self.segment_bytes
+                                 and self.end_offset > self.bases[-1]):
+            self._roll()
+        offset = self.end_offset
+        # One unbuffered write per record, so readers in this process never see half a record
+        self.file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.end_offset += size
+        self.dirty = True
+        if self.fsync_policy == 'always' or (
+                self.fsync_policy == 'interval' and time.monotonic() - self.last_fsync >= self.fsync_interval):
+            self.sync()
+        return offset
+
+    def _roll(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+        if not self.bases or self.end_offset > self.bases[-1]:
+            self.bases.append(self.end_offset)
+        self.file = open(self._segment_path(self.bases[-1]), 'ab', buffering=0)
+
+    def sync(self):
+        if self.file is not None and self.dirty:
+            os.fsync(self.file.fileno())
+        self.dirty = False
+        self.last_fsync = time.monotonic()
+
+    def read_from(self, offset):
+        """Yield (offset, next_offset, payload) for every record from offset on.
+
+        Records appended while iterating are included. The iterator may be
+        advanced from another thread while this one appends and commits, as
+        long as nothing commits past the records it has yet to read.
+        """
+        bases = list(self.bases)  # commit() pops from the front, so never index the live list
+        offset = max(offset, bases[0]) if bases else offset
+        while offset < self.end_offset:
+            bases = list(self.bases)
+            index = bisect.bisect_right(bases, offset) - 1
+            base = bases[index]
+            segment_end = bases[index + 1] if index + 1 < len(bases) else None
+            with open(self._segment_path(base), 'rb') as f:
+                f.seek(offset - base)
+                while offset < (segment_end if segment_end is not None else self.end_offset):
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+                    length, crc = RECORD_HEADER.unpack(header)
+                    payload = f.read(length)
+                    next_offset = offset + RECORD_HEADER.size + length
+                    yield offset, next_offset, payload
+                    offset = next_offset
+                    if segment_end is None and self.bases[-1] > base:
+                        segment_end = self._segment_after(base)
+            if segment_end is None:
+                break
+            offset = segment_end
+
+    def _segment_after(self, base):
+        bases = list(self.bases)
+        return bases[bisect.bisect_right(bases, base)]
+
+    def commit(self, offset):
+        """Record that everything before offset was delivered and drop finished segments."""
+        if offset <= self.committed:
+            return
+        self.committed = offset
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(path + '.tmp', 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        while len(self.bases) > 1 and self.bases[1] <= offset:
+            os.remove(self._segment_path(self.bases.pop(0)))
+        if self.bases and self.file is None and self.bases[0] < offset == self.end_offset:
+            # Nothing left to replay and no open segment: drop the last one too
+            os.remove(self._segment_path(self.bases.pop(0)))
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,81 @@
+import json
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+class LatencyTracer:
+    """Rolling per-stage latency percentiles for fixes moving through the pipeline.
+
+    Each fix carries monotonic stamps taken when the report that completed it
+    was received and when it was fused (`fix.trace`). Sinks call stage() with
+    their own stamps, and the tracer keeps the last `window` durations of every
+    stage for p50/p95/p99. Every sample_every-th fix (0: none) is also written
+    to `trace_logger` as one JSON line per sink, with all of its stamps
+    relative to receipt.
+    """
+
+    def __init__(self, window=2048, sample_every=0, trace_logger=None):
+        self.window = window
+        self.sample_every = sample_every
+        self.trace_logger = trace_logger or logger
+        self.samples = {}  # stage -> deque of seconds
+        self.counts = {}
+        self.fixes = 0
+
+    def start(self, fix, received):
+        """Stamp a freshly fused fix; `received` is when its last report arrived."""
+        fused = time.monotonic()
+        self.fixes += 1
+        fix.trace = {"received": received, "fused": fused,
+                     "sampled": bool(self.sample_every) and self.fixes % self.sample_every == 0}
+        self.observe("fusion", fused - received)
+
+    def observe(self, stage, seconds):
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples[stage] = deque(maxlen=self.window)
+            self.counts[stage] = 0
+        samples.append(seconds)
+        self.counts[stage] += 1
+
+    def stage(self, fix, sink, **stamps):
+        """Record a sink's monotonic stamps for a fix, in pipeline order.
+
+        Each stamp is observed as "<sink>.<name>" relative to the previous one
+        (the first relative to fusion), plus "<sink>.total" from receipt.
+        """
+        trace = fix.trace
+        if trace is None:
+            return
+        previous = trace["fused"]
+        for name, stamp in stamps.items():
+            self.observe(f"{sink}.{name}", stamp - previous)
+            previous = stamp
+        self.observe(f"{sink}.total", previous - trace["received"])
+        if trace["sampled"]:
+            relative = {name: round((stamp - trace["received"]) * 1000, 3) for name, stamp in stamps.items()}
+            relative["fused"] = round((trace["fused"] - trace["received"]) * 1000, 3)
+            self.trace_logger.info(json.dumps({"fix_time": fix.time, "sink": sink, "ms": relative}))
+
+    def percentiles(self):
+        """Return {stage: {count, p50, p95, p99, max}} in milliseconds over the rolling window."""
+        result = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            result[stage] = {
+                "count": self.counts[stage],
+                **{name: round(percentile(ordered, fraction) * 1000, 3)
+                   for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+                "max": round(ordered[-1] * 1000, 3),
+            }
+        return result
@@ -0,0 +1,268 @@
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import sys
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Column name -> array typecode. Floats use NaN and integers -1 for missing values.
+COLUMNS = {
+    'time': 'd',
+    'heading': 'f',
+    'top_latitude': 'd',
+    'top_longitude': 'd',
+    'top_altitude': 'f',
+    'top_speed': 'f',
+    'top_satellites': 'h',
+    'bottom_latitude': 'd',
+    'bottom_longitude': 'd',
+    'bottom_altitude': 'f',
+    'bottom_speed': 'f',
+    'bottom_satellites': 'h',
+}
+RECEIVER_FIELDS = ('latitude', 'longitude', 'altitude', 'speed', 'satellites')
+MISSING_INT = -1
+SCHEMA_FILE = 'schema.json'
+INDEX_FILE = 'time.idx'
+INDEX_STRIDE = 256  # Rows per sparse time index entry
+
+
+def new_columns():
+    """Return an empty dict of typed arrays, one per store column."""
+    return {name: array(typecode) for name, typecode in COLUMNS.items()}
+
+
+def column_value(name, value):
+    """Map None to the column's missing-value marker."""
+    if value is None:
+        return MISSING_INT if COLUMNS[name] == 'h' else math.nan
+    return value
+
+
+def fix_row(fix):
+    """Flatten a GpsFix into a {column: value} row."""
+    row = {'time': fix.time, 'heading': column_value('heading', fix.heading)}
+    for prefix, rx in (('top', fix.top), ('bottom', fix.bottom)):
+        for field in RECEIVER_FIELDS:
+            name = f"{prefix}_{field}"
+            row[name] = column_value(name, getattr(rx, field) if rx is not None else None)
+    return row
+
+
+def column_path(directory, name):
+    return os.path.join(directory, f"{name}.col")
+
+
+class TrackStoreWriter:
+    """Append-only columnar track store: one little-endian typed-array file per column.
+
+    Rows are buffered in memory and appended to every column file on flush(),
+    which also extends a sparse index holding the time of every INDEX_STRIDE-th
+    row. Rows must arrive in time order and older ones are counted in
+    `out_of_order`: append_row() skips them, and extend() rejects a batch whole
+    with ValueError. On open, columns left uneven by a crash mid-flush are
+    truncated to the shortest one, so the store always holds whole rows.
+    """
+
+    def __init__(self, directory, flush_rows=1024, flush_interval=None):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        schema_path = os.path.join(directory, SCHEMA_FILE)
+        if not os.path.exists(schema_path):
+            with open(schema_path, 'w') as f:
+                json.dump({"columns": COLUMNS, "byteorder": "little", "index_stride": INDEX_STRIDE}, f)
+        self.rows = self._repair()
+        self.last_time = self._last_time()
+        self.out_of_order = 0
+        self.pending = new_columns()
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+
+    def column_path(self, name):
+        return column_path(self.directory, name)
+
+    def _last_time(self):
+        if not self.rows:
+            return -math.inf
+        with open(self.column_path('time'), 'rb') as f:
+            f.seek((self.rows - 1) * 8)
+            last = array('d', f.read(8))
+        if sys.byteorder != 'little':
+            last.byteswap()
+        return last[0]
+
+    def _repair(self):
+        counts = {}
+        for name, typecode in COLUMNS.items():
+            path = self.column_path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            counts[name] = size // array(typecode).itemsize
+        rows = min(counts.values())
+        for name, typecode in COLUMNS.items():
+            if counts[name] != rows or not os.path.exists(self.column_path(name)):
+                with open(self.column_path(name), 'ab') as f:
+                    f.truncate(rows * array(typecode).itemsize)
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        index_size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        if index_size != -(-rows // INDEX_STRIDE) * 8:
+            # Rebuild the sparse index from the time column
+            index = array('d')
+            with open(self.column_path('time'), 'rb') as f:
+                for row in range(0, rows, INDEX_STRIDE):
+                    f.seek(row * 8)
+                    index.frombytes(f.read(8))
+            with open(index_path, 'wb') as f:
+                index.tofile(f)
+        return rows
+
+    def append_row(self, row):
+        """Buffer one row; return False and skip it if it is older than the last stored row."""
+        if row['time'] < self.last_time:
+            self.out_of_order += 1
+            return False
+        self.last_time = row['time']
+        for name, column in self.pending.items():
+            column.append(row[name])
+        self.pending_rows += 1
+        self._maybe_flush()
+        return True
+
+    def append_fix(self, fix):
+        return self.append_row(fix_row(fix))
+
+    def extend(self, columns):
+        """Append a whole batch of rows given as {column: array}, or none of them."""
+        times = columns['time']
+        if not times:
+            return
+        if times[0] < self.last_time:
+            self.out_of_order += len(times)
+            raise ValueError(f"Track store batch starting at {times[0]} is older than the last stored row at "
+                             f"{self.last_time}")
+        for row in range(1, len(times)):
+            if times[row] < times[row - 1]:
+                self.out_of_order += len(times)
+                raise ValueError(f"Track store batch goes back in time at row {row} "
+                                 f"({times[row - 1]} then {times[row]})")
+        for name, column in self.pending.items():
+            column.extend(columns[name])
+        self.pending_rows += len(times)
+        self.last_time = times[-1]
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self.pending_rows >= self.flush_rows or (
+                self.flush_interval is not None and time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending_rows:
+            return
+        times = self.pending['time']
+        index = array('d', (times[row - self.rows] for row in
+                            range(-(-self.rows // INDEX_STRIDE) * INDEX_STRIDE, self.rows + self.pending_rows, INDEX_STRIDE)))
+        for name, column in self.pending.items():
+            if sys.byteorder != 'little':
+                column.byteswap()
+            with open(self.column_path(name), 'ab') as f:
+                column.tofile(f)
+        if sys.byteorder != 'little':
+            index.byteswap()
+        with open(os.path.join(self.directory, INDEX_FILE), 'ab') as f:
+            index.tofile(f)
+        self.rows += self.pending_rows
+        self.pending = new_columns()
+        self.pending_rows = 0
+
+    def close(self):
+        self.flush()
+
+
+class TrackStore:
+    """Memory-mapped reader for a track store directory written by TrackStoreWriter."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.rows = 0
+        self.maps = {}
+        self.views = {}
+        self.index = array('d')
+
+    def _refresh(self):
+        """Re-map the column files if the writer has appended rows since the last query."""
+        try:
+            size = os.path.getsize(column_path(self.directory, 'time'))
+        except OSError:
+            return
+        rows = min(size // 8, *(os.path.getsize(column_path(self.directory, name)) // array(typecode).itemsize
+                                for name, typecode in COLUMNS.items()))
+        if rows == self.rows:
+            return
+        self.close()
+        for name, typecode in COLUMNS.items():
+            with open(column_path(self.directory, name), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[name] = mapped
+            self.views[name] = memoryview(mapped).cast(typecode)[:rows]
+        index = array('d')
+        with open(os.path.join(self.directory, INDEX_FILE), 'rb') as f:
+            index.frombytes(f.read(-(-rows // INDEX_STRIDE) * 8))
+        if sys.byteorder != 'little':
+            index.byteswap()
+        self.index = index
+        self.rows = rows
+
+    def _find(self, when):
+        """Return the first row with time >= when (sparse index, then the mapped block)."""
+        block = bisect.bisect_left(self.index, when)
+        lo = max(block - 1, 0) * INDEX_STRIDE
+        hi = min(block * INDEX_STRIDE + 1, self.rows)
+        return bisect.bisect_left(self.views['time'], when, lo, max(lo, hi))
+
+    def query(self, start, end, limit=None):
+        """Return {column: list} for rows with start <= time < end, oldest first."""
+        self._refresh()
+        if not self.rows:
+            return {name: [] for name in COLUMNS}
+        lo = self._find(start)
+        hi = self._find(end)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        result = {}
+        for name, typecode in COLUMNS.items():
+            values = self.views[name][lo:hi]
+            if sys.byteorder != 'little':
+                values = array(typecode, values.tobytes())
+                values.byteswap()
+            result[name] = values.tolist()
+        return result
+
+    def close(self):
+        for view in self.views.values():
+            view.release()
+        for mapped in self.maps.values():
+            mapped.close()
+        self.views = {}
+        self.maps = {}
+        self.rows = 0
+
+
+def history_response(columns):
+    """Shape query() output for JSON: per-receiver groups and null for missing values."""
+    def clean(name):
+        if COLUMNS[name] == 'h':
+            return [None if v == MISSING_INT else v for v in columns[name]]
+        return [None if v != v else v for v in columns[name]]
+
+    response = {"count": len(columns['time']), "time": columns['time'], "heading": clean('heading')}
+    for prefix, key in (('top', 'top_gps'), ('bottom', 'bottom_gps')):
+        response[key] = {field: clean(f"{prefix}_{field}") for field in RECEIVER_FIELDS}
+    return response
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    """Connection state and health of one uplink server."""
+
+    def __init__(self, url, priority):
+        self.url = url
+        self.priority = priority
+        self.websocket = None
+        self.healthy = False
+        self.latency = None  # Smoothed ping round trip in seconds
+        self.failures = 0
+        self.retry_at = 0.0
+        self.connects = 0
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "priority": self.priority,
+            "connected": self.healthy,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "failures": self.failures,
+            "connects": self.connects,
+        }
+
+
+class UplinkManager:
+    """Keep connections to an ordered list of uplink servers, with warm standbys.
+
+    The first 1 + standby endpoints that are not backing off after a failure
+    are kept connected and pinged every ping_interval seconds; a ping that is
+    not answered within ping_timeout counts as a failure. active() is the
+    highest-priority healthy endpoint, so when it fails the sender moves to an
+    already-open standby connection at once, and moves back when a
+    higher-priority endpoint recovers.
+
+    `connect(url)` returns an awaitable that opens a websocket. Every message
+    received on any endpoint is passed to `on_message(endpoint, message)`.
+    """
+
+    def __init__(self, urls, connect, on_message=None, standby=1, ping_interval=5, ping_timeout=5,
+                 connect_timeout=10, reconnect_delay=2, max_reconnect_delay=30):
+        self.endpoints = [Endpoint(url, priority) for priority, url in enumerate(urls)]
+        self.connect = connect
+        self.on_message = on_message
+        self.standby = standby
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.connect_timeout = connect_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.failovers = 0
+        self.changed = None
+        self.tasks = []
+
+    def start(self):
+        self.changed = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._maintain(endpoint)) for endpoint in self.endpoints]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        for endpoint in self.endpoints:
+            if endpoint.websocket is not None:
+                await endpoint.websocket.close()
+
+    def _notify(self):
+        """Wake everyone waiting for a change of endpoint state."""
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def active(self):
+        """Return the highest-priority healthy endpoint, or None."""
+        for endpoint in self.endpoints:
+            if endpoint.healthy:
+                return endpoint
+        return None
+
+    async def wait_active(self):
+        while True:
+            endpoint = self.active()
+            if endpoint is not None:
+                return endpoint
+            await self.changed.wait()
+
+    def fail(self, endpoint):
+        """Report a send failure on endpoint; its connection is dropped and retried later."""
+        if endpoint.healthy:
+            self._failed(endpoint, "send failed")
+            if endpoint.websocket is not None:
+                asyncio.create_task(endpoint.websocket.close())
+
+    def _wanted(self, endpoint):
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.healthy or e.retry_at <= now]
+        return endpoint in candidates[:1 + self.standby]
+
+    def _failed(self, endpoint, error):
+        was_active = endpoint is self.active()
+        endpoint.healthy = False
+        endpoint.failures += 1
+        delay = min(self.reconnect_delay * 2 ** (endpoint.failures - 1), self.max_reconnect_delay)
+        endpoint.retry_at = time.monotonic() + delay * random.uniform(0.8, 1.2)
+        logger.warning(f"Uplink {endpoint.url} failed ({error}); retrying in {delay:.1f} seconds")
+        if was_active and self.active() is not None:
+            self.failovers += 1
+            logger.info(f"Uplink failing over to {self.active().url}")
+        self._notify()
+
+    async def _maintain(self, endpoint):
+        while True:
+            if not self._wanted(endpoint):
+                try:
+                    await asyncio.wait_for(self.changed.wait(), self.ping_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                endpoint.websocket = await asyncio.wait_for(self.connect(endpoint.url), self.connect_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed(endpoint, e)
+                continue
+            endpoint.healthy = True
+            endpoint.failures = 0
+            endpoint.connects += 1
+            logger.info(f"Uplink connected to {endpoint.url}")
+            self._notify()
+            try:
+                await self._monitor(endpoint)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if endpoint.healthy:
+                    self._failed(endpoint, e)
+            finally:
+                if endpoint.websocket is not None:
+                    await endpoint.websocket.close()
+                endpoint.websocket = None
+
+    async def _monitor(self, endpoint):
+        """Read and ping an open connection until it fails or is no longer needed."""
+        websocket = endpoint.websocket
+        reader = asyncio.create_task(self._read(endpoint, websocket))
+        try:
+            while True:
+                if not self._wanted(endpoint) and endpoint is not self.active():
+                    endpoint.healthy = False
+                    logger.info(f"Uplink closing {endpoint.url}, no longer needed as standby")
+                    self._notify()
+                    return
+                started = time.monotonic()
+                pong = await websocket.ping()
+                done, _ = await asyncio.wait([pong, reader], timeout=self.ping_timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if reader in done:
+                    raise ConnectionError("connection closed")
+                if pong not in done:
+                    raise TimeoutError(f"no pong within {self.ping_timeout} seconds")
+                rtt = time.monotonic() - started
+                endpoint.latency = rtt if endpoint.latency is None else 0.8 * endpoint.latency + 0.2 * rtt
+                done, _ = await asyncio.wait([reader], timeout=self.ping_interval)
+                if done:
+                    raise ConnectionError("connection closed")
+        finally:
+            reader.cancel()
+
+    async def _read(self, endpoint, websocket):
+        """Dispatch incoming messages; returns when the connection closes."""
+        try:
+            async for message in websocket:
+                if self.on_message is not None:
+                    try:
+                        self.on_message(endpoint, message)
+                    except Exception as e:
+                        logger.error(f"Error handling message from {endpoint.url}: {e}")
+        except Exception as e:
+            logger.debug(f"Uplink {endpoint.url} closed: {e}")
+
+    def stats(self):
+        active = self.active()
+        return {
+            "active": active.url if active is not None else None,
+            "failovers": self.failovers,
+            "endpoints": [endpoint.stats() for endpoint in self.endpoints],
+        }
@@ -1,4 +1,3 @@
-import gps
 import time
 import logging
 import subprocess
@@ -7,48 +6,137 @@ import glob
 import asyncio
 import websockets
 import json
-import pytz
 import socket
-from datetime import datetime
+from datetime import datetime, timezone
 from aiohttp import web
-from queue import Queue, Empty
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/home/mdt/gps_websocket.log'),
-        logging.StreamHandler()
-    ]
-)
+from gps_fix import GpsFix, GpsFusion
+from gpsd_client import read_gpsd_reports
+from gps_serial import SerialGpsReader
+from gps_spool import Spool
+from gps_session import SessionWriter, SessionWriterThread
+from gps_track_store import TrackStore, TrackStoreWriter, history_response
+from gps_backlog import BacklogUploader
+from gps_broadcast import FixBroadcaster
+from gps_clients import ClientSender
+from gps_wire import SUBPROTOCOL_BINARY, SUBPROTOCOL_DELTA, SUBPROTOCOL_JSON, SUBPROTOCOLS
+from gps_delta import DeltaEncoder
+from gps_motion import MotionReporter
+from gps_simplify import simplify_columns
+from gps_uplink import UplinkManager
+from gps_trace import LatencyTracer
+from gps_logging import queued_file_logger, setup_logging
+from gps_metrics import CONTENT_TYPE, LatencySummary, MetricsRegistry
+from gps_compress import COMPRESSION_HEADER, BatchCompressor, LinkCounter, load_dictionary, offer_header, zstandard
+
+# Setup logging: records go through a queue to a listener thread, so log I/O never blocks the event loop
+LOG_FILE = '/home/mdt/gps_websocket.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the log at this size; rotated files are gzip-compressed
+LOG_BACKUP_COUNT = 5
+LOG_RATE = 5  # Info/debug messages per second allowed from any one log statement (0: unlimited)
+LOG_BURST = 20
+LOG_QUEUE_SIZE = 10000  # Records waiting for the listener thread before new ones are dropped
+log_handler = setup_logging(LOG_FILE, logging.INFO, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_RATE, LOG_BURST,
+                            LOG_QUEUE_SIZE)
 logger = logging.getLogger(__name__)
 
 # Configuration
 GPS_DATA_DIR = '/home/mdt/GPS'
 GPSD_HOST = '127.0.0.1'
 GPSD_PORT = 2947
+GPS_READER_MODE = 'gpsd'  # 'gpsd', or 'serial' to read NMEA/UBX from the receivers directly without gpsd
 WEBSOCKET_PORT = 8766
 HTTP_PORT = 8080
 EXTERNAL_WEBSOCKET_URL = 'ws://13.209.33.15:4002'
+EXTERNAL_WEBSOCKET_URLS = [EXTERNAL_WEBSOCKET_URL]  # In priority order; later entries are failover servers
+UPLINK_STANDBY = 1  # Warm standby connections kept open next to the active one
+UPLINK_PING_INTERVAL = 5  # Seconds between health pings on every open uplink connection
+UPLINK_PING_TIMEOUT = 5  # Seconds without a pong before a connection counts as failed
+UPLINK_WIRE_FORMAT = 'delta'  # 'delta', 'binary' or 'json'; falls back to the next format the server accepts
+UPLINK_KEYFRAME_INTERVAL = 60  # Delta format: send the full fix every this many messages
+UPLINK_COMPRESSION = 'deflate'  # 'deflate' (permessage-deflate), 'zstd' (also zstd backlog batches) or None
+ZSTD_DICTIONARY_PATH = os.path.join(GPS_DATA_DIR, "gps_zstd.dict")  # Trained with gps_compress.py; optional
+ZSTD_LEVEL = 3
+UPLINK_ADAPTIVE_RATE = True  # Only send live fixes that leave the motion dead-band below (False: every fix)
+UPLINK_MIN_DISTANCE = 25  # Metres moved since the last sent fix
+UPLINK_MIN_HEADING_CHANGE = 5  # Degrees turned, counted only at UPLINK_MIN_HEADING_SPEED km/h or more
+UPLINK_MIN_HEADING_SPEED = 2
+UPLINK_MIN_SPEED_CHANGE = 2  # km/h
+UPLINK_HEARTBEAT = 60  # Seconds without a sent fix before one is sent anyway
 TIMEOUT = 10
 RECONNECT_DELAY = 2
+MAX_RECONNECT_DELAY = 30
 DATA_TIMEOUT = 30
 SHIP_ID = "SHIP456"
-BATCH_SEND_DELAY = 0.1
 DEBOUNCE_INTERVAL = 0.5  # Debounce TPV reports only
-JSON_LOG_FILE = os.path.join(GPS_DATA_DIR, "offline_gps_data.json")
+JSON_LOG_FILE = os.path.join(GPS_DATA_DIR, "offline_gps_data.json")  # Pre-spool offline log, migrated on start
+SPOOL_DIR = os.path.join(GPS_DATA_DIR, "offline_spool")
+SPOOL_SEGMENT_BYTES = 4 * 1024 * 1024
+SPOOL_FSYNC_POLICY = 'interval'  # 'always', 'interval' or 'never'
+SPOOL_FSYNC_INTERVAL = 5  # Seconds; at most this much offline data is lost on power failure
+BACKLOG_BATCH_RECORDS = 500  # Offline records per uplink frame
+BACKLOG_BATCH_BYTES = 256 * 1024
+BACKLOG_BATCH_INTERVAL = 1.0  # Seconds a batch may stay open while it is assembled
+BACKLOG_WINDOW = 4  # Batches sent ahead of the server's acks
+BACKLOG_ACK_TIMEOUT = 30
+BACKLOG_REQUIRE_ACK = True  # False: count a batch as delivered once it is sent
+BACKLOG_PRIORITY = 'low'  # 'low': backlog only goes out while no live fix is waiting; 'equal': interleave
+BACKLOG_SIMPLIFY_TOLERANCE = 5  # Metres a simplified backlog track may stray from the original; 0 uploads every record
+SIMPLIFY_MAX_INTERVAL = 60  # Simplified tracks keep at least one fix this many seconds apart
+SESSION_MAX_BYTES = 16 * 1024 * 1024  # Session text files are rotated at this size and every hour
+SESSION_FLUSH_BYTES = 64 * 1024  # Session text buffered in memory before it is written out
+SESSION_FLUSH_INTERVAL = 5  # Seconds text may stay buffered
+SESSION_FSYNC_POLICY = 'interval'  # 'always', 'interval' or 'never'
+SESSION_FSYNC_INTERVAL = 30  # Seconds between fsyncs of the session file
+SESSION_COMPRESS = True  # Gzip rotated session files in the background
+SESSION_QUEUE_SIZE = 10000  # Fix texts waiting for the writer thread before new ones are dropped
+TRACK_STORE_DIR = os.path.join(GPS_DATA_DIR, "track_store")
+TRACK_STORE_FLUSH_INTERVAL = 10  # Seconds of fixes buffered before they reach the track store
+MAX_HISTORY_ROWS = 100000  # Cap on fixes returned by one /gps/history request
+FANOUT_BUFFER_SIZE = 256  # Fixes each sink may lag behind before its queue policy applies
+# Per-sink policy once it falls FANOUT_BUFFER_SIZE fixes behind: 'drop-oldest', 'conflate-latest'
+# (only the newest fix matters) or 'spill' (uplink only: overflow goes to the offline spool)
+SINK_QUEUE_POLICIES = {
+    'uplink': 'spill',
+    'local_clients': 'conflate-latest',
+    'file_writer': 'drop-oldest',
+    'track_store': 'drop-oldest',
+    'offline_log': 'drop-oldest',
+}
+TRACE_WINDOW = 2048  # Recent fixes each stage's latency percentiles are computed over
+TRACE_SAMPLE_EVERY = 0  # Log the full stage trace of every Nth fix (0: off)
+TRACE_LOG_FILE = os.path.join(GPS_DATA_DIR, "gps_trace.log")  # Where sampled traces go
+CLIENT_QUEUE_SIZE = 4  # Fixes queued per local client; the oldest is dropped when full (1 = latest only)
+CLIENT_WRITE_LIMIT = 64 * 1024  # Socket buffer bytes above which a client's send waits for it to drain
+# Unsent bytes that mark a client as congested; at the write limit, so a client whose
+# send is waiting for its buffer to drain counts as congested
+CLIENT_HIGH_WATER_BYTES = CLIENT_WRITE_LIMIT
+CLIENT_EVICT_AFTER = 10  # Seconds a client may stay congested before it is disconnected
 
 # Global variables
 latest_gps_data = None
-connected_clients = set()
-gps_data_queue = Queue()
+latest_gps_fix = None
+connected_clients = {}  # websocket -> ClientSender
+client_stats = {'connections': 0, 'sent': 0, 'conflated': 0, 'evicted': 0, 'send_errors': 0}
+fix_broadcaster = FixBroadcaster(FANOUT_BUFFER_SIZE)
+track_store = TrackStore(TRACK_STORE_DIR)
 external_ws_connected = False
-last_tpv_time = {device: 0 for device in ['/dev/ttyACM0', '/dev/ttyACM1']}
-current_output_file = None
+session_writer = None  # gps_session.SessionWriterThread, created in main()
 app_start_time = None
 ws_server = None
+batch_compressor = None  # gps_compress.BatchCompressor when UPLINK_COMPRESSION is 'zstd'
+link_counter = LinkCounter()  # Uplink bytes before and after permessage-deflate, whatever the mode
+uplink = None  # gps_uplink.UplinkManager
+backlog_uploader = None  # BacklogUploader for the active uplink connection
 http_runner = None
+fusion = None  # GpsFusion, read by /metrics
+serial_reader = None
+gpsd_stats = {}  # Filled in by read_gpsd_reports()
+report_latency = LatencySummary()  # Fusion time per receiver report
+fanout_latency = LatencySummary()  # Fix creation until it is queued for every local client
+uplink_send_latency = LatencySummary()
+metrics = MetricsRegistry()
+tracer = None  # gps_trace.LatencyTracer, created in main()
+offline_spool = None
 
 def get_device_id():
     """Retrieve the Raspberry Pi's serial number as the device ID."""
@@ -66,11 +154,6 @@ def get_device_id():
         logger.error(f"Error retrieving device ID: {e}")
         return "unknown_device_id"
 
-def get_output_filename():
-    """Generate output filename with current date and time."""
-    now = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    return os.path.join(GPS_DATA_DIR, f"gps_data_{now}.txt")
-
 def is_port_free(port):
     """Check if a port is free."""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -134,166 +217,98 @@ def ensure_gpsd_running(devices):
         logger.error(f"Failed to start gpsd: {e}")
         return False
 
-def log_offline_data(gps_data):
-    """Log GPS data to JSON file when no clients are connected and external server is unavailable."""
-    if not all(
-        gps.get('latitude') is not None and
-        gps.get('longitude') is not None and
-        gps.get('altitude') is not None and
-        gps.get('speed') is not None and
-        gps.get('satellites') is not None
-        for gps in gps_data.get('gps_data', [])
-    ):
-        logger.info("Skipping offline logging of incomplete GPS data")
-        return
-    try:
-        os.makedirs(GPS_DATA_DIR, exist_ok=True)
-        with open(JSON_LOG_FILE, 'a') as f:
-            json.dump(gps_data, f)
-            f.write('\n')
-        logger.info(f"Logged offline GPS data to {JSON_LOG_FILE}")
-    except Exception as e:
-        logger.error(f"Failed to log offline data: {e}")
-
-async def clean_offline_data():
-    """Remove entries from offline JSON file where any required GPS field is missing."""
+def migrate_offline_json():
+    """Move records from the old offline JSON log into the spool, once."""
     if not os.path.exists(JSON_LOG_FILE):
         return
-    valid_lines = []
+    migrated = 0
     try:
         with open(JSON_LOG_FILE, 'r') as f:
             for line in f:
                 try:
                     data = json.loads(line.strip())
-                    if all(
-                        gps.get('latitude') is not None and
-                        gps.get('longitude') is not None and
-                        gps.get('altitude') is not None and
-                        gps.get('speed') is not None and
-                        gps.get('satellites') is not None
-                        for gps in data.get('gps_data', [])
-                    ):
-                        valid_lines.append(line)
                 except json.JSONDecodeError:
                     logger.error(f"Invalid JSON in offline log: {line}")
-        with open(JSON_LOG_FILE, 'w') as f:
-            for line in valid_lines:
-                f.write(line)
-        logger.info("Cleaned offline data entries with missing GPS values")
+                    continue
+                if all(
+                    gps.get('latitude') is not None and
+                    gps.get('longitude') is not None and
+                    gps.get('altitude') is not None and
+                    gps.get('speed') is not None and
+                    gps.get('satellites') is not None
+                    for gps in data.get('gps_data', [])
+                ):
+                    offline_spool.append(line.strip().encode())
+                    migrated += 1
+        offline_spool.sync()
+        os.remove(JSON_LOG_FILE)
+        logger.info(f"Moved {migrated} records from {JSON_LOG_FILE} to the offline spool")
     except Exception as e:
-        logger.error(f"Failed to clean offline data: {e}")
+        logger.error(f"Failed to migrate offline JSON log: {e}")
 
-async def send_offline_data(websocket):
-    """Send valid offline data to the client."""
+def log_offline_data(fix):
+    """Spool a fix for replay once the external server is reachable again; return whether it was spooled."""
+    if not fix.is_complete():
+        logger.debug("Skipping offline logging of incomplete GPS data")
+        return False
     try:
-        await clean_offline_data()
-        if not os.path.exists(JSON_LOG_FILE):
-            logger.info("No offline data to send")
-            return
-        with open(JSON_LOG_FILE, 'r') as f:
-            for line in f:
-                try:
-                    gps_data = json.loads(line.strip())
-                    if all(
-                        gps.get('latitude') is not None and
-                        gps.get('longitude') is not None and
-                        gps.get('altitude') is not None and
-                        gps.get('speed') is not None and
-                        gps.get('satellites') is not None
-                        for gps in gps_data.get('gps_data', [])
-                    ):
-                        await websocket.send(json.dumps(gps_data))
-                        logger.info(f"Sent offline GPS data: {gps_data}")
-                        await asyncio.sleep(BATCH_SEND_DELAY)
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON in offline log: {line}")
-                except Exception as e:
-                    logger.error(f"Error sending offline data: {e}")
-                    raise
-        logger.info("Finished sending offline data")
-        try:
-            open(JSON_LOG_FILE, 'w').close()
-            logger.info(f"Cleared offline log file {JSON_LOG_FILE}")
-        except Exception as e:
-            logger.error(f"Failed to clear offline log file: {e}")
+        offline_spool.append(fix.to_json().encode())
+        logger.debug(f"Logged offline GPS data to {SPOOL_DIR}")
+        return True
     except Exception as e:
-        logger.error(f"Error processing offline data: {e}")
+        logger.error(f"Failed to log offline data: {e}")
+        return False
+
+def spill_uplink_fix(fix):
+    """Spool a fix the uplink fell too far behind to send and wake the backlog upload.
 
-async def parse_gps_data(gps_text):
-    """Parse GPS text data into a structured JSON object."""
+    Returns whether the fix was spooled, so the broadcaster only counts real spills.
+    """
+    # While disconnected, log_offline_gps_data() has already spooled every fix
+    if not external_ws_connected or not fix.is_complete() or not log_offline_data(fix):
+        return False
+    if backlog_uploader is not None:
+        backlog_uploader.notify()
+    return True
+
+async def send_offline_data(endpoint, uploader):
+    """Upload the offline spool and later spills; on failure drop the connection so the uplink fails over."""
     try:
-        data = {
-            "timestamp": "",
-            "ship_id": SHIP_ID,
-            "device_id": get_device_id(),
-            "heading": None,
-            "gps_data": [
-                {"gps": "top_gps", "latitude": None, "longitude": None, "altitude": None, "speed": None, "satellites": None, "satellite_prns": []},
-                {"gps": "bottom_gps", "latitude": None, "longitude": None, "altitude": None, "speed": None, "satellites": None, "satellite_prns": []}
-            ]
-        }
-        lines = gps_text.strip().split("\n")
-        current_index = None
-        for line in lines:
-            line = line.strip()
-            if line.startswith("GPS Data (Real-Time):"):
-                data["timestamp"] = line.split(":", 1)[1].strip()
-            elif line.startswith("Heading:"):
-                heading_str = line.split(":", 1)[1].strip()
-                try:
-                    data["heading"] = float(heading_str) if heading_str != "Unknown" else None
-                except ValueError:
-                    data["heading"] = None
-            elif "Top GPS" in line:
-                current_index = 0
-            elif "Bottom GPS" in line:
-                current_index = 1
-            elif "Latitude:" in line and current_index is not None:
-                lat_str = line.split(":", 1)[1].strip()
-                try:
-                    data["gps_data"][current_index]["latitude"] = float(lat_str) if lat_str != "Unknown" else None
-                except ValueError:
-                    data["gps_data"][current_index]["latitude"] = None
-            elif "Longitude:" in line and current_index is not None:
-                lon_str = line.split(":", 1)[1].strip()
-                try:
-                    data["gps_data"][current_index]["longitude"] = float(lon_str) if lon_str != "Unknown" else None
-                except ValueError:
-                    data["gps_data"][current_index]["longitude"] = None
-            elif "Altitude (m):" in line and current_index is not None:
-                alt_str = line.split(":", 1)[1].strip()
-                try:
-                    data["gps_data"][current_index]["altitude"] = float(alt_str) if alt_str != "Unknown" else None
-                except ValueError:
-                    data["gps_data"][current_index]["altitude"] = None
-            elif "Speed (km/h):" in line and current_index is not None:
-                speed_str = line.split(":", 1)[1].strip()
-                try:
-                    data["gps_data"][current_index]["speed"] = float(speed_str) if speed_str != "Unknown" else None
-                except ValueError:
-                    data["gps_data"][current_index]["speed"] = None
-            elif "Satellites:" in line and current_index is not None:
-                sat_str = line.split(":", 1)[1].strip()
-                try:
-                    data["gps_data"][current_index]["satellites"] = int(sat_str) if sat_str != "Unknown" and sat_str else None
-                except ValueError:
-                    data["gps_data"][current_index]["satellites"] = None
-            elif "Satellite PRNs:" in line and current_index is not None:
-                prns = line.split(":", 1)[1].strip()
-                data["gps_data"][current_index]["satellite_prns"] = [prn.strip() for prn in prns.split(",") if prn.strip()] if prns and prns != "Unknown" else []
-        return data
+        await uploader.serve()
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        logger.error(f"Error parsing GPS data: {e}")
-        return None
+        logger.error(f"Error sending offline data: {e}")
+        uplink.fail(endpoint)
+
+def handle_external_message(endpoint, message):
+    """Dispatch messages from the external servers, i.e. backlog batch acks."""
+    try:
+        data = json.loads(message)
+    except (TypeError, ValueError):
+        logger.debug(f"Ignoring non-JSON message from external server: {message!r}")
+        return
+    if isinstance(data, dict) and data.get('type') == 'ack':
+        # Acks only count on the connection the batches were sent on
+        if backlog_uploader is not None and backlog_uploader.websocket is endpoint.websocket:
+            backlog_uploader.handle_ack(data.get('batch_id'))
+    else:
+        logger.debug(f"Received message from external server {endpoint.url}: {data}")
+
+def trace_client_send(fix):
+    tracer.stage(fix, "client", sent=time.monotonic())
 
 async def websocket_handler(websocket, path):
     """Handle WebSocket connections."""
     logger.info(f"New WebSocket connection from {websocket.remote_address}")
-    connected_clients.add(websocket)
+    sender = ClientSender(websocket, client_stats, CLIENT_QUEUE_SIZE, CLIENT_HIGH_WATER_BYTES, CLIENT_EVICT_AFTER,
+                          binary=websocket.subprotocol == SUBPROTOCOL_BINARY, on_sent=trace_client_send)
+    connected_clients[websocket] = sender
+    client_stats['connections'] += 1
     try:
         # Send any existing data immediately
-        if latest_gps_data:
-            await websocket.send(json.dumps(latest_gps_data))
+        if latest_gps_fix:
+            sender.offer(latest_gps_fix.to_binary() if sender.binary else latest_gps_fix.to_json())
         
         # Keep connection alive
         while True:
@@ -309,7 +324,8 @@ async def websocket_handler(websocket, path):
     except Exception as e:
         logger.error(f"WebSocket handler error: {e}")
     finally:
-        connected_clients.discard(websocket)
+        connected_clients.pop(websocket, None)
+        sender.close()
         logger.info(f"Client {websocket.remote_address} disconnected")
 
 async def get_gps_data(request):
@@ -326,6 +342,67 @@ async def get_gps_data(request):
         return web.json_response(latest_gps_data)
     return web.json_response({"error": "No valid GPS data available"}, status=404)
 
+def parse_history_time(value, default):
+    """Parse a history query bound given as epoch seconds or an ISO 8601 UTC time."""
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+async def get_client_stats(request):
+    """Handle HTTP GET /gps/clients requests with local client send counters."""
+    clients = [{
+        "address": str(websocket.remote_address),
+        "format": "binary" if sender.binary else "json",
+        "queued": len(sender.queue),
+        "buffered_bytes": sender.buffered_bytes(),
+        "congested_seconds": round(time.monotonic() - sender.congested_since, 1) if sender.congested_since else 0,
+    } for websocket, sender in connected_clients.items()]
+    return web.json_response({"connected": len(connected_clients), **client_stats, "clients": clients})
+
+async def get_queue_stats(request):
+    """Handle HTTP GET /gps/queues requests with per-sink depth, drop, conflation and spill counters."""
+    return web.json_response({"capacity": fix_broadcaster.capacity, "sinks": fix_broadcaster.stats(),
+                              "session_file": session_writer.stats() if session_writer else None})
+
+async def get_uplink_stats(request):
+    """Handle HTTP GET /gps/uplink requests with endpoint health, latency and compression counters."""
+    if uplink is None:
+        return web.json_response({"error": "Uplink not started"}, status=503)
+    response = uplink.stats()
+    response["external_ws_connected"] = external_ws_connected
+    response["link"] = dict(link_counter.stats(), mode=UPLINK_COMPRESSION or 'none')
+    if batch_compressor is not None:
+        response["compression"] = batch_compressor.stats()
+    return web.json_response(response)
+
+async def get_gps_history(request):
+    """Handle HTTP GET /gps/history?from=&to=&tolerance= requests from the track store.
+
+    tolerance (metres) returns a simplified track that strays at most that far from the stored one.
+    """
+    try:
+        start = parse_history_time(request.query.get('from'), 0.0)
+        end = parse_history_time(request.query.get('to'), float('inf'))
+    except ValueError:
+        return web.json_response({"error": "from/to must be epoch seconds or ISO 8601 times"}, status=400)
+    try:
+        tolerance = float(request.query.get('tolerance') or 0)
+    except ValueError:
+        return web.json_response({"error": "tolerance must be a number of metres"}, status=400)
+    columns = track_store.query(start, end, MAX_HISTORY_ROWS)
+    truncated = len(columns['time']) >= MAX_HISTORY_ROWS
+    if tolerance > 0:
+        columns = simplify_columns(columns, tolerance, SIMPLIFY_MAX_INTERVAL)
+    response = history_response(columns)
+    response["truncated"] = truncated
+    return web.json_response(response)
+
 async def start_websocket_server():
     """Start the WebSocket server."""
     global ws_server
@@ -339,11 +416,80 @@ async def start_websocket_server():
         WEBSOCKET_PORT,
         ping_interval=20,
         ping_timeout=30,
-        close_timeout=10
+        close_timeout=10,
+        write_limit=CLIENT_WRITE_LIMIT,
+        subprotocols=SUBPROTOCOLS
     )
     logger.info(f"WebSocket server started on ws://0.0.0.0:{WEBSOCKET_PORT}")
     return ws_server
 
+def register_metrics():
+    """Register the /metrics series; values are read from the live counters at scrape time."""
+    metrics.counter('reports_total', "Receiver reports by device and gpsd class",
+                    lambda: [({"device": device, "class": cls}, n) for (device, cls), n in fusion.reports.items()]
+                    if fusion else [])
+    metrics.counter('tpv_debounced_total', "TPV reports dropped by the debounce interval",
+                    lambda: [({"device": device}, n) for device, n in fusion.debounced.items()] if fusion else [])
+    metrics.counter('fixes_total', "Fused fixes published", lambda: fusion.fixes if fusion else 0)
+    metrics.counter('report_parse_seconds_total', "Time spent decoding gpsd JSON",
+                    lambda: gpsd_stats.get('parse_seconds', 0))
+    metrics.summary('report_process_seconds', "Fusion time per receiver report", report_latency)
+    metrics.counter('gpsd_connects_total', "Connections made to gpsd", lambda: gpsd_stats.get('connects', 0))
+    metrics.counter('serial_reports_dropped_total', "Serial reports dropped because fusion fell behind",
+                    lambda: serial_reader.dropped if serial_reader else 0)
+    for counter in ('dropped', 'conflated', 'spilled'):
+        metrics.counter(f'sink_{counter}_total', f"Fixes {counter} by each sink's queue policy",
+                        lambda counter=counter: [({"sink": name}, stats[counter])
+                                                 for name, stats in fix_broadcaster.stats().items()])
+    metrics.gauge('sink_queue_depth', "Fixes published but not yet consumed, per sink",
+                  lambda: [({"sink": name}, stats['lag']) for name, stats in fix_broadcaster.stats().items()])
+    metrics.summary('broadcast_fanout_seconds', "Fix creation until queued for every local client", fanout_latency)
+    metrics.gauge('clients_connected', "Local WebSocket clients", lambda: len(connected_clients))
+    for counter in ('sent', 'conflated', 'evicted', 'send_errors'):
+        metrics.counter(f'client_{counter}_total', f"Local client messages {counter.replace('_', ' ')}",
+                        lambda counter=counter: client_stats[counter])
+    metrics.summary('uplink_send_seconds', "Time to hand a live fix to the uplink connection", uplink_send_latency)
+    metrics.gauge('uplink_connected', "Uplink endpoint connection state",
+                  lambda: [({"url": e.url}, e.healthy) for e in uplink.endpoints] if uplink else [])
+    metrics.gauge('uplink_ping_seconds', "Smoothed uplink ping round trip",
+                  lambda: [({"url": e.url}, e.latency) for e in uplink.endpoints] if uplink else [])
+    metrics.counter('uplink_connects_total', "Uplink connections made",
+                    lambda: [({"url": e.url}, e.connects) for e in uplink.endpoints] if uplink else [])
+    metrics.counter('uplink_failovers_total', "Uplink failovers to a standby", lambda: uplink.failovers if uplink else 0)
+    metrics.counter('uplink_message_bytes_total', "Uplink message bytes before permessage-deflate",
+                    lambda: link_counter.bytes_in)
+    metrics.counter('uplink_wire_bytes_total', "Uplink message bytes after permessage-deflate",
+                    lambda: link_counter.bytes_out)
+    metrics.counter('uplink_compress_seconds_total', "CPU time spent in permessage-deflate on the uplink",
+                    lambda: link_counter.cpu_seconds)
+    metrics.counter('backlog_zstd_seconds_total', "CPU time spent zstd-compressing backlog batches",
+                    lambda: batch_compressor.cpu_seconds if batch_compressor else 0)
+    metrics.gauge('backlog_bytes', "Offline spool bytes not yet acknowledged by the server",
+                  lambda: offline_spool.pending_bytes if offline_spool else 0)
+    metrics.gauge('stage_latency_seconds', "Rolling pipeline stage latency percentiles (see /gps/latency)",
+                  lambda: [({"stage": stage, "quantile": q}, stats[name] / 1000)
+                           for stage, stats in tracer.percentiles().items()
+                           for name, q in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99"))])
+    metrics.counter('log_records_dropped_total', "Log records dropped because the log queue was full",
+                    lambda: log_handler.dropped)
+    metrics.counter('log_records_suppressed_total', "Log records suppressed by the per-statement rate limit",
+                    lambda: sum(f.suppressed for f in log_handler.filters))
+    for counter in ('writes', 'fsyncs', 'rotations', 'compressed', 'dropped'):
+        metrics.counter(f'session_file_{counter}_total', f"Session file {counter}",
+                        lambda counter=counter: session_writer.stats()[counter] if session_writer else 0)
+    metrics.gauge('session_file_buffered_bytes', "Session text waiting to be written",
+                  lambda: session_writer.buffered if session_writer else 0)
+    metrics.gauge('fix_age_seconds', "Age of the newest complete fix",
+                  lambda: time.time() - latest_gps_fix.time if latest_gps_fix else None)
+
+async def get_latency(request):
+    """Handle HTTP GET /gps/latency requests with per-stage p50/p95/p99 in milliseconds."""
+    return web.json_response({"window": tracer.window, "stages": tracer.percentiles()})
+
+async def get_metrics(request):
+    """Handle HTTP GET /metrics requests in the Prometheus text format."""
+    return web.Response(body=metrics.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
 async def start_http_server():
     """Start the HTTP server."""
     global http_runner
@@ -352,7 +498,14 @@ async def start_http_server():
         raise OSError(f"Port {HTTP_PORT} is already in use")
     
     app = web.Application()
+    register_metrics()
+    app.router.add_get('/metrics', get_metrics)
+    app.router.add_get('/gps/latency', get_latency)
     app.router.add_get('/gps', get_gps_data)
+    app.router.add_get('/gps/history', get_gps_history)
+    app.router.add_get('/gps/clients', get_client_stats)
+    app.router.add_get('/gps/uplink', get_uplink_stats)
+    app.router.add_get('/gps/queues', get_queue_stats)
     http_runner = web.AppRunner(app)
     await http_runner.setup()
     site = web.TCPSite(http_runner, '0.0.0.0', HTTP_PORT)
@@ -360,101 +513,198 @@ async def start_http_server():
     logger.info(f"HTTP server started on http://0.0.0.0:{HTTP_PORT}")
 
 async def send_to_external_websocket():
-    """Send GPS data to the external WebSocket server."""
-    global external_ws_connected
+    """Send GPS data to the active external WebSocket server, failing over between EXTERNAL_WEBSOCKET_URLS."""
+    global external_ws_connected, batch_compressor, uplink, backlog_uploader
+    subscription = fix_broadcaster.subscribe("uplink", SINK_QUEUE_POLICIES['uplink'], spill_uplink_fix)
+    live_idle = asyncio.Event()
+    reporter = MotionReporter(UPLINK_MIN_DISTANCE, UPLINK_MIN_HEADING_CHANGE, UPLINK_MIN_SPEED_CHANGE,
+                              UPLINK_HEARTBEAT, UPLINK_MIN_HEADING_SPEED)
+    extra_headers = {}
+    if UPLINK_COMPRESSION == 'zstd':
+        if zstandard is None:
+            logger.warning("zstandard is not installed; backlog batches will not be zstd-compressed")
+        else:
+            zstd_dictionary = load_dictionary(ZSTD_DICTIONARY_PATH)
+            batch_compressor = BatchCompressor(zstd_dictionary, ZSTD_LEVEL)
+            extra_headers[COMPRESSION_HEADER] = offer_header(zstd_dictionary)
+    subprotocols = {
+        'delta': [SUBPROTOCOL_DELTA, SUBPROTOCOL_BINARY, SUBPROTOCOL_JSON],
+        'binary': SUBPROTOCOLS,
+    }.get(UPLINK_WIRE_FORMAT)
+
+    def connect(url):
+        # Health pings come from the UplinkManager, which also measures their latency
+        return websockets.connect(url, subprotocols=subprotocols, extra_headers=extra_headers,
+                                  compression='deflate' if UPLINK_COMPRESSION else None,
+                                  ping_interval=None, close_timeout=TIMEOUT)
+
+    uplink = UplinkManager(EXTERNAL_WEBSOCKET_URLS, connect, handle_external_message, UPLINK_STANDBY,
+                           UPLINK_PING_INTERVAL, UPLINK_PING_TIMEOUT, TIMEOUT, RECONNECT_DELAY, MAX_RECONNECT_DELAY)
+    uplink.start()
+    pending_fix = None  # Fix whose send failed, retried on the next endpoint
     while True:
         try:
-            async with websockets.connect(EXTERNAL_WEBSOCKET_URL) as websocket:
-                logger.info(f"Connected to external WebSocket server: {EXTERNAL_WEBSOCKET_URL}")
+            endpoint = uplink.active()
+            if endpoint is None:
+                if external_ws_connected:
+                    logger.warning("No external WebSocket server reachable; logging fixes for offline replay")
+                external_ws_connected = False
+                live_idle.clear()
+                if pending_fix is not None:
+                    log_offline_data(pending_fix)
+                    pending_fix = None
+                endpoint = await uplink.wait_active()
+            websocket = endpoint.websocket
+            link_counter.attach(websocket)
+            # A fresh encoder per connection, so the server always starts from a keyframe
+            if websocket.subprotocol == SUBPROTOCOL_DELTA:
+                encode = DeltaEncoder(UPLINK_KEYFRAME_INTERVAL).encode
+            elif websocket.subprotocol == SUBPROTOCOL_BINARY:
+                encode = GpsFix.to_binary
+            else:
+                encode = GpsFix.to_json
+            logger.info(f"Sending to external WebSocket server: {endpoint.url} "
+                        f"({websocket.subprotocol or 'JSON'})")
+            if not external_ws_connected:
+                # Fixes queued while disconnected were already logged for offline replay
+                subscription.skip()
+                reporter.reset()
                 external_ws_connected = True
-                await send_offline_data(websocket)
-                
-                while True:
+            backlog_uploader = BacklogUploader(
+                offline_spool, websocket, BACKLOG_BATCH_RECORDS, BACKLOG_BATCH_BYTES, BACKLOG_BATCH_INTERVAL,
+                BACKLOG_WINDOW, BACKLOG_ACK_TIMEOUT, BACKLOG_REQUIRE_ACK, BACKLOG_PRIORITY, live_idle,
+                BACKLOG_SIMPLIFY_TOLERANCE, SIMPLIFY_MAX_INTERVAL,
+                # zstd batches only if the server echoed the compression header back
+                compressor=batch_compressor if websocket.response_headers.get(
+                    COMPRESSION_HEADER, '').startswith('zstd') else None)
+            backlog_task = asyncio.create_task(send_offline_data(endpoint, backlog_uploader))
+
+            try:
+                while uplink.active() is endpoint:
+                    if pending_fix is not None:
+                        fix, pending_fix = pending_fix, None
+                        dequeued = time.monotonic()
+                    else:
+                        if subscription.lag == 0:
+                            live_idle.set()
+                        fix = await subscription.get()
+                        dequeued = time.monotonic()
+                        live_idle.clear()
+                        if not fix.is_complete() or (UPLINK_ADAPTIVE_RATE and not reporter.should_report(fix)):
+                            continue
+                        if uplink.active() is not endpoint:
+                            # Failed over (or back) while waiting for the fix
+                            pending_fix = fix
+                            break
                     try:
-                        gps_text = gps_data_queue.get_nowait()
-                        parsed_data = await parse_gps_data(gps_text)
-                        if parsed_data and all(
-                            gps.get('latitude') is not None and
-                            gps.get('longitude') is not None and
-                            gps.get('altitude') is not None and
-                            gps.get('speed') is not None and
-                            gps.get('satellites') is not None
-                            for gps in parsed_data.get('gps_data', [])
-                        ):
-                            global latest_gps_data
-                            latest_gps_data = parsed_data
-                            try:
-                                await websocket.send(json.dumps(parsed_data))
-                                logger.info(f"Sent GPS data to external server: {parsed_data}")
-                            except Exception as e:
-                                logger.error(f"Failed to send to external server: {e}")
-                                log_offline_data(parsed_data)
-                                raise
-                        gps_data_queue.task_done()
-                    except Empty:
-                        await asyncio.sleep(0.1)
+                        message = encode(fix)
+                        serialized = time.monotonic()
+                        await websocket.send(message)
+                        sent = time.monotonic()
+                        uplink_send_latency.observe(sent - serialized)
+                        tracer.stage(fix, "uplink", dequeued=dequeued, serialized=serialized, sent=sent)
+                        logger.debug(f"Sent GPS data to external server: {fix.to_dict()}")
                     except Exception as e:
-                        logger.error(f"Error processing GPS data for external server: {e}")
-                        raise
+                        logger.error(f"Failed to send to external server {endpoint.url}: {e}")
+                        pending_fix = fix
+                        uplink.fail(endpoint)
+            finally:
+                backlog_task.cancel()
         except Exception as e:
-            logger.error(f"Failed to connect to external WebSocket server: {e}")
-            external_ws_connected = False
+            logger.error(f"Error in external WebSocket uplink: {e}")
             await asyncio.sleep(RECONNECT_DELAY)
 
 async def broadcast_gps_data():
     """Broadcast GPS data to local WebSocket clients."""
+    global latest_gps_data, latest_gps_fix
+    subscription = fix_broadcaster.subscribe("local_clients", SINK_QUEUE_POLICIES['local_clients'])
     while True:
         try:
-            gps_text = gps_data_queue.get_nowait()
-            parsed_data = await parse_gps_data(gps_text)
-            if parsed_data and all(
-                gps.get('latitude') is not None and
-                gps.get('longitude') is not None and
-                gps.get('altitude') is not None and
-                gps.get('speed') is not None and
-                gps.get('satellites') is not None
-                for gps in parsed_data.get('gps_data', [])
-            ):
-                global latest_gps_data
-                latest_gps_data = parsed_data
+            fix = await subscription.get()
+            dequeued = time.monotonic()
+            if fix.is_complete():
+                latest_gps_data = fix.to_dict()
                 
-                if connected_clients:
-                    tasks = []
-                    for client in connected_clients.copy():
-                        try:
-                            tasks.append(client.send(json.dumps(parsed_data)))
-                        except:
-                            connected_clients.discard(client)
-                    
-                    if tasks:
-                        await asyncio.gather(*tasks, return_exceptions=True)
-                        logger.info(f"Broadcasted GPS data to {len(tasks)} clients")
+                latest_gps_fix = fix
                 
-                elif not external_ws_connected:
-                    log_offline_data(parsed_data)
-                    
-            gps_data_queue.task_done()
+                if connected_clients:
+                    # Encoded once per fix and format (to_json()/to_binary() cache) and queued
+                    # per client: a slow client only delays itself, and its queue keeps the newest fixes
+                    for sender in list(connected_clients.values()):
+                        sender.offer(fix.to_binary() if sender.binary else fix.to_json(), fix)
+                    fanout_latency.observe(time.time() - fix.time)
+                    tracer.stage(fix, "local_clients", dequeued=dequeued, queued=time.monotonic())
+                    logger.debug(f"Broadcasted GPS data to {len(connected_clients)} clients")
             
-        except Empty:
-            await asyncio.sleep(0.1)
         except Exception as e:
             logger.error(f"Error broadcasting GPS data: {e}")
             await asyncio.sleep(1)
 
-def process_gps_data():
-    """Process GPS data from gpsd and put it into the queue."""
-    global current_output_file, app_start_time
+async def write_gps_data_file():
+    """Queue each fix's text for the session writer thread, which does the file I/O."""
+    subscription = fix_broadcaster.subscribe("file_writer", SINK_QUEUE_POLICIES['file_writer'])
+    while True:
+        fix = await subscription.get()
+        try:
+            dequeued = time.monotonic()
+            output_str = fix.to_text()
+            serialized = time.monotonic()
+            session_writer.write(output_str)
+            tracer.stage(fix, "file", dequeued=dequeued, serialized=serialized, buffered=time.monotonic())
+        except Exception as e:
+            logger.error(f"Failed to write to output file: {e}")
+
+async def write_track_store():
+    """Append each fix to the columnar track store behind /gps/history."""
+    subscription = fix_broadcaster.subscribe("track_store", SINK_QUEUE_POLICIES['track_store'])
+    writer = TrackStoreWriter(TRACK_STORE_DIR, flush_interval=TRACK_STORE_FLUSH_INTERVAL)
+    skipping = False
+    try:
+        while True:
+            fix = await subscription.get()
+            try:
+                if writer.append_fix(fix):
+                    skipping = False
+                elif not skipping:
+                    # Warn once per backward clock step, not once per fix until the clock catches up
+                    skipping = True
+                    logger.warning(f"Skipping track store rows older than {writer.last_time} "
+                                   f"({writer.out_of_order} skipped so far)")
+            except Exception as e:
+                logger.error(f"Failed to write to track store: {e}")
+    finally:
+        writer.close()
+
+async def log_offline_gps_data():
+    """Keep fixes in the offline JSON log while the external server is unreachable."""
+    subscription = fix_broadcaster.subscribe("offline_log", SINK_QUEUE_POLICIES['offline_log'])
+    while True:
+        fix = await subscription.get()
+        if not external_ws_connected:
+            log_offline_data(fix)
+
+def get_baud_rate(device):
+    """Return the baud rate of a receiver (the top receiver runs at 115200)."""
+    return 115200 if device == '/dev/ttyACM0' else 9600
+
+def prepare_gps_devices(devices):
+    """Set receiver baud rates and (re)start gpsd on the given devices."""
+    for device in devices:
+        baud_rate = str(get_baud_rate(device))
+        success, stdout, stderr = run_command(['sudo', 'stty', '-F', device, baud_rate])
+        if not success:
+            logger.warning(f"Failed to set baud rate {baud_rate} for {device}: {stderr}")
+    return ensure_gpsd_running(devices)
+
+async def process_gps_data():
+    """Read receiver reports, fuse them and publish each complete fix."""
+    global app_start_time, fusion, serial_reader
 
     # Log application start time
     app_start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     start_message = f"\n=== Application Started at: {app_start_time} ===\n"
     logger.info(start_message.strip())
-
-    # Create new output file with timestamp
-    current_output_file = get_output_filename()
-    os.makedirs(GPS_DATA_DIR, exist_ok=True)
-    with open(current_output_file, 'a') as f:
-        f.write(start_message)
+    session_writer.write(start_message)
 
     logger.info("Starting GPS data processing")
     SERIAL_DEVICES = detect_gps_devices()
@@ -462,156 +712,57 @@ def process_gps_data():
         logger.error("No GPS devices found, exiting")
         return
     
-    for device in SERIAL_DEVICES:
-        baud_rate = '115200' if device == '/dev/ttyACM0' else '9600'
-        success, stdout, stderr = run_command(['sudo', 'stty', '-F', device, baud_rate])
-        if not success:
-            logger.warning(f"Failed to set baud rate {baud_rate} for {device}: {stderr}")
-    
-    if not ensure_gpsd_running(SERIAL_DEVICES):
-        logger.error("Cannot proceed without gpsd running")
-        return
-    
-    device_data = {device: {
-        'latitude': None,
-        'longitude': None,
-        'altitude': None,
-        'speed': None,
-        'satellites': None,
-        'timestamp': None,
-        'heading': None,
-        'satellite_prns': []
-    } for device in SERIAL_DEVICES}
-    
-    last_data_time = {device: time.time() for device in SERIAL_DEVICES}
+    if GPS_READER_MODE == 'serial':
+        serial_reader = SerialGpsReader({device: get_baud_rate(device) for device in SERIAL_DEVICES}, RECONNECT_DELAY)
+        reports = serial_reader.reports()
+    else:
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, prepare_gps_devices, SERIAL_DEVICES):
+            logger.error("Cannot proceed without gpsd running")
+            return
+        reports = read_gpsd_reports(GPSD_HOST, GPSD_PORT, RECONNECT_DELAY, MAX_RECONNECT_DELAY, gpsd_stats)
     
-    while True:
+    fusion = GpsFusion(SERIAL_DEVICES, SHIP_ID, get_device_id(), DEBOUNCE_INTERVAL, DATA_TIMEOUT)
+    async for report in reports:
+        received = time.monotonic()
         try:
-            session = gps.gps(host=GPSD_HOST, port=GPSD_PORT, mode=gps.WATCH_ENABLE | gps.WATCH_JSON)
-            while True:
-                try:
-                    report = session.next()
-                    if not report:
-                        continue
-                    
-                    current_time = time.time()
-                    device = getattr(report, 'device', None)
-                    if device not in SERIAL_DEVICES:
-                        logger.debug(f"Ignoring report for unknown device: {device}")
-                        continue
-                    
-                    last_data_time[device] = current_time
-                    if current_time - min(last_data_time.values()) > DATA_TIMEOUT:
-                        logger.warning(f"No data received from some devices for {DATA_TIMEOUT} seconds")
-                    
-                    timestamp = datetime.now(pytz.UTC).strftime('%Y-%m-%d %H:%M:%S.%f')
-                    
-                    if report.get('class') == 'TPV':
-                        if current_time - last_tpv_time[device] < DEBOUNCE_INTERVAL:
-                            continue  # Debounce TPV reports only
-                        last_tpv_time[device] = current_time
-                        
-                        lat = getattr(report, 'lat', None)
-                        lon = getattr(report, 'lon', None)
-                        alt = getattr(report, 'alt', None)
-                        speed = getattr(report, 'speed', None)
-                        heading = getattr(report, 'track', None)
-                        
-                        if isinstance(speed, (int, float)):
-                            speed = round(speed * 3.6, 2)  # Convert m/s to km/h
-                        if isinstance(heading, (int, float)):
-                            heading = round(heading, 1)
-                            
-                        device_data[device].update({
-                            'timestamp': timestamp,
-                            'latitude': lat,
-                            'longitude': lon,
-                            'altitude': alt,
-                            'speed': speed,
-                            'heading': heading
-                        })
-                        
-                    elif report.get('class') == 'SKY':
-                        satellites = len([sat for sat in report.get('satellites', []) if sat.get('used', False)])
-                        prns = [str(sat.get('PRN', '')) for sat in report.get('satellites', []) if sat.get('used', False) and sat.get('PRN')]
-                        device_data[device].update({
-                            'satellites': satellites if satellites > 0 else None,
-                            'satellite_prns': prns
-                        })
-                        logger.info(f"Device {device} using {satellites} satellites with PRNs: {prns}")
-                    
-                    if all(
-                        device_data[dev].get('latitude') is not None and
-                        device_data[dev].get('longitude') is not None and
-                        device_data[dev].get('altitude') is not None and
-                        device_data[dev].get('speed') is not None and
-                        device_data[dev].get('satellites') is not None
-                        for dev in SERIAL_DEVICES
-                    ):
-                        output = [
-                            f"GPS Data (Real-Time): {timestamp}",
-                            f"Ship ID: {SHIP_ID}",
-                            f"Device ID: {get_device_id()}",
-                            f"Heading: {device_data[SERIAL_DEVICES[0]].get('heading', 'Unknown') if device_data[SERIAL_DEVICES[0]].get('heading') is not None else 'Unknown'}"
-                        ]
-                        
-                        for idx, dev in enumerate(sorted(SERIAL_DEVICES)):
-                            label = "Top GPS" if dev == '/dev/ttyACM0' else "Bottom GPS"
-                            data = device_data.get(dev, {})
-                            output.extend([
-                                f"{label} ({dev}):",
-                                f"  Latitude: {data.get('latitude', 'Unknown')}",
-                                f"  Longitude: {data.get('longitude', 'Unknown')}",
-                                f"  Altitude (m): {data.get('altitude', 'Unknown')}",
-                                f"  Speed (km/h): {data.get('speed', 'Unknown')}",
-                                f"  Satellites: {data.get('satellites', 'Unknown')}",
-                                f"  Satellite PRNs: {', '.join(data.get('satellite_prns', ['Unknown']))}"
-                            ])
-                        
-                        output_str = "\n".join(output) + "\n---------------------------\n"
-                        print(output_str)
-                        logger.info(output_str)
-                        
-                        try:
-                            with open(current_output_file, 'a') as f:
-                                f.write(output_str)
-                        except Exception as e:
-                            logger.error(f"Failed to write to output file: {e}")
-                        
-                        gps_data_queue.put(output_str)
-                        
-                except Exception as e:
-                    logger.error(f"Error processing report: {e}")
-                    break
-                    
-            session.close()
-            
+            fix = fusion.update(report)
+            report_latency.observe(time.monotonic() - received)
+            if fix is not None:
+                tracer.start(fix, received)
+                fix_broadcaster.publish(fix)
         except Exception as e:
-            logger.error(f"Failed to connect to gpsd: {e}")
-            time.sleep(RECONNECT_DELAY)
-
-async def run_gps_processing():
-    """Run GPS processing in an executor."""
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, process_gps_data)
+            logger.error(f"Error processing report: {e}")
 
 async def main():
     """Main application entry point."""
-    global app_start_time, current_output_file
+    global app_start_time, session_writer, offline_spool, tracer
     
     try:
         # Initialize
+        trace_logger = queued_file_logger("gps_trace", TRACE_LOG_FILE) if TRACE_SAMPLE_EVERY else None
+        tracer = LatencyTracer(TRACE_WINDOW, TRACE_SAMPLE_EVERY, trace_logger)
         app_start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        current_output_file = get_output_filename()
+        session_writer = SessionWriterThread(
+            SessionWriter(GPS_DATA_DIR, max_bytes=SESSION_MAX_BYTES, flush_bytes=SESSION_FLUSH_BYTES,
+                          flush_interval=SESSION_FLUSH_INTERVAL, fsync_policy=SESSION_FSYNC_POLICY,
+                          fsync_interval=SESSION_FSYNC_INTERVAL, compress=SESSION_COMPRESS),
+            SESSION_QUEUE_SIZE)
+        session_writer.start()
+        offline_spool = Spool(SPOOL_DIR, SPOOL_SEGMENT_BYTES, SPOOL_FSYNC_POLICY, SPOOL_FSYNC_INTERVAL)
+        migrate_offline_json()
         
         # Start servers
         await start_http_server()
         await start_websocket_server()
         
         # Start background tasks
-        asyncio.create_task(run_gps_processing())
+        asyncio.create_task(process_gps_data())
         asyncio.create_task(broadcast_gps_data())
         asyncio.create_task(send_to_external_websocket())
+        asyncio.create_task(write_gps_data_file())
+        asyncio.create_task(write_track_store())
+        asyncio.create_task(log_offline_gps_data())
         
         # Keep application running
         while True:
@@ -630,13 +781,19 @@ async def main():
         if http_runner:
             await http_runner.cleanup()
         
+        if uplink:
+            await uplink.close()
+        
+        if offline_spool:
+            offline_spool.close()
+        
         end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         logger.info(f"Application stopped at {end_time}")
         
-        if current_output_file:
+        if session_writer:
             try:
-                with open(current_output_file, 'a') as f:
-                    f.write(f"\n=== Application Ended at: {end_time} ===\n")
+                session_writer.write(f"\n=== Application Ended at: {end_time} ===\n")
+                session_writer.close()
             except Exception as e:
                 logger.error(f"Failed to write end time to output file: {e}")
 
@@ -0,0 +1,117 @@
+import math
+import struct
+from datetime import datetime, timezone
+
+# WebSocket subprotocols. Clients that offer none get JSON text frames.
+SUBPROTOCOL_JSON = 'gps.json.v1'
+SUBPROTOCOL_BINARY = 'gps.bin.v1'
+SUBPROTOCOL_DELTA = 'gps.delta.v1'  # Stateful, see gps_delta; uplink only
+SUBPROTOCOLS = [SUBPROTOCOL_BINARY, SUBPROTOCOL_JSON]
+
+SCHEMA_FIX_V1 = 1
+FLAG_TOP = 0x01
+FLAG_BOTTOM = 0x02
+FLAG_SEQ = 0x04  # A uint32 fix sequence number follows the header
+
+# schema id, flags, epoch seconds, heading (NaN if unknown)
+HEADER = struct.Struct('<BBdf')
+SEQ = struct.Struct('<I')
+# latitude and longitude in 1e-7 degrees, altitude (m), speed in 0.01 km/h, satellites used, PRN count
+RECEIVER = struct.Struct('<iifHBB')
+COORD_SCALE = 10 ** 7
+MISSING_COORD = -2 ** 31
+MISSING_SPEED = 0xFFFF
+MISSING_SATELLITES = 0xFF
+
+
+def _pack_string(value):
+    data = (value or '').encode()[:255]
+    return bytes((len(data),)) + data
+
+
+def _coord(value):
+    return MISSING_COORD if value is None else round(value * COORD_SCALE)
+
+
+def _encode_receiver(rx):
+    prns = rx.satellite_prns[:255]
+    return RECEIVER.pack(
+        _coord(rx.latitude),
+        _coord(rx.longitude),
+        math.nan if rx.altitude is None else rx.altitude,
+        MISSING_SPEED if rx.speed is None else min(round(rx.speed * 100), MISSING_SPEED - 1),
+        MISSING_SATELLITES if rx.satellites is None else min(rx.satellites, MISSING_SATELLITES - 1),
+        len(prns)
+    ) + struct.pack(f'<{len(prns)}H', *prns)
+
+
+def encode_fix(fix):
+    """Encode a GpsFix as a schema 1 binary frame (about a sixth of the JSON size).
+
+    Positions are carried to 1e-7 degrees (about 1 cm) and speed to 0.01 km/h,
+    the precision the fusion stage already rounds to.
+    """
+    flags = (FLAG_TOP if fix.top is not None else 0) | (FLAG_BOTTOM if fix.bottom is not None else 0)
+    if fix.seq is not None:
+        flags |= FLAG_SEQ
+    parts = [HEADER.pack(SCHEMA_FIX_V1, flags, fix.time, math.nan if fix.heading is None else fix.heading)]
+    if fix.seq is not None:
+        parts.append(SEQ.pack(fix.seq & 0xFFFFFFFF))
+    parts += [_pack_string(fix.ship_id), _pack_string(fix.device_id)]
+    for rx in (fix.top, fix.bottom):
+        if rx is not None:
+            parts.append(_encode_receiver(rx))
+    return b''.join(parts)
+
+
+def _unpack_string(data, offset):
+    length = data[offset]
+    return data[offset + 1:offset + 1 + length].decode(), offset + 1 + length
+
+
+def _decode_receiver(data, offset, name):
+    lat, lon, alt, speed, satellites, count = RECEIVER.unpack_from(data, offset)
+    offset += RECEIVER.size
+    prns = struct.unpack_from(f'<{count}H', data, offset)
+    offset += 2 * count
+    return {
+        "gps": name,
+        "latitude": None if lat == MISSING_COORD else round(lat / COORD_SCALE, 7),
+        "longitude": None if lon == MISSING_COORD else round(lon / COORD_SCALE, 7),
+        "altitude": None if alt != alt else round(alt, 3),
+        "speed": None if speed == MISSING_SPEED else speed / 100,
+        "satellites": None if satellites == MISSING_SATELLITES else satellites,
+        "satellite_prns": [str(prn) for prn in prns]
+    }, offset
+
+
+def decode_fix(data):
+    """Decode a binary frame into the same dict shape as GpsFix.to_dict()."""
+    schema, flags, when, heading = HEADER.unpack_from(data, 0)
+    if schema != SCHEMA_FIX_V1:
+        raise ValueError(f"Unknown GPS wire schema {schema}")
+    offset = HEADER.size
+    seq = None
+    if flags & FLAG_SEQ:
+        (seq,) = SEQ.unpack_from(data, offset)
+        offset += SEQ.size
+    ship_id, offset = _unpack_string(data, offset)
+    device_id, offset = _unpack_string(data, offset)
+    gps_data = []
+    for flag, name in ((FLAG_TOP, "top_gps"), (FLAG_BOTTOM, "bottom_gps")):
+        if flags & flag:
+            receiver, offset = _decode_receiver(data, offset, name)
+        else:
+            receiver = {"gps": name, "latitude": None, "longitude": None, "altitude": None,
+                        "speed": None, "satellites": None, "satellite_prns": []}
+        gps_data.append(receiver)
+    fix = {
+        "timestamp": datetime.fromtimestamp(when, timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f'),
+        "ship_id": ship_id,
+        "device_id": device_id,
+        "heading": None if heading != heading else round(heading, 1),
+        "gps_data": gps_data
+    }
+    if seq is not None:
+        fix["seq"] = seq
+    return fix
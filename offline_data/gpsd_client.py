@@ -0,0 +1,57 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+WATCH_COMMAND = b'?WATCH={"enable":true,"json":true};\n'
+READ_LIMIT = 1024 * 1024  # SKY reports with many satellites can exceed asyncio's 64 KiB default
+
+
+async def read_gpsd_reports(host, port, reconnect_delay=2, max_reconnect_delay=30, stats=None):
+    """Yield gpsd JSON reports as dicts, reconnecting with backoff when gpsd goes away.
+
+    Speaks the gpsd protocol directly over an asyncio stream, so no reader thread
+    or `gps` module is needed. If a stats dict is given, 'connects', 'invalid'
+    and 'parse_seconds' are accumulated in it.
+    """
+    if stats is None:
+        stats = {}
+    for key in ('connects', 'invalid', 'parse_seconds'):
+        stats.setdefault(key, 0)
+    delay = reconnect_delay
+    while True:
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(host, port, limit=READ_LIMIT)
+            writer.write(WATCH_COMMAND)
+            await writer.drain()
+            logger.info(f"Connected to gpsd at {host}:{port}")
+            stats['connects'] += 1
+            delay = reconnect_delay
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("gpsd closed the connection")
+                started = time.perf_counter()
+                try:
+                    report = json.loads(line)
+                except ValueError:
+                    stats['invalid'] += 1
+                    logger.warning(f"Invalid JSON from gpsd: {line[:200]!r}")
+                    continue
+                finally:
+                    stats['parse_seconds'] += time.perf_counter() - started
+                if isinstance(report, dict):
+                    yield report
+        except Exception as e:
+            logger.error(f"Failed to connect to gpsd: {e}")
+        finally:
+            if writer is not None:
+                writer.close()
+        jitter = random.uniform(0, 0.1 * delay)
+        logger.info(f"Reconnecting to gpsd in {delay + jitter:.2f} seconds")
+        await asyncio.sleep(delay + jitter)
+        delay = min(delay * 2, max_reconnect_delay)
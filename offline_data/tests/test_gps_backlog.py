@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from gps_backlog import BacklogUploader
+from gps_spool import Spool
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send(self, frame):
+        self.frames.append(json.loads(frame))
+
+
+def test_batches_are_capped_and_committed(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=1024, fsync_policy='never')
+    for i in range(25):
+        spool.append(json.dumps({"n": i}).encode())
+    websocket = RecordingWebSocket()
+    uploader = BacklogUploader(spool, websocket, batch_records=10, require_ack=False)
+    asyncio.run(uploader.run())
+    assert [frame['count'] for frame in websocket.frames] == [10, 10, 5]
+    assert [record['n'] for frame in websocket.frames for record in frame['records']] == list(range(25))
+    assert spool.pending_bytes == 0
+
+
+def test_acks_commit_in_order(tmp_path):
+    spool = Spool(str(tmp_path), fsync_policy='never')
+    ends = []
+    for i in range(4):
+        spool.append(json.dumps({"n": i}).encode())
+        ends.append(spool.end_offset)
+    websocket = RecordingWebSocket()
+    uploader = BacklogUploader(spool, websocket, batch_records=1, ack_timeout=5)
+
+    async def upload():
+        task = asyncio.ensure_future(uploader.run())
+        while len(websocket.frames) < 4:
+            await asyncio.sleep(0.01)
+        uploader.handle_ack(2)
+        assert spool.committed == 0  # Batch 1 is still unacknowledged
+        uploader.handle_ack(1)
+        assert spool.committed == ends[1]
+        uploader.handle_ack(3)
+        uploader.handle_ack(4)
+        await task
+
+    asyncio.run(upload())
+    assert spool.committed == ends[3]
+
+
+def test_notify_uploads_records_spooled_later(tmp_path):
+    spool = Spool(str(tmp_path), fsync_policy='never')
+    spool.append(b'{"n": 0}')
+    websocket = RecordingWebSocket()
+    uploader = BacklogUploader(spool, websocket, require_ack=False)
+
+    async def upload():
+        task = asyncio.ensure_future(uploader.serve())
+        while not websocket.frames:
+            await asyncio.sleep(0.01)
+        spool.append(b'{"n": 1}')
+        uploader.notify()
+        while len(websocket.frames) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(upload(), 5))
+    assert [frame['records'] for frame in websocket.frames] == [[{"n": 0}], [{"n": 1}]]
+    assert spool.pending_bytes == 0
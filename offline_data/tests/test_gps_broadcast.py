@@ -0,0 +1,61 @@
+import asyncio
+from queue import Empty
+
+import pytest
+
+from gps_broadcast import FixBroadcaster
+
+
+def test_every_sink_sees_every_fix():
+    broadcaster = FixBroadcaster(4)
+    first = broadcaster.subscribe("first")
+    second = broadcaster.subscribe("second")
+    for fix in range(3):
+        broadcaster.publish(fix)
+    assert [first.get_nowait() for _ in range(3)] == [0, 1, 2]
+    assert [second.get_nowait() for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(Empty):
+        first.get_nowait()
+
+
+def test_drop_oldest_and_conflate_latest():
+    broadcaster = FixBroadcaster(4)
+    dropping = broadcaster.subscribe("dropping", 'drop-oldest')
+    conflating = broadcaster.subscribe("conflating", 'conflate-latest')
+    for fix in range(10):
+        broadcaster.publish(fix)
+    assert [dropping.get_nowait() for _ in range(4)] == [6, 7, 8, 9]
+    assert dropping.dropped == 6
+    assert conflating.get_nowait() == 9
+    assert conflating.conflated == 9
+
+
+def test_only_kept_spills_are_counted():
+    spilled = []
+
+    def spill(fix):
+        if fix % 2:
+            return False  # e.g. an incomplete fix the spool does not take
+        spilled.append(fix)
+        return True
+
+    broadcaster = FixBroadcaster(4)
+    sub = broadcaster.subscribe("uplink", 'spill', spill)
+    for fix in range(10):
+        broadcaster.publish(fix)
+    assert spilled == [0, 2, 4]
+    assert (sub.spilled, sub.dropped) == (3, 0)
+    assert [sub.get_nowait() for _ in range(4)] == [6, 7, 8, 9]
+
+
+def test_get_waits_for_publish():
+    async def wait_for_fix():
+        broadcaster = FixBroadcaster(4)
+        sub = broadcaster.subscribe("sink")
+        waiting = asyncio.ensure_future(sub.get())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        broadcaster.publish("fix")
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(wait_for_fix()) == "fix"
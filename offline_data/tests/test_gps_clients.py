@@ -0,0 +1,88 @@
+import asyncio
+
+import gps_clients
+from gps_clients import ClientSender
+
+
+class FakeTransport:
+    def __init__(self):
+        self.buffered = 0
+        self.aborted = False
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+    def abort(self):
+        self.aborted = True
+
+
+class StalledWebSocket:
+    """A client whose first send waits for a drain that never comes, like a peer that stopped reading."""
+
+    remote_address = ('client', 1)
+
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+        await asyncio.Event().wait()
+
+
+def stats():
+    return {'sent': 0, 'conflated': 0, 'evicted': 0, 'send_errors': 0}
+
+
+def test_default_high_water_mark_is_at_most_the_write_limit():
+    # The legacy websockets default write limit is 64 KiB; a send waits once the buffer passes it
+    async def run():
+        sender = ClientSender(StalledWebSocket(), stats())
+        sender.close()
+        return sender.high_water_bytes
+    assert asyncio.run(run()) <= 64 * 1024
+
+
+def test_client_with_a_full_socket_buffer_is_evicted(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(gps_clients.time, 'monotonic', lambda: clock[0])
+
+    async def run():
+        websocket = StalledWebSocket()
+        client_stats = stats()
+        sender = ClientSender(websocket, client_stats, queue_size=4, high_water_bytes=1000, evict_after=10)
+        sender.offer("a")
+        await asyncio.sleep(0)
+        assert websocket.sent == ["a"] and not sender.queue
+        # The queue has room, so only the socket buffer marks the client as congested
+        websocket.transport.buffered = 1001
+        sender.offer("b")
+        assert sender.congested_since == 100.0
+        clock[0] = 105.0
+        sender.offer("c")
+        assert not sender.evicted
+        clock[0] = 111.0
+        sender.offer("d")
+        assert sender.evicted and websocket.transport.aborted and client_stats['evicted'] == 1
+        await asyncio.sleep(0)
+        assert sender.task.done()
+
+    asyncio.run(run())
+
+
+def test_draining_buffer_clears_congestion(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(gps_clients.time, 'monotonic', lambda: clock[0])
+
+    async def run():
+        websocket = StalledWebSocket()
+        sender = ClientSender(websocket, stats(), queue_size=4, high_water_bytes=1000, evict_after=10)
+        websocket.transport.buffered = 5000
+        sender.offer("a")
+        assert sender.congested_since == 100.0
+        websocket.transport.buffered = 0
+        sender.offer("b")
+        assert sender.congested_since is None
+        sender.close()
+
+    asyncio.run(run())
@@ -0,0 +1,96 @@
+import gzip
+import json
+import zlib
+from types import SimpleNamespace
+
+from gps_compress import LinkCounter, session_records
+from gps_fix import GpsFix, ReceiverFix
+
+
+class Frame(SimpleNamespace):
+    pass
+
+
+class Deflate:
+    """Stand-in for permessage-deflate: compresses data frames."""
+
+    def encode(self, frame):
+        return Frame(opcode=frame.opcode, data=zlib.compress(frame.data))
+
+
+def send(websocket, data, opcode=1):
+    frame = Frame(opcode=opcode, data=data)
+    for extension in websocket.extensions:
+        frame = extension.encode(frame)
+    return frame
+
+
+def test_link_counter_sees_bytes_before_and_after_compression():
+    counter = LinkCounter()
+    websocket = SimpleNamespace(extensions=[Deflate()])
+    counter.attach(websocket)
+    counter.attach(websocket)  # Reattaching the same connection adds nothing
+    assert len(websocket.extensions) == 3
+    message = b'{"latitude":35.1,"longitude":129.04}' * 20
+    wire = send(websocket, message)
+    send(websocket, b'ping', opcode=9)
+    stats = counter.stats()
+    assert (stats['frames'], stats['bytes_in'], stats['bytes_out']) == (1, len(message), len(wire.data))
+    assert stats['ratio'] > 1
+
+
+def test_link_counter_without_compression():
+    counter = LinkCounter()
+    websocket = SimpleNamespace(extensions=[])
+    counter.attach(websocket)
+    send(websocket, b'x' * 100)
+    assert counter.stats()['bytes_in'] == counter.stats()['bytes_out'] == 100
+    assert counter.ratio == 1.0
+
+
+NAVBOX_BLOCK = """GPS Data (Real-Time): 2024-05-01 03:00:0{second}.250000
+Device ID: dev-42
+SHIP_ID: SHIP456
+Heading: 84.4
+Top GPS (/dev/ttyACM0):
+  Latitude: 35.1
+  Longitude: 129.04
+  Altitude (m): 12.5
+  Speed (km/h): 18.5
+  Satellites: 9
+  Satellite PRNs: 5, 7, 13
+Bottom GPS (/dev/ttyACM1):
+  Latitude: -1.0
+  Longitude: 129.0401
+  Altitude (m): None
+  Speed (km/h): 18.4
+  Satellites: 8
+  Satellite PRNs: 5, 7
+""" + "-" * 102 + "\n"
+
+
+def test_session_records_from_a_navbox_session_file(tmp_path):
+    path = tmp_path / 'gps_data_2024-05-01_03-00-00.txt'
+    path.write_text(''.join(NAVBOX_BLOCK.format(second=second) for second in range(3)))
+    records = [json.loads(record) for record in session_records(str(path))]
+    assert len(records) == 3
+    record = records[1]
+    assert record["timestamp"] == "2024-05-01 03:00:01.250000"
+    assert (record["ship_id"], record["device_id"], record["heading"]) == ("SHIP456", "dev-42", 84.4)
+    top, bottom = record["gps_data"]
+    assert top == {"gps": "top_gps", "latitude": 35.1, "longitude": 129.04, "altitude": 12.5, "speed": 18.5,
+                   "satellites": 9, "satellite_prns": ["5", "7", "13"]}
+    assert (bottom["latitude"], bottom["altitude"], bottom["satellite_prns"]) == (-1.0, None, ["5", "7"])
+
+
+def test_session_records_from_a_compressed_v3_session_file(tmp_path):
+    top = ReceiverFix('/dev/ttyACM0', 35.1, 129.04, 12.5, 18.5, 9, (5, 7))
+    fixes = [GpsFix(1714532400.0 + i, 'SHIP456', 'dev-42', None, top=top, seq=i) for i in range(3)]
+    path = tmp_path / 'gps_data_2024-05-01_03-00-00.txt.gz'
+    with gzip.open(path, 'wt') as f:
+        f.write(''.join(fix.to_text() for fix in fixes))
+    records = [json.loads(record) for record in session_records(str(path))]
+    expected = [dict(fix.to_dict()) for fix in fixes]
+    for fix in expected:
+        del fix["seq"]  # Not part of the session text
+    assert records == expected
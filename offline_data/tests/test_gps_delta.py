@@ -0,0 +1,79 @@
+import pytest
+
+from gps_delta import SCHEMA_DELTA, SCHEMA_KEYFRAME, DeltaDecoder, DeltaEncoder
+from gps_fix import GpsFix, ReceiverFix
+
+
+def track(count, start=1700000000.0):
+    fixes = []
+    for i in range(count):
+        top = ReceiverFix('/dev/ttyACM0', 35.1 + i * 1e-5, 129.04 - i * 2e-5, 12.5 + i * 0.01, 18.5,
+                          9, (5, 7, 13) if i < 4 else (5, 7, 13, 21))
+        bottom = ReceiverFix('/dev/ttyACM1', 35.1 + i * 1e-5, 129.04 - i * 2e-5, 11.0, None, 8, (5, 7))
+        fixes.append(GpsFix(start + i * 0.5, 'SHIP-1', 'dev-42', (84.4 + i) % 360, top=top, bottom=bottom,
+                            seq=100 + i * (1 if i < 7 else 3)))
+    return fixes
+
+
+def assert_same(decoded, fix):
+    expected = fix.to_dict()
+    assert decoded['timestamp'] == expected['timestamp']
+    assert (decoded['ship_id'], decoded['device_id']) == (expected['ship_id'], expected['device_id'])
+    assert decoded['heading'] == pytest.approx(expected['heading'])
+    assert decoded.get('seq') == expected.get('seq')
+    for got, want in zip(decoded['gps_data'], expected['gps_data']):
+        assert got == pytest.approx(want)
+
+
+def test_round_trip_with_keyframes():
+    encoder = DeltaEncoder(keyframe_interval=5)
+    decoder = DeltaDecoder()
+    schemas = []
+    for fix in track(12):
+        frame = encoder.encode(fix)
+        schemas.append(frame[0])
+        assert_same(decoder.decode(frame), fix)
+    assert schemas == [SCHEMA_KEYFRAME] + [SCHEMA_DELTA] * 4 + [SCHEMA_KEYFRAME] + [SCHEMA_DELTA] * 4 + \
+        [SCHEMA_KEYFRAME, SCHEMA_DELTA]
+    assert (encoder.keyframes, encoder.deltas) == (3, 9)
+
+
+def test_deltas_are_small():
+    encoder = DeltaEncoder()
+    frames = [encoder.encode(fix) for fix in track(3)]
+    assert len(frames[1]) < len(frames[0]) / 2
+
+
+def test_receiver_change_forces_a_keyframe():
+    encoder = DeltaEncoder()
+    decoder = DeltaDecoder()
+    fixes = track(3)
+    fixes[1].bottom = None
+    frames = [encoder.encode(fix) for fix in fixes]
+    assert [frame[0] for frame in frames] == [SCHEMA_KEYFRAME] * 3
+    decoded = decoder.decode(frames[1])
+    assert decoded['gps_data'][1]['latitude'] is None
+    assert_same(decoded, fixes[1])
+
+
+def test_gap_waits_for_the_next_keyframe():
+    encoder = DeltaEncoder(keyframe_interval=4)
+    decoder = DeltaDecoder()
+    fixes = track(6)
+    frames = [encoder.encode(fix) for fix in fixes]
+    decoder.decode(frames[0])
+    with pytest.raises(ValueError):
+        decoder.decode(frames[2])  # frames[1] was lost
+    with pytest.raises(ValueError):
+        decoder.decode(frames[3])
+    assert_same(decoder.decode(frames[4]), fixes[4])
+    assert_same(decoder.decode(frames[5]), fixes[5])
+
+
+def test_fixes_without_a_sequence_number():
+    encoder = DeltaEncoder()
+    decoder = DeltaDecoder()
+    fixes = track(4)
+    fixes[2].seq = None
+    for fix in fixes:
+        assert_same(decoder.decode(encoder.encode(fix)), fix)
@@ -0,0 +1,107 @@
+import gzip
+import math
+import sys
+
+import pytest
+
+import gps_import
+from gps_fix import GpsFix, ReceiverFix
+from gps_import import TEXT_COLUMNS, import_files, parse_range, split_file
+from gps_track_store import MISSING_INT, TrackStore, new_columns
+
+START = 1714532400.0  # 2024-05-01 03:00:00 UTC
+
+NAVBOX_BLOCK = """GPS Data (Real-Time): 2024-05-01 03:00:0{second}.000000
+Device ID: dev-42
+SHIP_ID: SHIP456
+Heading: Unknown
+Top GPS (/dev/ttyACM0):
+  Latitude: 35.1
+  Longitude: 129.04
+  Altitude (m): 12.5
+  Speed (km/h): 18.5
+  Satellites: 9
+  Satellite PRNs: 5, 7, 13
+Bottom GPS (/dev/ttyACM1):
+  Latitude: None
+  Longitude: None
+  Altitude (m): None
+  Speed (km/h): None
+  Satellites: None
+  Satellite PRNs:
+""" + "-" * 102 + "\n"
+
+
+def v3_text(times):
+    top = ReceiverFix('/dev/ttyACM0', 35.1, 129.04, 12.5, 18.5, 9, (5, 7))
+    bottom = ReceiverFix('/dev/ttyACM1', 35.1001, 129.0401, 12.0, 18.4, 8, (5,))
+    return ''.join(GpsFix(when, 'SHIP456', 'dev-42', 84.4, top=top, bottom=bottom).to_text() for when in times)
+
+
+def stored_times(directory):
+    store = TrackStore(directory)
+    try:
+        return list(store.query(-math.inf, math.inf)['time'])
+    finally:
+        store.close()
+
+
+def test_v3_session_file(tmp_path):
+    path = tmp_path / 'gps_data_2024-05-01_03-00-00.txt'
+    path.write_text(v3_text([START, START + 1.5]))
+    columns = parse_range(str(path), 0, None)
+    assert list(columns['time']) == [START, START + 1.5]
+    assert list(columns['top_latitude']) == [35.1, 35.1]
+    assert list(columns['bottom_satellites']) == [8, 8]
+    assert list(columns['heading']) == pytest.approx([84.4, 84.4])  # Stored as float32
+
+
+def test_navbox_session_file(tmp_path):
+    path = tmp_path / 'gps_data_2024-05-01_03-00-00.txt'
+    path.write_text(''.join(NAVBOX_BLOCK.format(second=second) for second in range(3)))
+    columns = {name: [] for name in (*new_columns(), *TEXT_COLUMNS)}
+    parse_range(str(path), 0, None, columns)
+    assert columns['time'] == [START, START + 1, START + 2]
+    assert columns['top_speed'] == [18.5] * 3
+    assert columns['top_satellite_prns'] == ['5, 7, 13'] * 3
+    assert columns['ship_id'] == ['SHIP456'] * 3 and columns['device_id'] == ['dev-42'] * 3
+    assert all(math.isnan(value) for value in columns['bottom_latitude'] + columns['heading'])
+    assert columns['bottom_satellites'] == [MISSING_INT] * 3
+
+
+def test_byte_ranges_parse_every_block_once(tmp_path):
+    path = tmp_path / 'gps_data_2024-05-01_03-00-00.txt'
+    times = [START + second for second in range(50)]
+    path.write_text(v3_text(times))
+    ranges = split_file(str(path), split_bytes=700)
+    assert len(ranges) > 5
+    parsed = []
+    for _, start, end in ranges:
+        parsed.extend(parse_range(str(path), start, end)['time'])
+    assert parsed == times
+
+
+def test_gzip_segments_are_imported(tmp_path):
+    first = tmp_path / 'gps_data_2024-05-01_03-00-00.txt.gz'
+    second = tmp_path / 'gps_data_2024-05-01_03-00-10.txt'
+    with gzip.open(first, 'wt') as f:
+        f.write(v3_text([START + second for second in range(10)]))
+    second.write_text(v3_text([START + second for second in range(10, 15)]))
+    assert split_file(str(first)) == [(str(first), 0, None)]
+    store = str(tmp_path / 'store')
+    assert import_files([str(first), str(second)], store, workers=1) == 15
+    assert stored_times(store) == [START + second for second in range(15)]
+
+
+def test_older_file_exits_non_zero(tmp_path, monkeypatch):
+    older = tmp_path / 'gps_data_2024-05-01_03-00-00.txt'
+    newer = tmp_path / 'gps_data_2024-05-01_04-00-00.txt'
+    older.write_text(v3_text([START]))
+    newer.write_text(v3_text([START + 3600]))
+    store = str(tmp_path / 'store')
+    import_files([str(newer)], store, workers=1)
+    monkeypatch.setattr(sys, 'argv', ['gps_import.py', store, str(older), '--workers', '1'])
+    with pytest.raises(SystemExit) as exit_info:
+        gps_import.main()
+    assert exit_info.value.code == 1
+    assert stored_times(store) == [START + 3600]
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import pty
+import struct
+
+import pytest
+
+from gps_serial import NmeaFramer, NmeaReportBuilder, SerialGpsReader
+
+
+def nmea(body):
+    checksum = 0
+    for byte in body.encode():
+        checksum ^= byte
+    return f"${body}*{checksum:02X}\r\n".encode()
+
+
+def ubx(msg_class, msg_id, payload):
+    body = bytes((msg_class, msg_id)) + struct.pack('<H', len(payload)) + payload
+    ck_a = ck_b = 0
+    for byte in body:
+        ck_a = (ck_a + byte) & 0xff
+        ck_b = (ck_b + ck_a) & 0xff
+    return b'\xb5\x62' + body + bytes((ck_a, ck_b))
+
+
+def nav_pvt(lat, lon, height_mm, speed_mm_s, heading):
+    payload = bytearray(92)
+    struct.pack_into('<BBBBiiii', payload, 20, 3, 0x01, 0, 12, round(lon * 1e7), round(lat * 1e7), 0, height_mm)
+    struct.pack_into('<ii', payload, 60, speed_mm_s, round(heading * 1e5))
+    return bytes(payload)
+
+
+STREAM = b''.join([
+    nmea("GPRMC,123519,A,3506.000,N,12902.400,E,10.0,84.4,230394,003.1,W"),
+    nmea("GPGGA,123519,3506.000,N,12902.400,E,1,08,0.9,12.5,M,46.9,M,,"),
+    nmea("GPGSV,1,1,02,05,45,120,40,07,30,200,35"),
+    nmea("GPGSA,A,3,05,07,,,,,,,,,,,1.5,0.9,1.2"),
+    nmea("GPVTG,90.0,T,,M,5.0,N,9.0,K"),
+    ubx(0x01, 0x07, nav_pvt(35.2, 129.1, 15000, 2500, 45.0)),
+])
+
+
+def build_reports(device, data, chunk=7):
+    framer = NmeaFramer()
+    builder = NmeaReportBuilder(device)
+    reports = []
+    # Small chunks split sentences and UBX frames across reads, as a serial port does
+    for start in range(0, len(data), chunk):
+        for frame in framer.feed(data[start:start + chunk]):
+            reports.extend(builder.handle_frame(frame))
+    return framer, reports
+
+
+def check_reports(reports, device):
+    gga, sky, pvt = reports
+    assert gga['class'] == 'TPV' and gga['device'] == device and gga['mode'] == 3
+    assert gga['lat'] == pytest.approx(35.1)
+    assert gga['lon'] == pytest.approx(129.04)
+    assert gga['alt'] == 12.5
+    assert gga['speed'] == pytest.approx(10.0 * 0.514444)
+    assert gga['track'] == 84.4
+    assert sky['class'] == 'SKY'
+    assert sorted(sat['PRN'] for sat in sky['satellites'] if sat['used']) == [5, 7]
+    assert pvt['class'] == 'TPV' and pvt['mode'] == 3
+    assert pvt['lat'] == pytest.approx(35.2)
+    assert pvt['lon'] == pytest.approx(129.1)
+    assert pvt['alt'] == 15.0
+    assert pvt['speed'] == 2.5
+    assert pvt['track'] == pytest.approx(45.0)
+
+
+def test_builder_reports_from_nmea_and_ubx():
+    framer, reports = build_reports('/dev/ttyACM0', STREAM)
+    check_reports(reports, '/dev/ttyACM0')
+    assert framer.bad_checksums == 0
+
+
+def test_bad_checksums_and_noise_are_skipped():
+    corrupted = nmea("GPGGA,123519,3506.000,N,12902.400,E,1,08,0.9,12.5,M,46.9,M,,").replace(b'*', b'0*')
+    framer, reports = build_reports('/dev/ttyACM0', b'\x00\xffjunk' + corrupted + STREAM)
+    assert framer.bad_checksums == 1
+    check_reports(reports, '/dev/ttyACM0')
+
+
+def test_framer_recovers_when_the_caller_raises():
+    framer = NmeaFramer()
+    sentence = nmea("GPGGA,1")
+    with pytest.raises(RuntimeError):
+        for frame in framer.feed(sentence + sentence):
+            raise RuntimeError("parser failed")
+    assert [bytes(frame[1]) for frame in framer.feed(sentence)] == [sentence.rstrip()] * 2
+
+
+def test_serial_reader_reads_a_pty_pair():
+    master, slave = pty.openpty()
+    device = os.ttyname(slave)
+
+    async def read_three():
+        reader = SerialGpsReader({device: 9600})
+        reports = reader.reports()
+        received = []
+        try:
+            first = asyncio.ensure_future(reports.__anext__())
+            await asyncio.sleep(0.1)  # Let the reader open the pty before anything is written
+            os.write(master, STREAM)
+            received.append(await asyncio.wait_for(first, 5))
+            while len(received) < 3:
+                received.append(await asyncio.wait_for(reports.__anext__(), 5))
+        finally:
+            await reports.aclose()
+        return received
+
+    try:
+        check_reports(asyncio.run(read_three()), device)
+    finally:
+        os.close(master)
+        os.close(slave)
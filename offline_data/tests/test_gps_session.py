@@ -0,0 +1,64 @@
+import gzip
+import os
+
+from gps_session import SessionWriter, SessionWriterThread, open_session, session_files
+
+
+def read_all(directory):
+    text = ''
+    for path in session_files(directory):
+        with open_session(path) as f:
+            text += f.read()
+    return text
+
+
+def test_segments_rotate_and_compress(tmp_path):
+    directory = str(tmp_path)
+    writer = SessionWriter(directory, max_bytes=100, rotate_hourly=False, flush_bytes=1)
+    lines = [f"fix {i:03d} " + "x" * 40 + "\n" for i in range(10)]
+    for line in lines:
+        writer.write(line)
+    writer.close()
+    paths = session_files(directory)
+    assert len(paths) > 1
+    assert all(path.endswith('.txt.gz') for path in paths)
+    assert read_all(directory) == ''.join(lines)
+    assert writer.stats()['rotations'] == len(paths) - 1
+
+
+def test_other_session_files_are_left_alone(tmp_path):
+    directory = str(tmp_path)
+    # e.g. a file another process still has open, or an old log
+    other = os.path.join(directory, 'gps_data_2020-01-01_00-00-00.txt')
+    with open(other, 'w') as f:
+        f.write("old session\n")
+    writer = SessionWriter(directory)
+    writer.write("new session\n")
+    writer.close()
+    assert os.path.exists(other)
+    assert not os.path.exists(other + '.gz')
+    ours = [path for path in session_files(directory) if path != other]
+    with gzip.open(ours[0], 'rt') as f:
+        assert f.read() == "new session\n"
+
+
+def test_writer_thread_writes_everything_on_close(tmp_path):
+    directory = str(tmp_path)
+    thread = SessionWriterThread(SessionWriter(directory, compress=False, flush_interval=60))
+    thread.start()
+    for i in range(100):
+        thread.write(f"fix {i}\n")
+    thread.close()
+    assert not thread.is_alive()
+    assert read_all(directory) == ''.join(f"fix {i}\n" for i in range(100))
+    assert thread.stats()['dropped'] == 0
+
+
+def test_writer_thread_drops_when_the_queue_is_full(tmp_path):
+    thread = SessionWriterThread(SessionWriter(str(tmp_path), compress=False), queue_size=2)
+    for i in range(5):
+        thread.write(f"fix {i}\n")  # Not started, so nothing drains the queue
+    assert thread.dropped == 3
+    thread.start()
+    thread.close()
+    assert read_all(str(tmp_path)) == "fix 0\nfix 1\n"
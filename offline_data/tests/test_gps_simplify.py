@@ -0,0 +1,87 @@
+import json
+import math
+
+from gps_simplify import METRES_PER_DEGREE, TrackSimplifier, simplify_columns, simplify_records
+
+LAT = 35.1
+LON = 129.04
+METRES_PER_DEGREE_LON = METRES_PER_DEGREE * math.cos(math.radians(LAT))
+
+
+def simplify(points, tolerance, **kwargs):
+    simplifier = TrackSimplifier(tolerance, **kwargs)
+    kept = []
+    for i, (when, lat, lon) in enumerate(points):
+        kept.extend(simplifier.push(when, lat, lon, i))
+    kept.extend(simplifier.flush())
+    return kept, simplifier
+
+
+def east(metres, north=0.0):
+    """Point metres east and north of the origin."""
+    return LAT + north / METRES_PER_DEGREE, LON + metres / METRES_PER_DEGREE_LON
+
+
+def test_straight_line_keeps_only_the_ends():
+    points = [(i, *east(i * 5)) for i in range(20)]
+    kept, simplifier = simplify(points, tolerance=1)
+    assert kept == [0, 19]
+    assert (simplifier.kept, simplifier.dropped) == (2, 18)
+
+
+def test_deviation_within_tolerance_is_dropped_and_beyond_is_kept():
+    wobble = [(i, *east(i * 10, 2 if i % 2 else 0)) for i in range(11)]
+    assert simplify(wobble, tolerance=3)[0] == [0, 10]
+    kept = simplify(wobble, tolerance=1)[0]
+    assert len(kept) > 2
+    assert kept[0] == 0 and kept[-1] == 10
+
+
+def test_kept_track_stays_within_tolerance():
+    points = [(i, *east(i * 10, 30 * math.sin(i / 5))) for i in range(100)]
+    tolerance = 2
+    kept, _ = simplify(points, tolerance)
+    for start, end in zip(kept, kept[1:]):
+        _, lat0, lon0 = points[start]
+        _, lat1, lon1 = points[end]
+        bx = (lon1 - lon0) * METRES_PER_DEGREE_LON
+        by = (lat1 - lat0) * METRES_PER_DEGREE
+        for _, lat, lon in points[start + 1:end]:
+            px = (lon - lon0) * METRES_PER_DEGREE_LON
+            py = (lat - lat0) * METRES_PER_DEGREE
+            assert abs(px * by - py * bx) / math.hypot(bx, by) <= tolerance + 1e-6
+
+
+def test_max_interval_and_window_bound_the_gaps():
+    points = [(i, *east(i * 5)) for i in range(50)]
+    kept, _ = simplify(points, tolerance=1, max_interval=10)
+    assert all(b - a <= 10 for a, b in zip(kept, kept[1:]))
+    kept, _ = simplify(points, tolerance=1, max_window=4)
+    assert all(b - a <= 5 for a, b in zip(kept, kept[1:]))
+
+
+def record(second, lat, lon):
+    return json.dumps({
+        "timestamp": f"2024-01-01 00:00:{second:02d}.000000",
+        "gps_data": [{"gps": "top_gps", "latitude": lat, "longitude": lon}]
+    })
+
+
+def test_records_without_a_position_split_the_track():
+    records = [(i, record(i, *east(i * 5))) for i in range(5)]
+    records.append((5, record(5, None, None)))
+    records += [(i, record(i, *east(i * 5))) for i in range(6, 10)]
+    assert list(simplify_records(TrackSimplifier(1), records)) == [0, 4, 5, 6, 9]
+
+
+def test_simplify_columns_falls_back_to_the_bottom_receiver():
+    nan = math.nan
+    line = [east(i * 5) for i in range(6)]
+    columns = {
+        'time': list(range(6)),
+        'top_latitude': [lat for lat, _ in line[:3]] + [nan] * 3,
+        'top_longitude': [lon for _, lon in line[:3]] + [nan] * 3,
+        'bottom_latitude': [lat for lat, _ in line],
+        'bottom_longitude': [lon for _, lon in line],
+    }
+    assert simplify_columns(columns, tolerance=1)['time'] == [0, 5]
@@ -0,0 +1,78 @@
+import os
+
+from gps_spool import CHECKPOINT_FILE, Spool
+
+
+def payloads(spool, offset=0):
+    return [payload for _, _, payload in spool.read_from(offset)]
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.seg'))
+
+
+def test_records_survive_reopen(tmp_path):
+    spool = Spool(str(tmp_path), fsync_policy='never')
+    offsets = [spool.append(f"fix {i}".encode()) for i in range(5)]
+    spool.close()
+    spool = Spool(str(tmp_path), fsync_policy='never')
+    assert payloads(spool) == [f"fix {i}".encode() for i in range(5)]
+    assert [offset for offset, _, _ in spool.read_from(0)] == offsets
+    assert payloads(spool, offsets[3]) == [b"fix 3", b"fix 4"]
+
+
+def test_torn_record_is_truncated_on_open(tmp_path):
+    spool = Spool(str(tmp_path), fsync_policy='never')
+    spool.append(b"first")
+    second = spool.append(b"second")
+    valid_end = spool.end_offset
+    spool.close()
+    # A crash part way through the next record leaves a header without its payload
+    path = os.path.join(str(tmp_path), segments(str(tmp_path))[-1])
+    with open(path, 'ab') as f:
+        f.write(b'\x10\x00\x00\x00\xde\xad\xbe\xefpart')
+    spool = Spool(str(tmp_path), fsync_policy='never')
+    assert spool.end_offset == valid_end
+    assert os.path.getsize(path) == valid_end
+    assert payloads(spool) == [b"first", b"second"]
+    spool.append(b"third")
+    assert payloads(spool, second) == [b"second", b"third"]
+    spool.close()
+
+
+def test_corrupt_record_is_truncated_on_open(tmp_path):
+    spool = Spool(str(tmp_path), fsync_policy='never')
+    spool.append(b"good")
+    bad = spool.append(b"flipped")
+    spool.close()
+    path = os.path.join(str(tmp_path), segments(str(tmp_path))[-1])
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b'X')
+    spool = Spool(str(tmp_path), fsync_policy='never')
+    assert spool.end_offset == bad
+    assert payloads(spool) == [b"good"]
+
+
+def test_commit_checkpoint_and_segment_cleanup(tmp_path):
+    directory = str(tmp_path)
+    spool = Spool(directory, segment_bytes=64, fsync_policy='never')
+    # Each 48-byte record fills a segment of its own
+    starts = [spool.append(bytes(40)) for _ in range(4)]
+    ends = starts[1:] + [spool.end_offset]
+    assert len(segments(directory)) == 4
+    spool.commit(ends[1])
+    assert spool.pending_bytes == spool.end_offset - ends[1]
+    assert len(segments(directory)) == 2
+    with open(os.path.join(directory, CHECKPOINT_FILE)) as f:
+        assert int(f.read()) == ends[1]
+    spool.commit(ends[0])  # Older offsets never move the checkpoint back
+    assert spool.committed == ends[1]
+    spool.close()
+
+    spool = Spool(directory, segment_bytes=64, fsync_policy='never')
+    assert spool.committed == ends[1]
+    assert payloads(spool, spool.committed) == [bytes(40)] * 2
+    spool.commit(spool.end_offset)
+    assert segments(directory) == []
+    assert spool.pending_bytes == 0
@@ -0,0 +1,76 @@
+import math
+from array import array
+
+import pytest
+
+from gps_track_store import COLUMNS, TrackStore, TrackStoreWriter, new_columns
+
+
+def batch(times):
+    columns = new_columns()
+    for when in times:
+        for name, column in columns.items():
+            column.append(when if name == 'time' else (-1 if COLUMNS[name] == 'h' else math.nan))
+    return columns
+
+
+def stored_times(directory):
+    store = TrackStore(directory)
+    try:
+        return store.query(-math.inf, math.inf)['time']
+    finally:
+        store.close()
+
+
+def test_rows_round_trip_through_reopen(tmp_path):
+    directory = str(tmp_path)
+    writer = TrackStoreWriter(directory, flush_rows=3)
+    writer.extend(batch([1.0, 2.0, 3.0, 4.0]))
+    writer.close()
+    writer = TrackStoreWriter(directory)
+    writer.extend(batch([5.0]))
+    writer.close()
+    assert stored_times(directory) == [1.0, 2.0, 3.0, 4.0, 5.0]
+    store = TrackStore(directory)
+    assert store.query(2.0, 4.0)['time'] == [2.0, 3.0]
+    store.close()
+
+
+def test_older_batches_are_rejected_not_dropped(tmp_path):
+    directory = str(tmp_path)
+    writer = TrackStoreWriter(directory)
+    writer.extend(batch([10.0, 11.0]))
+    writer.close()
+    writer = TrackStoreWriter(directory)
+    with pytest.raises(ValueError):
+        writer.extend(batch([5.0, 6.0]))
+    with pytest.raises(ValueError):
+        writer.extend(batch([12.0, 14.0, 13.0]))
+    assert writer.out_of_order == 5
+    writer.extend(batch([12.0]))
+    writer.close()
+    assert stored_times(directory) == [10.0, 11.0, 12.0]
+
+
+def test_older_rows_are_counted_and_skipped(tmp_path):
+    directory = str(tmp_path)
+    writer = TrackStoreWriter(directory)
+    rows = [{name: column[0] for name, column in batch([when]).items()} for when in (10.0, 11.0, 9.0, 10.5, 12.0)]
+    assert [writer.append_row(row) for row in rows] == [True, True, False, False, True]
+    assert writer.out_of_order == 2
+    writer.close()
+    assert stored_times(directory) == [10.0, 11.0, 12.0]
+
+
+def test_uneven_columns_are_truncated_to_whole_rows(tmp_path):
+    directory = str(tmp_path)
+    writer = TrackStoreWriter(directory)
+    writer.extend(batch([1.0, 2.0]))
+    writer.close()
+    # A crash mid-flush leaves the time column one row ahead of the rest
+    with open(writer.column_path('time'), 'ab') as f:
+        array('d', [3.0]).tofile(f)
+    writer = TrackStoreWriter(directory)
+    assert writer.rows == 2
+    writer.close()
+    assert stored_times(directory) == [1.0, 2.0]
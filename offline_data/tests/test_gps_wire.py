@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from gps_fix import GpsFix, ReceiverFix
+from gps_wire import decode_fix, encode_fix
+
+
+def make_fix(seq=7, bottom=True):
+    top = ReceiverFix('/dev/ttyACM0', 35.1234567, 129.0412345, 12.5, 18.52, 9, (5, 7, 13))
+    rx = ReceiverFix('/dev/ttyACM1', 35.1234321, 129.0412987, 11.75, 18.5, 8, (5, 7)) if bottom else None
+    return GpsFix(1700000000.25, 'SHIP-1', 'dev-42', 84.4, top=top, bottom=rx, seq=seq)
+
+
+def test_binary_round_trip_matches_json():
+    fix = make_fix()
+    assert decode_fix(encode_fix(fix)) == json.loads(fix.to_json())
+
+
+def test_missing_receiver_values_and_seq():
+    fix = make_fix(seq=None, bottom=False)
+    fix.heading = None
+    fix.top.altitude = None
+    fix.top.speed = None
+    decoded = decode_fix(fix.to_binary())
+    assert decoded == json.loads(fix.to_json())
+    assert 'seq' not in decoded
+    assert decoded['gps_data'][1]['latitude'] is None
+
+
+def test_binary_is_smaller_than_json():
+    fix = make_fix()
+    assert len(fix.to_binary()) * 3 < len(fix.to_json())
+
+
+def test_unknown_schema_is_rejected():
+    with pytest.raises(ValueError):
+        decode_fix(b'\x09' + encode_fix(make_fix())[1:])